@@ -0,0 +1,130 @@
+"""Init task in "Overwrite" mode on a large existing plate, with fast overwrite.
+
+Run from the repository root, with the Zarr directory on the filesystem to
+measure:
+
+    python benchmarks/bench_fast_overwrite.py --zarr-dir /shared/tmp --files 1000000
+
+Before each run, the plate of a synthetic acquisition is set up and its
+images are filled with small chunk files, `--files` in total. The init task
+then replaces the plate in "Overwrite" mode, either deleting it first (the
+default) or moving it to the trash (fast overwrite, without the background
+cleanup). The report includes the wall time of the init task, and for fast
+overwrite the time taken to empty the trash with the given number of threads.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ome_zarr_converters_tools import OverwriteMode
+
+from fractal_uzh_converters.common import FastOverwrite, PerformanceOptions
+from fractal_uzh_converters.common.fast_overwrite import empty_trash
+from fractal_uzh_converters.cq3k.convert_cq3k_init_task import convert_cq3k_init_task
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    SyntheticPlate,
+    write_synthetic_acquisition,
+    write_synthetic_images,
+)
+
+
+def _build_plate(acquisition_dir: Path, zarr_dir: Path, num_files: int) -> None:
+    """Set up the plate, with `num_files` chunk files spread over its images."""
+    parallelization_list = convert_cq3k_init_task(
+        zarr_dir=str(zarr_dir), acquisitions=[{"path": acquisition_dir}]
+    )["parallelization_list"]
+    per_image = -(-num_files // len(parallelization_list))
+
+    def write_chunks(zarr_url: str) -> None:
+        for start in range(0, per_image, 1000):
+            directory = Path(zarr_url) / "0" / "c" / str(start // 1000)
+            directory.mkdir(parents=True, exist_ok=True)
+            for index in range(min(1000, per_image - start)):
+                (directory / str(index)).write_bytes(b"\0" * 64)
+
+    with ThreadPoolExecutor(16) as pool:
+        list(
+            pool.map(write_chunks, [item["zarr_url"] for item in parallelization_list])
+        )
+
+
+def _run(
+    acquisition_dir: Path, zarr_dir: Path, options: PerformanceOptions
+) -> dict[str, float]:
+    """Replace the plate with the init task, and empty the trash if any."""
+    start = time.perf_counter()
+    convert_cq3k_init_task(
+        zarr_dir=str(zarr_dir),
+        acquisitions=[{"path": acquisition_dir}],
+        overwrite=OverwriteMode.OVERWRITE,
+        performance_options=options,
+    )
+    init_time = time.perf_counter() - start
+    cleanup_time = 0.0
+    if options.fast_overwrite is not None:
+        start = time.perf_counter()
+        empty_trash(zarr_dir, options.fast_overwrite.delete_workers)
+        cleanup_time = time.perf_counter() - start
+    return {"init_s": init_time, "cleanup_s": cleanup_time}
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--zarr-dir", type=Path, help="Directory on the storage.")
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--rows", type=int, default=4)
+    parser.add_argument("--columns", type=int, default=4)
+    parser.add_argument("--delete-workers", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Optional JSON results file.")
+    args = parser.parse_args()
+
+    plate = SyntheticPlate(rows=args.rows, columns=args.columns)
+    workdir = Path(tempfile.mkdtemp(prefix="bench_fast_overwrite_", dir=args.zarr_dir))
+    configurations = {
+        "delete": PerformanceOptions(),
+        "fast": PerformanceOptions(
+            fast_overwrite=FastOverwrite(
+                delete_workers=args.delete_workers, background=False
+            )
+        ),
+    }
+    results = []
+    try:
+        acquisition_dir = write_synthetic_acquisition(
+            "cq3k", workdir / "acquisition", plate
+        )
+        write_synthetic_images("cq3k", acquisition_dir, plate)
+        print(f"{'mode':>8}{'init (s)':>11}{'cleanup (s)':>13}{'files':>10}")
+        for name, options in configurations.items():
+            runs = []
+            for _ in range(args.repeats):
+                zarr_dir = workdir / "zarr"
+                _build_plate(acquisition_dir, zarr_dir, args.files)
+                os.sync()
+                runs.append(_run(acquisition_dir, zarr_dir, options))
+                shutil.rmtree(zarr_dir, ignore_errors=True)
+            best = min(runs, key=lambda run: run["init_s"])
+            results.append({"mode": name, "files": args.files, **best})
+            print(
+                f"{name:>8}{best['init_s']:>11.2f}{best['cleanup_s']:>13.2f}"
+                f"{args.files:>10}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output is not None:
+        report = {"plate": plate.model_dump(), "results": results}
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Benchmark metadata parsing and the init tasks on synthetic plates.
+
+Run from the repository root:
+
+    python benchmarks/bench_init.py --records 1000 10000 100000
+
+For each vendor and scale point, a synthetic acquisition is generated, then the
+metadata parser and the full init task run in a fresh process each, reporting
+their wall time and peak resident memory. The 10^6 records scale point takes
+several minutes per vendor (ScanR being the slowest, since the OME-XML is fully
+validated), so it is not run by default.
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    VENDORS,
+    SyntheticPlate,
+    write_synthetic_acquisition,
+)
+
+
+def _rss_mb() -> float:
+    """Peak resident memory of the current process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _run_stage(
+    vendor: str, stage: str, acquisition: dict, zarr_dir: str
+) -> dict[str, float]:
+    """Run a single stage in the current (fresh) process."""
+    from ome_zarr_converters_tools import ConverterOptions
+
+    from fractal_uzh_converters.cq3k.convert_cq3k_init_task import (
+        convert_cq3k_init_task,
+    )
+    from fractal_uzh_converters.cq3k.utils import (
+        CQ3KAcquisitionModel,
+        parse_cq3k_metadata,
+    )
+    from fractal_uzh_converters.olympus_scanr.convert_scanr_init_task import (
+        convert_scanr_init_task,
+    )
+    from fractal_uzh_converters.olympus_scanr.utils import (
+        ScanRAcquisitionModel,
+        parse_scanr_metadata,
+    )
+    from fractal_uzh_converters.operetta.convert_operetta_init_task import (
+        convert_operetta_init_task,
+    )
+    from fractal_uzh_converters.operetta.utils import (
+        OperettaAcquisitionModel,
+        parse_operetta_metadata,
+    )
+
+    parsers = {
+        "cq3k": (CQ3KAcquisitionModel, parse_cq3k_metadata),
+        "operetta": (OperettaAcquisitionModel, parse_operetta_metadata),
+        "scanr": (ScanRAcquisitionModel, parse_scanr_metadata),
+    }
+    init_tasks = {
+        "cq3k": convert_cq3k_init_task,
+        "operetta": convert_operetta_init_task,
+        "scanr": convert_scanr_init_task,
+    }
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    if stage == "parse":
+        model_cls, parse_function = parsers[vendor]
+        parse_function(
+            acquisition_model=model_cls(**acquisition),
+            converter_options=ConverterOptions(),
+        )
+    else:
+        init_tasks[vendor](zarr_dir=zarr_dir, acquisitions=[acquisition])
+    wall_time = time.perf_counter() - start
+    peak = _rss_mb()
+    return {
+        "wall_time_s": wall_time,
+        "peak_rss_mb": peak,
+        "peak_rss_increase_mb": peak - baseline,
+    }
+
+
+def run_in_fresh_process(
+    vendor: str, stage: str, acquisition: dict, zarr_dir: str
+) -> dict[str, float]:
+    """Run a stage in a new process, so the peak memory is not shared."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_run_stage, vendor, stage, acquisition, zarr_dir).result()
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vendors", nargs="+", choices=VENDORS, default=VENDORS)
+    parser.add_argument(
+        "--records", nargs="+", type=int, default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--z-planes", type=int, default=1)
+    parser.add_argument("--stages", nargs="+", choices=["parse", "init"])
+    parser.add_argument("--output", type=Path, help="Optional JSON results file.")
+    args = parser.parse_args()
+    stages = args.stages or ["parse", "init"]
+
+    results = []
+    print(
+        f"{'vendor':<10}{'records':>10}{'stage':>8}{'wall (s)':>11}"
+        f"{'peak (MB)':>12}{'+MB':>9}{'KB/record':>11}"
+    )
+    for vendor in args.vendors:
+        for num_records in args.records:
+            plate = SyntheticPlate.with_num_records(
+                num_records, channels=args.channels, z_planes=args.z_planes
+            )
+            workdir = Path(tempfile.mkdtemp(prefix="bench_init_"))
+            try:
+                acquisition_dir = write_synthetic_acquisition(
+                    vendor, workdir / "acquisition", plate
+                )
+                acquisition = {"path": acquisition_dir}
+                if vendor == "scanr":
+                    acquisition["layout"] = plate.scanr_layout
+                for stage in stages:
+                    zarr_dir = workdir / f"zarr_{stage}"
+                    result = run_in_fresh_process(
+                        vendor, stage, acquisition, str(zarr_dir)
+                    )
+                    per_record = result["peak_rss_increase_mb"] * 1024
+                    per_record /= plate.num_records
+                    print(
+                        f"{vendor:<10}{plate.num_records:>10}{stage:>8}"
+                        f"{result['wall_time_s']:>11.2f}"
+                        f"{result['peak_rss_mb']:>12.1f}"
+                        f"{result['peak_rss_increase_mb']:>9.1f}{per_record:>11.2f}"
+                    )
+                    results.append(
+                        {
+                            "vendor": vendor,
+                            "stage": stage,
+                            "records": plate.num_records,
+                            "plate": plate.model_dump(),
+                            **result,
+                        }
+                    )
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Speedup of the conversion of a single large image with the allocated CPUs.
+
+Run from the repository root:
+
+    python benchmarks/bench_intra_image.py --cores 1 2 4 8
+
+A synthetic well with many FOVs is generated once, then the compute task of
+the image runs in a fresh process for each number of cores. The process is
+restricted to that many CPUs (as SLURM does with `cpus_per_task`), and the
+`CPU Workers` performance option is left unset, so the zarr thread pool and
+the pipelined writing (enabled with more than one core) are sized from the
+allocated CPUs. The report includes the wall time, the speedup over a single
+core and the MB/s written.
+
+Core counts above the number of CPUs of the machine are skipped. A simulated
+network filesystem latency can be added with `--latency-ms`, to show how the
+reads overlap on network storage.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from fractal_uzh_converters.cq3k.convert_cq3k_init_task import convert_cq3k_init_task
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    SyntheticPlate,
+    write_synthetic_acquisition,
+    write_synthetic_images,
+)
+
+
+def _directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _run_compute(
+    item: dict, cores: int, acquisition_dir: str, latency: float
+) -> dict[str, float]:
+    """Run the compute task of an image, restricted to `cores` CPUs."""
+    from contextlib import nullcontext
+
+    from fractal_uzh_converters.common import (
+        ImageInPlateInitArgs,
+        StageTimer,
+        run_image_in_plate_compute,
+    )
+    from fractal_uzh_converters.dev.slow_filesystem import SlowFilesystem
+
+    os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[:cores])
+    filesystem = (
+        SlowFilesystem([acquisition_dir], latency=latency) if latency else nullcontext()
+    )
+    timer = StageTimer()
+    start = time.perf_counter()
+    with filesystem:
+        run_image_in_plate_compute(
+            zarr_url=item["zarr_url"],
+            init_args=ImageInPlateInitArgs.model_validate(item["init_args"]),
+            timer=timer,
+        )
+    return {"wall_time_s": time.perf_counter() - start, "stages_s": timer.stages}
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cores", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--fields", type=int, default=36)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--z-planes", type=int, default=2)
+    parser.add_argument("--fov-size", type=int, default=1024)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", type=Path, help="Optional JSON results file.")
+    args = parser.parse_args()
+
+    available = len(os.sched_getaffinity(0))
+    plate = SyntheticPlate(
+        fields=args.fields,
+        channels=args.channels,
+        z_planes=args.z_planes,
+        fov_size=args.fov_size,
+    )
+    workdir = Path(tempfile.mkdtemp(prefix="bench_intra_image_"))
+    results = []
+    try:
+        acquisition_dir = write_synthetic_acquisition(
+            "cq3k", workdir / "acquisition", plate
+        )
+        print(f"Writing {plate.num_records} TIFF files...")
+        write_synthetic_images("cq3k", acquisition_dir, plate)
+        print(f"{'cores':>6}{'wall (s)':>11}{'speedup':>9}{'MB/s':>8}  stages (s)")
+        baseline = None
+        for cores in args.cores:
+            if cores > available:
+                print(f"{cores:>6}  skipped, only {available} CPUs available")
+                continue
+            zarr_dir = workdir / f"zarr_{cores}"
+            (item,) = convert_cq3k_init_task(
+                zarr_dir=str(zarr_dir), acquisitions=[{"path": acquisition_dir}]
+            )["parallelization_list"]
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(
+                    _run_compute,
+                    item,
+                    cores,
+                    acquisition_dir,
+                    args.latency_ms / 1000,
+                ).result()
+            written = _directory_size(zarr_dir)
+            shutil.rmtree(zarr_dir, ignore_errors=True)
+            # Single core time, extrapolated if the first run uses more cores
+            baseline = baseline or result["wall_time_s"] * cores
+            wall_time = result["wall_time_s"]
+            result.update(
+                {
+                    "cores": cores,
+                    "speedup": baseline / wall_time,
+                    "written_mb_s": written / 1024**2 / wall_time,
+                }
+            )
+            results.append(result)
+            stages = ", ".join(f"{k} {v:.2f}" for k, v in result["stages_s"].items())
+            print(
+                f"{cores:>6}{wall_time:>11.2f}{result['speedup']:>9.2f}"
+                f"{result['written_mb_s']:>8.1f}  {stages}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output is not None:
+        report = {"plate": plate.model_dump(), "results": results}
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
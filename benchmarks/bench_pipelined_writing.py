@@ -0,0 +1,112 @@
+"""Benchmark the pipelined FOV writer against the sequential writer.
+
+Run from the repository root:
+
+    python benchmarks/bench_pipelined_writing.py --latency 0 0.05
+
+A latency above zero simulates a high-latency filesystem, with a
+`SlowFilesystem` delaying every open of the tile files.
+"""
+
+import argparse
+import shutil
+import tempfile
+from contextlib import nullcontext
+from pathlib import Path
+
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode, WriterMode
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    PipelinedWriting,
+    StageTimer,
+)
+from fractal_uzh_converters.common.compute_pipeline import write_image_in_plate
+from fractal_uzh_converters.dev.slow_filesystem import SlowFilesystem
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+
+def run_once(
+    tiled_image, zarr_url: str, performance_options: PerformanceOptions
+) -> StageTimer:
+    """Write the image once and return the stage timings."""
+    shutil.rmtree(zarr_url, ignore_errors=True)
+    timer = StageTimer()
+    converter_options = ConverterOptions(writer_mode=WriterMode.BY_FOV)
+    converter_options.omezarr_options.num_levels = 1
+    write_image_in_plate(
+        zarr_url=zarr_url,
+        tiled_image=tiled_image.model_copy(deep=True),
+        converter_options=converter_options,
+        overwrite_mode=OverwriteMode.OVERWRITE,
+        performance_options=performance_options,
+        timer=timer,
+    )
+    return timer
+
+
+def data_write_time(timer: StageTimer) -> float:
+    """Wall time of the data writing, excluding pyramid and tables."""
+    skipped = ("pyramid", "channel windows", "tables")
+    return timer.wall_time - sum(timer.stages.get(stage, 0.0) for stage in skipped)
+
+
+def main() -> None:
+    """Run the benchmark and print a table of the results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fov-grid", type=int, nargs=2, default=(4, 4))
+    parser.add_argument("--fov-size", type=int, default=1024)
+    parser.add_argument("--z", type=int, default=4)
+    parser.add_argument("--c", type=int, default=2)
+    parser.add_argument("--latency", type=float, nargs="+", default=(0.0, 0.02))
+    parser.add_argument("--read-workers", type=int, default=4)
+    parser.add_argument("--write-workers", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--workdir", type=Path, default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="bench_pipelined_"))
+    modes = {
+        # A single CPU, otherwise the pipelined writing is enabled implicitly
+        "sequential": PerformanceOptions(cpu_workers=1),
+        "pipelined": PerformanceOptions(
+            pipelined_writing=PipelinedWriting(
+                read_workers=args.read_workers, write_workers=args.write_workers
+            )
+        ),
+    }
+    (tiled_image,) = build_synthetic_tiled_images(
+        workdir,
+        fov_grid=tuple(args.fov_grid),
+        fov_yx=(args.fov_size, args.fov_size),
+        num_z=args.z,
+        num_c=args.c,
+    )
+    print(f"{'latency [s]':>12} {'mode':>12} {'best [s]':>10} {'speedup':>8}")
+    for latency in args.latency:
+        results = {}
+        for mode, performance_options in modes.items():
+            timings = []
+            for _ in range(args.repeats):
+                filesystem = (
+                    SlowFilesystem([workdir / "tiffs"], latency=latency)
+                    if latency
+                    else nullcontext()
+                )
+                with filesystem:
+                    timer = run_once(
+                        tiled_image, str(workdir / "out.zarr"), performance_options
+                    )
+                timings.append(data_write_time(timer))
+            results[mode] = min(timings)
+        for mode, best in results.items():
+            speedup = results["sequential"] / best
+            print(f"{latency:>12.3f} {mode:>12} {best:>10.2f} {speedup:>7.2f}x")
+    if args.workdir is None:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
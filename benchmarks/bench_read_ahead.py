@@ -0,0 +1,147 @@
+"""Conversion of a single image on a cold page cache, with and without read-ahead.
+
+Run from the repository root:
+
+    python benchmarks/bench_read_ahead.py --files-ahead 0 16 64 256
+
+A synthetic well with many small TIFF files is generated once. Before each
+run, the TIFF files are evicted from the page cache (`POSIX_FADV_DONTNEED` on
+every file, or `/proc/sys/vm/drop_caches` with `--drop-caches`, which needs
+root), then the compute task of the image runs in a fresh process. A value of
+0 for `--files-ahead` disables the read-ahead. The report includes the wall
+time, the read stage time and the speedup over the run without read-ahead
+(which writes the whole image at once, so its reads are timed with the writes).
+
+The eviction only makes a difference when the files are not cached by another
+layer (e.g. a RAID controller or a network filesystem client cache), so the
+results are the most meaningful on a network filesystem or a spinning disk.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from fractal_uzh_converters.cq3k.convert_cq3k_init_task import convert_cq3k_init_task
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    SyntheticPlate,
+    iter_synthetic_images,
+    write_synthetic_acquisition,
+    write_synthetic_images,
+)
+
+
+def _evict(paths: list[Path], drop_caches: bool) -> None:
+    """Remove the files from the page cache."""
+    os.sync()
+    if drop_caches:
+        Path("/proc/sys/vm/drop_caches").write_text("3\n")
+        return
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def _run_compute(item: dict, files_ahead: int) -> dict[str, float]:
+    """Run the compute task of an image, with `files_ahead` files hinted."""
+    from fractal_uzh_converters.common import (
+        ImageInPlateInitArgs,
+        ReadAhead,
+        StageTimer,
+        run_image_in_plate_compute,
+    )
+
+    init_args = ImageInPlateInitArgs.model_validate(item["init_args"])
+    read_ahead = ReadAhead(files_ahead=files_ahead) if files_ahead else None
+    init_args.performance_options = init_args.performance_options.model_copy(
+        update={"read_ahead": read_ahead}
+    )
+    timer = StageTimer()
+    start = time.perf_counter()
+    run_image_in_plate_compute(
+        zarr_url=item["zarr_url"], init_args=init_args, timer=timer
+    )
+    return {"wall_time_s": time.perf_counter() - start, "stages_s": timer.stages}
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files-ahead", nargs="+", type=int, default=[0, 16, 64])
+    parser.add_argument("--fields", type=int, default=64)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--z-planes", type=int, default=4)
+    parser.add_argument("--fov-size", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--drop-caches", action="store_true")
+    parser.add_argument(
+        "--workdir", type=Path, help="Directory for the data (default: a temp dir)."
+    )
+    parser.add_argument("--output", type=Path, help="Optional JSON results file.")
+    args = parser.parse_args()
+
+    plate = SyntheticPlate(
+        fields=args.fields,
+        channels=args.channels,
+        z_planes=args.z_planes,
+        fov_size=args.fov_size,
+    )
+    workdir = Path(tempfile.mkdtemp(prefix="bench_read_ahead_", dir=args.workdir))
+    results = []
+    try:
+        acquisition_dir = write_synthetic_acquisition(
+            "cq3k", workdir / "acquisition", plate
+        )
+        print(f"Writing {plate.num_records} TIFF files...")
+        write_synthetic_images("cq3k", acquisition_dir, plate)
+        tiff_paths = [
+            path for path, _ in iter_synthetic_images("cq3k", acquisition_dir, plate)
+        ]
+        print(f"{'ahead':>6}{'wall (s)':>11}{'read (s)':>10}{'speedup':>9}")
+        baseline = None
+        for files_ahead in args.files_ahead:
+            wall_times, read_times = [], []
+            for _ in range(args.repeats):
+                zarr_dir = workdir / "zarr"
+                (item,) = convert_cq3k_init_task(
+                    zarr_dir=str(zarr_dir), acquisitions=[{"path": acquisition_dir}]
+                )["parallelization_list"]
+                _evict(tiff_paths, args.drop_caches)
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(_run_compute, item, files_ahead).result()
+                shutil.rmtree(zarr_dir, ignore_errors=True)
+                wall_times.append(result["wall_time_s"])
+                read_times.append(result["stages_s"].get("read", 0.0))
+            wall_time = min(wall_times)
+            baseline = baseline or wall_time
+            result = {
+                "files_ahead": files_ahead,
+                "wall_time_s": wall_time,
+                "read_s": min(read_times),
+                "speedup": baseline / wall_time,
+            }
+            results.append(result)
+            print(
+                f"{files_ahead:>6}{wall_time:>11.2f}{result['read_s']:>10.2f}"
+                f"{result['speedup']:>9.2f}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output is not None:
+        report = {"plate": plate.model_dump(), "results": results}
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Makespan simulation of the parallelization list ordering on skewed plates.
+
+Run from the repository root:
+
+    python benchmarks/bench_scheduling.py --workers 8 32 128
+
+The compute jobs are simulated on a pool of workers, each worker taking the
+next item of the parallelization list as soon as it is free (as the Fractal
+runners dispatch them). The duration of an image is a fixed overhead (creating
+the image, writing the tables) plus its estimated cost (the bytes to read)
+divided by the per-job throughput. The makespan of each scheduling policy is
+compared to the lower bound max(total work / workers, longest job).
+"""
+
+import argparse
+import heapq
+import json
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+
+from fractal_uzh_converters.common import SchedulingPolicy, schedule_order
+
+# Size of a single 2048x2048 uint16 FOV with 4 channels
+FOV_BYTES = 4 * 2048 * 2048 * 2
+
+
+def _few_large_wells(rng: np.random.Generator, num_wells: int) -> np.ndarray:
+    """Most wells with one FOV, 5% of the wells with 100 FOVs."""
+    fields = np.ones(num_wells, dtype=int)
+    large = rng.choice(num_wells, size=max(1, num_wells // 20), replace=False)
+    fields[large] = 100
+    return fields
+
+
+def _lognormal(rng: np.random.Generator, num_wells: int) -> np.ndarray:
+    """Heavy-tailed number of FOVs per well."""
+    return np.clip(rng.lognormal(mean=1.5, sigma=1.2, size=num_wells), 1, 400).astype(
+        int
+    )
+
+
+def _uniform(rng: np.random.Generator, num_wells: int) -> np.ndarray:
+    """The same number of FOVs in every well."""
+    return np.full(num_wells, 9)
+
+
+PLATES: dict[str, Callable[[np.random.Generator, int], np.ndarray]] = {
+    "few-large-wells": _few_large_wells,
+    "lognormal": _lognormal,
+    "uniform": _uniform,
+}
+
+
+def simulate_makespan(durations: list[float], workers: int) -> float:
+    """Makespan of a list scheduled greedily on a pool of workers.
+
+    Args:
+        durations (list[float]): The duration of each job, in dispatch order.
+        workers (int): The number of workers.
+
+    Returns:
+        float: The time at which the last job finishes.
+    """
+    free_at = [0.0] * workers
+    for duration in durations:
+        start = heapq.heappop(free_at)
+        heapq.heappush(free_at, start + duration)
+    return max(free_at)
+
+
+def main() -> None:
+    """Run the simulation."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plates", nargs="+", choices=list(PLATES), default=PLATES)
+    parser.add_argument("--wells", type=int, default=384)
+    parser.add_argument("--workers", nargs="+", type=int, default=[8, 32, 128])
+    parser.add_argument(
+        "--overhead-s", type=float, default=2.0, help="Fixed time per image."
+    )
+    parser.add_argument(
+        "--throughput-mb-s", type=float, default=100.0, help="Read speed per job."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Optional JSON results file.")
+    args = parser.parse_args()
+
+    results = []
+    policies = list(SchedulingPolicy)
+    print(
+        f"{'plate':<17}{'workers':>8}{'bound (s)':>11}"
+        + "".join(f"{policy:>19}" for policy in policies)
+        + f"{'gain':>7}"
+    )
+    for plate in args.plates:
+        rng = np.random.default_rng(args.seed)
+        fields = PLATES[plate](rng, args.wells)
+        # Shuffle, since the acquisition order is unrelated to the image size
+        costs = [int(n) * FOV_BYTES for n in rng.permutation(fields)]
+        durations = [
+            args.overhead_s + cost / (args.throughput_mb_s * 1024**2) for cost in costs
+        ]
+        for workers in args.workers:
+            bound = max(sum(durations) / workers, max(durations))
+            makespans = {}
+            for policy in policies:
+                order = schedule_order(costs, policy)
+                makespans[policy.value] = simulate_makespan(
+                    [durations[index] for index in order], workers
+                )
+            gain = (
+                makespans[SchedulingPolicy.ACQUISITION_ORDER]
+                / makespans[SchedulingPolicy.LARGEST_FIRST]
+            )
+            print(
+                f"{plate:<17}{workers:>8}{bound:>11.1f}"
+                + "".join(f"{makespans[policy]:>19.1f}" for policy in policies)
+                + f"{gain:>6.2f}x"
+            )
+            results.append(
+                {
+                    "plate": plate,
+                    "workers": workers,
+                    "lower_bound_s": bound,
+                    "makespan_s": makespans,
+                }
+            )
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Conversion of a single image written directly or staged on local scratch.
+
+Run from the repository root, with the Zarr directory on the shared filesystem
+to measure:
+
+    python benchmarks/bench_scratch_staging.py --zarr-dir /shared/tmp --scratch-dir /tmp
+
+A synthetic well is generated once, in the scratch directory. Each run
+converts it to a new plate in the Zarr directory, either writing the image
+directly or staging it on scratch and committing it. The report includes the
+wall time of the compute task, the time spent committing the staged image, the
+number of files written and the write throughput (MB of the final image per
+second of wall time).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from fractal_uzh_converters.common import (
+    ImageInPlateInitArgs,
+    ScratchStaging,
+    StageTimer,
+    run_image_in_plate_compute,
+)
+from fractal_uzh_converters.cq3k.convert_cq3k_init_task import convert_cq3k_init_task
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    SyntheticPlate,
+    write_synthetic_acquisition,
+    write_synthetic_images,
+)
+
+
+def _tree_size(root: Path) -> tuple[int, int]:
+    """Number of files and total size in bytes below a directory."""
+    num_files, num_bytes = 0, 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            num_files += 1
+            num_bytes += os.path.getsize(os.path.join(directory, name))
+    return num_files, num_bytes
+
+
+def _run(
+    acquisition_dir: Path, zarr_dir: Path, staging: ScratchStaging | None
+) -> dict[str, float]:
+    """Convert the synthetic well, with or without staging."""
+    (item,) = convert_cq3k_init_task(
+        zarr_dir=str(zarr_dir), acquisitions=[{"path": acquisition_dir}]
+    )["parallelization_list"]
+    init_args = ImageInPlateInitArgs.model_validate(item["init_args"])
+    init_args.performance_options = init_args.performance_options.model_copy(
+        update={"staging": staging}
+    )
+    timer = StageTimer()
+    start = time.perf_counter()
+    run_image_in_plate_compute(
+        zarr_url=item["zarr_url"], init_args=init_args, timer=timer
+    )
+    wall_time = time.perf_counter() - start
+    num_files, num_bytes = _tree_size(Path(item["zarr_url"]))
+    commit_time = sum(
+        seconds for stage, seconds in timer.stages.items() if stage.startswith("commit")
+    )
+    return {
+        "wall_time_s": wall_time,
+        "commit_s": commit_time,
+        "num_files": num_files,
+        "mb_s": num_bytes / 2**20 / wall_time,
+    }
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--zarr-dir", type=Path, help="Directory on the storage.")
+    parser.add_argument("--scratch-dir", type=Path, help="Node-local directory.")
+    parser.add_argument("--fields", type=int, default=16)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--z-planes", type=int, default=8)
+    parser.add_argument("--fov-size", type=int, default=512)
+    parser.add_argument("--copy-workers", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Optional JSON results file.")
+    args = parser.parse_args()
+
+    plate = SyntheticPlate(
+        fields=args.fields,
+        channels=args.channels,
+        z_planes=args.z_planes,
+        fov_size=args.fov_size,
+    )
+    scratch = Path(tempfile.mkdtemp(prefix="bench_staging_", dir=args.scratch_dir))
+    target = Path(tempfile.mkdtemp(prefix="bench_staging_", dir=args.zarr_dir))
+    configurations = {
+        "direct": None,
+        "staged": ScratchStaging(
+            scratch_dir=str(scratch), copy_workers=args.copy_workers
+        ),
+    }
+    results = []
+    try:
+        acquisition_dir = write_synthetic_acquisition(
+            "cq3k", scratch / "acquisition", plate
+        )
+        print(f"Writing {plate.num_records} TIFF files...")
+        write_synthetic_images("cq3k", acquisition_dir, plate)
+        print(f"{'mode':>8}{'wall (s)':>11}{'commit (s)':>12}{'files':>8}{'MB/s':>9}")
+        for name, staging in configurations.items():
+            runs = []
+            for repeat in range(args.repeats):
+                zarr_dir = target / f"{name}_{repeat}"
+                runs.append(_run(acquisition_dir, zarr_dir, staging))
+                shutil.rmtree(zarr_dir, ignore_errors=True)
+            best = min(runs, key=lambda run: run["wall_time_s"])
+            results.append({"mode": name, **best})
+            print(
+                f"{name:>8}{best['wall_time_s']:>11.2f}{best['commit_s']:>12.2f}"
+                f"{best['num_files']:>8}{best['mb_s']:>9.1f}"
+            )
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        shutil.rmtree(target, ignore_errors=True)
+
+    if args.output is not None:
+        report = {"plate": plate.model_dump(), "results": results}
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""End-to-end conversion throughput on a synthetic plate with TIFF payloads.
+
+Run from the repository root:
+
+    python benchmarks/bench_throughput.py --output throughput.json
+
+A synthetic acquisition (metadata and TIFF files) is generated once, then the
+init task and the compute task of every image run locally for each
+configuration. The report includes the MB/s read from the TIFF files, the MB/s
+written to the OME-Zarr, the images per second and the per-stage timings
+summed over all images. Results are written to a JSON file, together with the
+package versions, so runs of different releases can be compared.
+
+The TIFF files are usually in the page cache after being generated, so the
+read throughput is an upper bound of what a cold network filesystem achieves.
+Network storage can be simulated with `--latency-ms`, `--jitter-ms` and
+`--bandwidth-mb-s`, which slow down the files of the synthetic acquisition (see
+`fractal_uzh_converters.dev.slow_filesystem`).
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from contextlib import AbstractContextManager, nullcontext
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any
+
+from ome_zarr_converters_tools import ConverterOptions
+
+from fractal_uzh_converters.common import (
+    ImageInPlateInitArgs,
+    PerformanceOptions,
+    StageTimer,
+    run_image_in_plate_compute,
+)
+from fractal_uzh_converters.cq3k.convert_cq3k_init_task import convert_cq3k_init_task
+from fractal_uzh_converters.dev.slow_filesystem import SlowFilesystem
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    VENDORS,
+    SyntheticPlate,
+    iter_synthetic_images,
+    write_synthetic_acquisition,
+    write_synthetic_images,
+)
+from fractal_uzh_converters.olympus_scanr.convert_scanr_init_task import (
+    convert_scanr_init_task,
+)
+from fractal_uzh_converters.operetta.convert_operetta_init_task import (
+    convert_operetta_init_task,
+)
+
+INIT_TASKS = {
+    "cq3k": convert_cq3k_init_task,
+    "operetta": convert_operetta_init_task,
+    "scanr": convert_scanr_init_task,
+}
+
+# Each configuration is a set of overrides of the converter options and the
+# performance options
+CONFIGURATIONS: dict[str, dict[str, Any]] = {
+    "v2-default": {},
+    "v3-default": {"ngff_version": "0.5"},
+    "v2-zstd": {"performance": {"compression": "Blosc Zstd"}},
+    "v3-zstd": {"ngff_version": "0.5", "performance": {"compression": "Blosc Zstd"}},
+    "v2-uncompressed": {"performance": {"compression": "Uncompressed"}},
+    "v2-chunks-0.5-fov": {"chunks": {"xy_scaling": "0.5"}},
+    "v2-chunks-2-fov": {"chunks": {"xy_scaling": "2"}},
+    "v2-pipelined-2r-1w": {
+        "performance": {"pipelined_writing": {"read_workers": 2, "write_workers": 1}}
+    },
+    "v2-pipelined-8r-4w": {
+        "performance": {"pipelined_writing": {"read_workers": 8, "write_workers": 4}}
+    },
+}
+
+
+def _directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _build_options(
+    overrides: dict[str, Any],
+) -> tuple[ConverterOptions, PerformanceOptions]:
+    omezarr_options: dict[str, Any] = {
+        "ngff_version": overrides.get("ngff_version", "0.4"),
+        "chunks": {"mode": "Same as FOV", **overrides.get("chunks", {})},
+    }
+    converter_options = ConverterOptions.model_validate(
+        {"omezarr_options": omezarr_options}
+    )
+    performance_options = PerformanceOptions.model_validate(
+        overrides.get("performance", {})
+    )
+    return converter_options, performance_options
+
+
+def run_configuration(
+    *,
+    vendor: str,
+    acquisition: dict,
+    zarr_dir: Path,
+    overrides: dict[str, Any],
+    filesystem: AbstractContextManager | None = None,
+) -> dict[str, Any]:
+    """Run the init and compute tasks of a configuration.
+
+    Args:
+        vendor (str): The vendor of the synthetic acquisition.
+        acquisition (dict): The acquisition passed to the init task.
+        zarr_dir (Path): The output directory.
+        overrides (dict[str, Any]): The configuration overrides.
+        filesystem (AbstractContextManager | None): Optional context in which
+            the tasks run, e.g. a `SlowFilesystem`.
+
+    Returns:
+        dict[str, Any]: The wall times, the per-stage timings and the bytes
+            written.
+    """
+    converter_options, performance_options = _build_options(overrides)
+    with filesystem or nullcontext():
+        start = time.perf_counter()
+        parallelization_list = INIT_TASKS[vendor](
+            zarr_dir=str(zarr_dir),
+            acquisitions=[acquisition],
+            converter_options=converter_options,
+            performance_options=performance_options,
+        )["parallelization_list"]
+        init_wall_time = time.perf_counter() - start
+
+        timer = StageTimer()
+        start = time.perf_counter()
+        for item in parallelization_list:
+            run_image_in_plate_compute(
+                zarr_url=item["zarr_url"],
+                init_args=ImageInPlateInitArgs.model_validate(item["init_args"]),
+                timer=timer,
+            )
+        compute_wall_time = time.perf_counter() - start
+    return {
+        "init_wall_time_s": init_wall_time,
+        "compute_wall_time_s": compute_wall_time,
+        "num_images": len(parallelization_list),
+        "written_bytes": _directory_size(zarr_dir),
+        "stages_s": timer.stages,
+    }
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vendor", choices=VENDORS, default="cq3k")
+    parser.add_argument("--rows", type=int, default=2)
+    parser.add_argument("--columns", type=int, default=2)
+    parser.add_argument("--fields", type=int, default=4)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--z-planes", type=int, default=4)
+    parser.add_argument("--fov-size", type=int, default=1024)
+    parser.add_argument("--dtype", choices=["uint8", "uint16"], default="uint16")
+    parser.add_argument(
+        "--tiff-compression",
+        default=None,
+        help="Compression of the source TIFF files, e.g. zlib or lzw.",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="Simulated latency of each file open, in milliseconds.",
+    )
+    parser.add_argument(
+        "--jitter-ms",
+        type=float,
+        default=0.0,
+        help="Maximum random deviation of the simulated latency, in milliseconds.",
+    )
+    parser.add_argument(
+        "--bandwidth-mb-s",
+        type=float,
+        default=None,
+        help="Simulated read bandwidth of the acquisition files, in MB/s.",
+    )
+    parser.add_argument(
+        "--configs",
+        nargs="+",
+        choices=list(CONFIGURATIONS),
+        default=list(CONFIGURATIONS),
+    )
+    parser.add_argument("--output", type=Path, default=Path("throughput.json"))
+    args = parser.parse_args()
+
+    plate = SyntheticPlate(
+        rows=args.rows,
+        columns=args.columns,
+        fields=args.fields,
+        channels=args.channels,
+        z_planes=args.z_planes,
+        fov_size=args.fov_size,
+        dtype=args.dtype,
+    )
+    workdir = Path(tempfile.mkdtemp(prefix="bench_throughput_"))
+    results = []
+    try:
+        acquisition_dir = write_synthetic_acquisition(
+            args.vendor, workdir / "acquisition", plate
+        )
+        print(f"Writing {plate.num_records} TIFF files...")
+        write_synthetic_images(
+            args.vendor, acquisition_dir, plate, compression=args.tiff_compression
+        )
+        read_bytes = sum(
+            tiff_path.stat().st_size
+            for tiff_path, _ in iter_synthetic_images(
+                args.vendor, acquisition_dir, plate
+            )
+        )
+        raw_bytes = plate.num_records * plate.fov_size**2 * plate.bit_depth // 8
+        acquisition = {"path": acquisition_dir}
+        if args.vendor == "scanr":
+            acquisition["layout"] = plate.scanr_layout
+
+        print(
+            f"{'configuration':<22}{'read MB/s':>11}{'write MB/s':>12}"
+            f"{'images/s':>10}{'ratio':>7}  stages (s)"
+        )
+        for name in args.configs:
+            zarr_dir = workdir / f"zarr_{name}"
+            filesystem = SlowFilesystem(
+                [acquisition_dir],
+                latency=args.latency_ms / 1000,
+                jitter=args.jitter_ms / 1000,
+                bandwidth=args.bandwidth_mb_s,
+                seed=0,
+            )
+            result = run_configuration(
+                vendor=args.vendor,
+                acquisition=acquisition,
+                zarr_dir=zarr_dir,
+                overrides=CONFIGURATIONS[name],
+                filesystem=filesystem,
+            )
+            shutil.rmtree(zarr_dir, ignore_errors=True)
+            wall_time = result["compute_wall_time_s"]
+            result.update(
+                {
+                    "configuration": name,
+                    "overrides": CONFIGURATIONS[name],
+                    "read_mb_s": read_bytes / 1024**2 / wall_time,
+                    "written_mb_s": result["written_bytes"] / 1024**2 / wall_time,
+                    "raw_mb_s": raw_bytes / 1024**2 / wall_time,
+                    "images_per_s": result["num_images"] / wall_time,
+                    "compression_ratio": raw_bytes / max(result["written_bytes"], 1),
+                }
+            )
+            results.append(result)
+            stages = ", ".join(f"{k} {v:.2f}" for k, v in result["stages_s"].items())
+            print(
+                f"{name:<22}{result['read_mb_s']:>11.1f}"
+                f"{result['written_mb_s']:>12.1f}{result['images_per_s']:>10.2f}"
+                f"{result['compression_ratio']:>7.2f}  {stages}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "environment": {
+            "fractal_uzh_converters": version("fractal-uzh-converters"),
+            "ngio": version("ngio"),
+            "zarr": version("zarr"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "dataset": {
+            "vendor": args.vendor,
+            "plate": plate.model_dump(),
+            "tiff_compression": args.tiff_compression,
+            "num_files": plate.num_records,
+            "read_bytes": read_bytes,
+            "raw_bytes": raw_bytes,
+        },
+        "filesystem": {
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "bandwidth_mb_s": args.bandwidth_mb_s,
+        },
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,53 @@
 """Common utilities for fractal UZH converters."""
 
+from fractal_uzh_converters.common.aggregate_channel_statistics_task import (
+    aggregate_channel_statistics_task,
+)
+from fractal_uzh_converters.common.async_loading import AsyncLoading
+from fractal_uzh_converters.common.build_pyramids_task import build_pyramids_task
+from fractal_uzh_converters.common.channel_statistics import ChannelStatisticsOptions
+from fractal_uzh_converters.common.chunking import (
+    AutoChunking,
+    ReadPattern,
+    compute_auto_chunking,
+)
+from fractal_uzh_converters.common.completion_log import ResumableWriting
+from fractal_uzh_converters.common.compression import Compression
+from fractal_uzh_converters.common.compute_pipeline import (
+    ImageInPlateInitArgs,
+    run_image_in_plate_compute,
+)
+from fractal_uzh_converters.common.conversion_setup import setup_plate_conversion
+from fractal_uzh_converters.common.fast_overwrite import FastOverwrite
+from fractal_uzh_converters.common.finalize_plate_metadata_task import (
+    finalize_plate_metadata_task,
+)
 from fractal_uzh_converters.common.image_in_plate_compute_task import (
     image_in_plate_compute_task,
 )
+from fractal_uzh_converters.common.incremental import (
+    FingerprintMode,
+    IncrementalConversion,
+)
+from fractal_uzh_converters.common.live_acquisition import (
+    LiveAcquisition,
+    poll_live_acquisitions,
+)
+from fractal_uzh_converters.common.object_store import ObjectStore
+from fractal_uzh_converters.common.parallelization_payload import CompactPayload
+from fractal_uzh_converters.common.performance_options import PerformanceOptions
+from fractal_uzh_converters.common.pipelined_writing import PipelinedWriting
+from fractal_uzh_converters.common.preflight import PreflightCheck
+from fractal_uzh_converters.common.pyramid import PyramidMode, PyramidOptions
+from fractal_uzh_converters.common.read_ahead import ReadAhead
+from fractal_uzh_converters.common.scheduling import (
+    SchedulingPolicy,
+    estimate_cost,
+    schedule_order,
+)
+from fractal_uzh_converters.common.scratch_staging import ScratchStaging
+from fractal_uzh_converters.common.stage_timer import StageTimer
+from fractal_uzh_converters.common.tiff_probe import TiffProbe
 from fractal_uzh_converters.common.utils import (
     STANDARD_ROWS_NAMES,
     BaseAcquisitionModel,
@@ -12,8 +57,40 @@ from fractal_uzh_converters.common.utils import (
 
 __all__ = [
     "STANDARD_ROWS_NAMES",
+    "AsyncLoading",
+    "AutoChunking",
     "BaseAcquisitionModel",
+    "ChannelStatisticsOptions",
+    "CompactPayload",
+    "Compression",
+    "FastOverwrite",
+    "FingerprintMode",
+    "ImageInPlateInitArgs",
+    "IncrementalConversion",
+    "LiveAcquisition",
+    "ObjectStore",
+    "PerformanceOptions",
+    "PipelinedWriting",
+    "PreflightCheck",
+    "PyramidMode",
+    "PyramidOptions",
+    "ReadAhead",
+    "ReadPattern",
+    "ResumableWriting",
+    "SchedulingPolicy",
+    "ScratchStaging",
+    "StageTimer",
+    "TiffProbe",
+    "aggregate_channel_statistics_task",
+    "build_pyramids_task",
+    "compute_auto_chunking",
+    "estimate_cost",
+    "finalize_plate_metadata_task",
     "get_attributes_from_condition_table",
     "image_in_plate_compute_task",
     "parse_acquisitions",
+    "poll_live_acquisitions",
+    "run_image_in_plate_compute",
+    "schedule_order",
+    "setup_plate_conversion",
 ]
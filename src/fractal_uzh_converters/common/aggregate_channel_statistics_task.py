@@ -0,0 +1,52 @@
+"""Gather the channel statistics of the converted images in plate tables."""
+
+import logging
+
+from pydantic import validate_call
+
+from fractal_uzh_converters.common.channel_statistics import (
+    write_plate_channel_statistics,
+)
+from fractal_uzh_converters.common.plate_metadata import (
+    images_by_plate,
+    remove_consolidated_metadata,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@validate_call
+def aggregate_channel_statistics_task(
+    *,
+    # Fractal parameters
+    zarr_urls: list[str],
+    zarr_dir: str,
+    # Task parameters
+    table_backend: str = "csv",
+) -> None:
+    """Write a channel statistics table for each plate.
+
+    Gathers the per-image statistics tables written by a converter with the
+    channel statistics enabled in a single table at the plate level, with one
+    row per image and channel. The consolidated metadata of the plates, if
+    any, is removed.
+
+    Args:
+        zarr_urls (list[str]): List of URLs to the OME-Zarr images.
+        zarr_dir (str): Not used by this task.
+        table_backend (str): Backend of the plate tables.
+    """
+    plate_urls = sorted(images_by_plate(zarr_urls))
+    logger.info(f"Aggregating the channel statistics of {len(plate_urls)} plates.")
+    for plate_url in plate_urls:
+        # The new table would be missing from the consolidated metadata
+        remove_consolidated_metadata(plate_url)
+        write_plate_channel_statistics(plate_url, backend=table_backend)
+
+
+if __name__ == "__main__":
+    from fractal_task_tools.task_wrapper import run_fractal_task
+
+    run_fractal_task(
+        task_function=aggregate_channel_statistics_task, logger_name=logger.name
+    )
@@ -0,0 +1,263 @@
+"""Asynchronous loading of the tiles, for high-latency storage.
+
+On network or object storage, each tile read mostly waits for the storage, and
+saturating the bandwidth takes hundreds of concurrent requests: far more than
+the threads of the pipelined writer. Here the tile files are read by an asyncio
+event loop, with a bounded number of reads in flight, and decoded in a small
+thread pool:
+
+    read (async, up to N in flight) -> decode (threads) -> assemble -> write
+
+The files are read through fsspec. Filesystems with a native async
+implementation (HTTP, S3, GCS, ...) are awaited directly; the others (e.g.
+local or NFS paths) are read in a thread pool sized to the in-flight limit.
+Only the tiles of the default image loader pointing to TIFF files are
+supported: their paths are resolved against the loader resource as the loader
+does, and any other tile is refused before the first read.
+"""
+
+import asyncio
+import io
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import fsspec
+import numpy as np
+import tifffile
+from fsspec.core import split_protocol
+from fsspec.spec import AbstractFileSystem
+from ngio import Image
+from ome_zarr_converters_tools import (
+    DefaultImageLoader,
+    ImageLoaderInterface,
+    TiledImage,
+    TileFOVGroup,
+    join_url_paths,
+)
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common.pipelined_writing import FovCallback, tile_loaders
+from fractal_uzh_converters.common.stage_timer import StageTimer
+
+logger = logging.getLogger(__name__)
+
+TIFF_SUFFIXES = (".tif", ".tiff", ".tf2", ".tf8", ".btf", ".stk")
+
+
+class AsyncLoading(BaseModel):
+    """Read the tiles with asyncio, with many concurrent reads."""
+
+    max_in_flight: int = Field(default=64, ge=1, title="Reads in Flight")
+    """Maximum number of tile files read concurrently."""
+    decode_workers: int = Field(default=2, ge=1, title="Decode Workers")
+    """Number of threads decoding the TIFF files."""
+    buffered_fovs: int = Field(default=4, ge=1, title="Buffered FOVs")
+    """
+    Number of FOVs read ahead of the FOV being written. The reads in flight
+    are shared by these FOVs, so images with few tiles per FOV need more
+    buffered FOVs to reach the in-flight limit.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+
+class _FileReader:
+    """Read whole files from their paths or URLs, within an event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_in_flight: int) -> None:
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._filesystems: dict[str, AbstractFileSystem] = {}
+        self._pool = ThreadPoolExecutor(max_in_flight, thread_name_prefix="read")
+
+    def _filesystem(self, protocol: str) -> AbstractFileSystem:
+        if protocol not in self._filesystems:
+            fs_class = fsspec.get_filesystem_class(protocol)
+            if fs_class.async_impl:
+                fs = fs_class(asynchronous=True, loop=self._loop)
+            else:
+                fs = fs_class()
+            self._filesystems[protocol] = fs
+        return self._filesystems[protocol]
+
+    async def read(self, url: str, timer: StageTimer) -> bytes:
+        protocol, _ = split_protocol(url)
+        fs = self._filesystem(protocol or "file")
+        path = fs._strip_protocol(url)
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                if fs.async_impl:
+                    return await fs._cat_file(path)
+                return await self._loop.run_in_executor(self._pool, fs.cat_file, path)
+            finally:
+                timer.add("read", time.perf_counter() - start)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def decode_tiff(data: bytes, ndim: int) -> np.ndarray:
+    """Decode a TIFF file, with leading axes added up to `ndim` axes."""
+    with tifffile.TiffFile(io.BytesIO(data)) as tiff:
+        array = tiff.asarray()
+    if array.ndim > ndim:
+        raise ValueError("Data has more axes than expected.")
+    return array.reshape((1,) * (ndim - array.ndim) + array.shape)
+
+
+def tile_url(image_loader: ImageLoaderInterface, resource: Any | None) -> str:
+    """URL of the TIFF file of a tile, as resolved by its image loader.
+
+    Args:
+        image_loader (ImageLoaderInterface): The image loader of the tile.
+        resource (Any | None): Optional resource passed to the image loaders,
+            the base directory of relative file paths.
+
+    Returns:
+        str: The URL of the file.
+
+    Raises:
+        ValueError: If the tile is not read by the default image loader from
+            a TIFF file, which asynchronous loading cannot reproduce.
+    """
+    if type(image_loader) is not DefaultImageLoader:
+        raise ValueError(
+            "Asynchronous loading only supports the default image loader, got "
+            f"{type(image_loader).__name__}. Disable asynchronous loading."
+        )
+    file_path = image_loader.file_path
+    if not file_path.lower().endswith(TIFF_SUFFIXES):
+        raise ValueError(
+            f"Asynchronous loading only supports TIFF files, got '{file_path}'. "
+            "Disable asynchronous loading."
+        )
+    if resource:
+        return join_url_paths(str(resource), file_path)
+    return file_path
+
+
+def async_fov_writing(
+    *,
+    tiled_image: TiledImage,
+    image: Image,
+    resource: Any | None,
+    options: AsyncLoading,
+    timer: StageTimer,
+    on_fov_written: FovCallback | None = None,
+    fov_indices: list[int] | None = None,
+) -> None:
+    """Write the FOVs of a tiled image, reading their tiles asynchronously.
+
+    Args:
+        tiled_image (TiledImage): The image to write, in pixel coordinates.
+        image (Image): The OME-Zarr image to write to.
+        resource (Any | None): Optional resource passed to the image loaders.
+        options (AsyncLoading): The asynchronous loading options.
+        timer (StageTimer): Timer collecting the per-stage timings.
+        on_fov_written (FovCallback | None): Optional
+            callback receiving the index of each FOV in `group_by_fov()` and its
+            data, once the FOV has been written.
+        fov_indices (list[int] | None): Indices of the FOVs to write in
+            `group_by_fov()`. All the FOVs if not set.
+    """
+    groups = tiled_image.group_by_fov()
+    if fov_indices is None:
+        fov_indices = list(range(len(groups)))
+    # Refuse the unsupported tiles before anything is read or written
+    urls = {
+        index: [
+            tile_url(region.image_loader, resource) for region in groups[index].regions
+        ]
+        for index in fov_indices
+    }
+    logger.info(
+        f"Starting asynchronous FOV writing - Number of FOVs: {len(fov_indices)}, "
+        f"reads in flight: {options.max_in_flight}, "
+        f"decode workers: {options.decode_workers}."
+    )
+    asyncio.run(
+        _write_fovs(
+            groups=groups,
+            urls=urls,
+            resource=resource,
+            fov_indices=fov_indices,
+            image=image,
+            options=options,
+            timer=timer,
+            on_fov_written=on_fov_written,
+        )
+    )
+
+
+async def _write_fovs(
+    *,
+    groups: list[TileFOVGroup],
+    urls: dict[int, list[str]],
+    resource: Any | None,
+    fov_indices: list[int],
+    image: Image,
+    options: AsyncLoading,
+    timer: StageTimer,
+    on_fov_written: FovCallback | None,
+) -> None:
+    loop = asyncio.get_running_loop()
+    reader = _FileReader(loop, options.max_in_flight)
+    decode_pool = ThreadPoolExecutor(
+        options.decode_workers, thread_name_prefix="decode"
+    )
+    # A single writer, the chunk encoding is parallelized by zarr
+    write_pool = ThreadPoolExecutor(1, thread_name_prefix="write")
+
+    def decode(data: bytes, ndim: int) -> np.ndarray:
+        with timer.measure("decode"):
+            return decode_tiff(data, ndim)
+
+    async def load_tile(file_path: str, ndim: int) -> np.ndarray:
+        data = await reader.read(file_path, timer)
+        return await loop.run_in_executor(decode_pool, decode, data, ndim)
+
+    async def load_fov(index: int) -> np.ndarray:
+        group = groups[index]
+        ndim = len(group.axes)
+        tiles = await asyncio.gather(*(load_tile(url, ndim) for url in urls[index]))
+        with timer.measure("assemble"):
+            patch = np.zeros(group.shape(), dtype=tiles[0].dtype)
+            for (slicing, _), data in zip(
+                tile_loaders(group, resource), tiles, strict=True
+            ):
+                patch[slicing] = data
+        return patch
+
+    def write(index: int, patch: np.ndarray) -> None:
+        with timer.measure("encode+write"):
+            image.set_roi(roi=groups[index].roi(), patch=patch)
+        if on_fov_written is not None:
+            on_fov_written(index, patch)
+
+    indices = iter(fov_indices)
+    pending: deque[tuple[int, asyncio.Task]] = deque()
+
+    def load_next() -> None:
+        index = next(indices, None)
+        if index is not None:
+            pending.append((index, asyncio.create_task(load_fov(index))))
+
+    try:
+        for _ in range(options.buffered_fovs):
+            load_next()
+        while pending:
+            index, task = pending.popleft()
+            patch = await task
+            load_next()
+            # The next FOVs keep loading while this one is written
+            await loop.run_in_executor(write_pool, write, index, patch)
+    finally:
+        for _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+        write_pool.shutdown(wait=True)
+        decode_pool.shutdown(wait=True)
+        reader.close()
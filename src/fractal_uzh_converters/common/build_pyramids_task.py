@@ -0,0 +1,63 @@
+"""Build the lower resolution levels of images converted in deferred mode."""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ome_zarr_converters_tools import ImageListUpdateDict
+from pydantic import validate_call
+
+from fractal_uzh_converters.common.parallelism import allocated_cpus
+from fractal_uzh_converters.common.pyramid import PYRAMID_PENDING_TYPE, build_pyramid
+
+logger = logging.getLogger(__name__)
+
+
+@validate_call
+def build_pyramids_task(
+    *,
+    # Fractal parameters
+    zarr_urls: list[str],
+    zarr_dir: str,
+    # Task parameters
+    max_workers: int | None = None,
+) -> ImageListUpdateDict:
+    """Build the pyramid levels and channel windows of a list of images.
+
+    Runs after a converter with the pyramid mode set to "Deferred", which only
+    writes the full resolution level. The images are processed in parallel.
+
+    Args:
+        zarr_urls (list[str]): List of URLs to the OME-Zarr images.
+        zarr_dir (str): Not used by this task.
+        max_workers (int | None): Number of images processed in parallel. If not
+            set, the number of CPUs allocated to the task.
+    """
+    timer = time.time()
+    max_workers = max_workers or allocated_cpus()
+    logger.info(
+        f"Building the pyramid of {len(zarr_urls)} images with {max_workers} workers."
+    )
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="pyramid") as pool:
+        for zarr_url, _ in zip(
+            zarr_urls, pool.map(build_pyramid, zarr_urls), strict=True
+        ):
+            logger.info(f"Built the pyramid of: {zarr_url}")
+    run_time = time.time() - timer
+    logger.info(f"Succesfully built {len(zarr_urls)} pyramids, in {run_time:.2f}[s]")
+    return ImageListUpdateDict(
+        image_list_updates=[
+            {
+                "zarr_url": zarr_url,
+                "types": {PYRAMID_PENDING_TYPE: False},
+                "attributes": {},
+            }
+            for zarr_url in zarr_urls
+        ]
+    )
+
+
+if __name__ == "__main__":
+    from fractal_task_tools.task_wrapper import run_fractal_task
+
+    run_fractal_task(task_function=build_pyramids_task, logger_name=logger.name)
@@ -0,0 +1,270 @@
+"""Per-channel statistics gathered while the FOVs are written.
+
+The statistics are accumulated from the FOVs already in memory for writing, so
+the channel windows and the statistics tables do not need a separate pass over
+the data. Integer images up to 16 bits are accumulated in an exact histogram;
+other data types keep a bounded strided sample of each FOV, so their
+percentiles are approximate.
+"""
+
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from ngio import OmeZarrContainer, open_ome_zarr_plate
+from ngio.tables import GenericTable
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_STATISTICS_TABLE = "channel_statistics"
+
+# Maximum number of pixels sampled per FOV and channel for data types that
+# cannot be accumulated in an exact histogram
+_MAX_SAMPLES_PER_FOV = 2**16
+
+
+class ChannelStatisticsOptions(BaseModel):
+    """Gather per-channel statistics while writing the images."""
+
+    lower_percentile: float = Field(
+        default=0.1, ge=0, le=100, title="Lower Window Percentile"
+    )
+    """Percentile used as the start of the channel display windows."""
+    upper_percentile: float = Field(
+        default=99.9, ge=0, le=100, title="Upper Window Percentile"
+    )
+    """Percentile used as the end of the channel display windows."""
+    model_config = ConfigDict(extra="forbid")
+
+    @model_validator(mode="after")
+    def _check_percentiles(self) -> "ChannelStatisticsOptions":
+        if self.lower_percentile >= self.upper_percentile:
+            raise ValueError(
+                "The lower window percentile must be smaller than the upper one."
+            )
+        return self
+
+
+def _uses_histogram(dtype: np.dtype) -> bool:
+    return dtype.kind in "ui" and dtype.itemsize <= 2
+
+
+class _ChannelAccumulator:
+    """Running statistics of a single channel.
+
+    With a histogram, all the statistics are derived from it, so a FOV costs a
+    single `bincount` over its pixels.
+    """
+
+    def __init__(self, dtype: np.dtype) -> None:
+        self.histogram: np.ndarray | None = None
+        if _uses_histogram(dtype):
+            self._unsigned = np.dtype(f"u{dtype.itemsize}")
+            # Signed values are counted through their unsigned view, where the
+            # negative values come after the positive ones
+            self._shift = -int(np.iinfo(dtype).min)
+            self.histogram = np.zeros(2 ** (8 * dtype.itemsize), dtype=np.int64)
+        self.count = 0
+        self._min = np.inf
+        self._max = -np.inf
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._samples: list[np.ndarray] = []
+
+    def summarize(self, data: np.ndarray) -> dict:
+        """Statistics of a block, computed outside of the lock."""
+        values = data.ravel()
+        if self.histogram is not None:
+            counts = np.bincount(
+                values.view(self._unsigned), minlength=self.histogram.size
+            )
+            return {"histogram": np.roll(counts, self._shift)}
+        values_f64 = values.astype(np.float64, copy=False)
+        step = max(1, values.size // _MAX_SAMPLES_PER_FOV)
+        return {
+            "count": values.size,
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "sum": float(values_f64.sum()),
+            "sum_sq": float(np.dot(values_f64, values_f64)),
+            "samples": values_f64[::step].copy(),
+        }
+
+    def merge(self, summary: dict) -> None:
+        if self.histogram is not None:
+            self.histogram += summary["histogram"]
+            self._update_from_histogram(self.histogram)
+            return
+        self.count += summary["count"]
+        self._min = min(self._min, summary["min"])
+        self._max = max(self._max, summary["max"])
+        self._sum += summary["sum"]
+        self._sum_sq += summary["sum_sq"]
+        self._samples.append(summary["samples"])
+
+    def _update_from_histogram(self, histogram: np.ndarray) -> None:
+        """Derive the moments and the range from the histogram."""
+        values = np.arange(histogram.size, dtype=np.float64) - self._shift
+        nonzero = np.flatnonzero(histogram)
+        self.count = int(histogram.sum())
+        if nonzero.size:
+            self._min = float(values[nonzero[0]])
+            self._max = float(values[nonzero[-1]])
+        self._sum = float(np.dot(histogram, values))
+        self._sum_sq = float(np.dot(histogram, values**2))
+
+    @property
+    def min(self) -> float:
+        return self._min
+
+    @property
+    def max(self) -> float:
+        return self._max
+
+    @property
+    def mean(self) -> float:
+        return self._sum / max(self.count, 1)
+
+    @property
+    def std(self) -> float:
+        variance = self._sum_sq / max(self.count, 1) - self.mean**2
+        return max(variance, 0.0) ** 0.5
+
+    def percentile(self, q: float) -> float:
+        if self.histogram is None:
+            if not self._samples:
+                return 0.0
+            return float(np.percentile(np.concatenate(self._samples), q))
+        cumulative = np.cumsum(self.histogram)
+        if cumulative[-1] == 0:
+            return 0.0
+        rank = q / 100 * (cumulative[-1] - 1)
+        return float(np.searchsorted(cumulative, rank, side="right") - self._shift)
+
+
+class ChannelStatistics:
+    """Accumulate per-channel statistics from the FOVs of an image.
+
+    Updates can come from multiple threads; the per-FOV statistics are computed
+    outside of the lock and only merged under it.
+    """
+
+    def __init__(self, *, axes: tuple[str, ...], num_channels: int, dtype: str):
+        """Initialize empty statistics.
+
+        Args:
+            axes (tuple[str, ...]): The axes of the FOVs passed to `update`.
+            num_channels (int): Number of channels of the image.
+            dtype (str): Data type of the image.
+        """
+        self._channel_axis = axes.index("c") if "c" in axes else None
+        self._lock = threading.Lock()
+        self._channels = [
+            _ChannelAccumulator(np.dtype(dtype)) for _ in range(num_channels)
+        ]
+
+    def update(self, index: int, patch: np.ndarray) -> None:
+        """Add the data of a FOV.
+
+        Args:
+            index (int): Index of the FOV, unused. Kept to match the FOV
+                written callbacks.
+            patch (np.ndarray): The data of the FOV.
+        """
+        if self._channel_axis is None:
+            channel_data = [patch]
+        else:
+            channel_data = list(np.moveaxis(patch, self._channel_axis, 0))
+        summaries = [
+            accumulator.summarize(data)
+            for accumulator, data in zip(self._channels, channel_data, strict=True)
+        ]
+        with self._lock:
+            for accumulator, summary in zip(self._channels, summaries, strict=True):
+                accumulator.merge(summary)
+
+    def windows(self, options: ChannelStatisticsOptions) -> list[tuple[float, float]]:
+        """Start and end of the display window of each channel."""
+        return [
+            (
+                accumulator.percentile(options.lower_percentile),
+                accumulator.percentile(options.upper_percentile),
+            )
+            for accumulator in self._channels
+        ]
+
+    def to_dataframe(
+        self, *, channel_labels: list[str], options: ChannelStatisticsOptions
+    ) -> pd.DataFrame:
+        """Summarize the statistics as one row per channel.
+
+        Args:
+            channel_labels (list[str]): The label of each channel.
+            options (ChannelStatisticsOptions): Options defining the windows.
+
+        Returns:
+            pd.DataFrame: The statistics, indexed by channel label.
+        """
+        rows = []
+        windows = self.windows(options)
+        for label, accumulator, (start, end) in zip(
+            channel_labels, self._channels, windows, strict=True
+        ):
+            rows.append(
+                {
+                    "channel": label,
+                    "count": accumulator.count,
+                    "min": accumulator.min,
+                    "max": accumulator.max,
+                    "mean": accumulator.mean,
+                    "std": accumulator.std,
+                    "median": accumulator.percentile(50),
+                    "window_start": start,
+                    "window_end": end,
+                }
+            )
+        return pd.DataFrame(rows).set_index("channel")
+
+
+def write_channel_statistics(
+    *,
+    ome_zarr: OmeZarrContainer,
+    statistics: ChannelStatistics,
+    options: ChannelStatisticsOptions,
+    backend: str,
+) -> None:
+    """Set the channel windows and write the statistics table of an image.
+
+    Args:
+        ome_zarr (OmeZarrContainer): The image the statistics were gathered for.
+        statistics (ChannelStatistics): The accumulated statistics.
+        options (ChannelStatisticsOptions): The channel statistics options.
+        backend (str): Backend of the statistics table.
+    """
+    ome_zarr.set_channel_windows(starts_ends=statistics.windows(options))
+    table = statistics.to_dataframe(
+        channel_labels=ome_zarr.channel_labels, options=options
+    )
+    ome_zarr.add_table(
+        CHANNEL_STATISTICS_TABLE,
+        GenericTable(table),
+        backend=backend,
+        overwrite=True,
+    )
+
+
+def write_plate_channel_statistics(plate_url: str, backend: str = "csv") -> None:
+    """Gather the statistics tables of the images of a plate in a plate table.
+
+    Images without a statistics table are skipped.
+
+    Args:
+        plate_url (str): URL of the OME-Zarr plate.
+        backend (str): Backend of the plate table.
+    """
+    plate = open_ome_zarr_plate(plate_url, cache=True)
+    table = plate.concatenate_image_tables(CHANNEL_STATISTICS_TABLE, strict=False)
+    plate.add_table(CHANNEL_STATISTICS_TABLE, table, backend=backend, overwrite=True)
+    logger.info(f"Written the channel statistics table of: {plate_url}")
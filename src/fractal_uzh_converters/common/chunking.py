@@ -0,0 +1,124 @@
+"""Automatic chunk shape selection based on the acquisition geometry."""
+
+import logging
+import math
+from enum import StrEnum
+
+import numpy as np
+from ome_zarr_converters_tools import FovBasedChunking, TiledImage
+from pydantic import BaseModel, ConfigDict, Field
+
+logger = logging.getLogger(__name__)
+
+# Candidate XY chunk sizes, expressed as fractions/multiples of the FOV size.
+# Using these keeps the chunk grid aligned with the FOV grid, so writing one FOV
+# never touches a chunk that is shared with a neighbouring FOV.
+_XY_SCALINGS = ("0.25", "0.5", "1", "2", "4")
+
+
+class ReadPattern(StrEnum):
+    """Expected read pattern of the converted images."""
+
+    PER_PLANE = "Per-Plane Viewing"
+    VOLUMETRIC = "3D Analysis"
+
+
+class AutoChunking(BaseModel):
+    """Pick the chunk shape of each image from its geometry."""
+
+    read_pattern: ReadPattern = Field(
+        default=ReadPattern.PER_PLANE, title="Read Pattern"
+    )
+    """
+    Read pattern to optimize the chunks for.
+    - Per-Plane Viewing: a single Z plane per chunk, with the XY chunk size
+        picked to reach the target size. Best for viewers.
+    - 3D Analysis: the whole Z stack in each chunk (as far as the target size
+        allows). Best for volumetric processing.
+    """
+    target_chunk_size_mb: float = Field(
+        default=16.0, gt=0, title="Target Chunk Size (MB)"
+    )
+    """Target size of a single uncompressed chunk in megabytes."""
+    model_config = ConfigDict(extra="forbid")
+
+    @property
+    def target_bytes(self) -> int:
+        """Target chunk size in bytes."""
+        return int(self.target_chunk_size_mb * 1024**2)
+
+
+def _axis_size(shape: tuple[int, ...], axes: list[str], axis: str) -> int:
+    if axis not in axes:
+        return 1
+    return int(shape[axes.index(axis)])
+
+
+def _size_error(num_bytes: int, target_bytes: int) -> float:
+    """Distance from the target size, symmetric for over- and undershooting."""
+    return abs(math.log(max(num_bytes, 1) / target_bytes))
+
+
+def compute_auto_chunking(
+    tiled_image: TiledImage, auto_chunking: AutoChunking
+) -> FovBasedChunking:
+    """Compute the chunking strategy for a single image.
+
+    The XY chunk size is always a fraction or a multiple of the FOV size, so
+    chunk boundaries follow FOV boundaries. Channels and timepoints are always
+    stored in separate chunks, so that single channels can be read and new
+    timepoints can be appended without touching existing chunks.
+
+    Args:
+        tiled_image (TiledImage): The image to compute the chunks for.
+        auto_chunking (AutoChunking): The automatic chunking options.
+
+    Returns:
+        FovBasedChunking: The chunking strategy for the image.
+    """
+    axes = list(tiled_image.axes)
+    image_shape = tiled_image.shape()
+    fov_shape = tiled_image.group_by_fov()[0].shape()
+    itemsize = np.dtype(tiled_image.data_type).itemsize
+    target_bytes = auto_chunking.target_bytes
+
+    fov_y = _axis_size(fov_shape, axes, "y")
+    fov_x = _axis_size(fov_shape, axes, "x")
+    size_y = _axis_size(image_shape, axes, "y")
+    size_x = _axis_size(image_shape, axes, "x")
+    size_z = _axis_size(image_shape, axes, "z")
+
+    def plane_bytes(scaling: str) -> int:
+        # A chunk larger than the image is clipped to the image on disk
+        chunk_y = min(max(1, int(fov_y * float(scaling))), size_y)
+        chunk_x = min(max(1, int(fov_x * float(scaling))), size_x)
+        return chunk_y * chunk_x * itemsize
+
+    if auto_chunking.read_pattern == ReadPattern.VOLUMETRIC:
+        # Largest Z chunk that still fits the target with the smallest XY chunk
+        min_plane = plane_bytes(_XY_SCALINGS[0])
+        z_chunk = max(1, min(size_z, target_bytes // min_plane))
+    else:
+        z_chunk = 1
+
+    best_scaling = _XY_SCALINGS[0]
+    best_error = math.inf
+    for scaling in _XY_SCALINGS:
+        error = _size_error(plane_bytes(scaling) * z_chunk, target_bytes)
+        # Strictly smaller error, so ties (e.g. due to clipping) keep the
+        # smaller chunk
+        if error < best_error:
+            best_scaling, best_error = scaling, error
+
+    chunking = FovBasedChunking(
+        xy_scaling=best_scaling,  # type: ignore[arg-type]
+        z_chunk=z_chunk,
+        c_chunk=1,
+        t_chunk=1,
+    )
+    chunk_mb = plane_bytes(best_scaling) * z_chunk / 1024**2
+    logger.debug(
+        f"Auto chunking for {tiled_image.path}: xy_scaling={best_scaling}, "
+        f"z_chunk={z_chunk} (~{chunk_mb:.1f} MB per chunk)"
+    )
+    return chunking
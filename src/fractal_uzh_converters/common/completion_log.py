@@ -0,0 +1,252 @@
+"""Completion log of an image, to resume an interrupted compute job.
+
+While an image is converted, each FOV written at full resolution and each
+later stage (pyramid, channel windows, tables) is recorded in a log file in
+the image group. If the job is killed, the next run of the compute task on
+the same image reads the log and only writes what is missing.
+
+The log is append-only, one record per line. Each line starts with the CRC32
+of its JSON record, so a line torn by a crash (partially written, or never
+flushed) is detected and dropped with everything after it. On resume, the
+valid records are rewritten to a new file that atomically replaces the old one,
+before any new record is appended.
+
+The first record holds a fingerprint of the image and of the options that
+change its content, so a log left by a different conversion is ignored. The
+log is started before the empty image is created, and removed once the image
+is complete.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from ome_zarr_converters_tools import (
+    ConverterOptions,
+    TiledImage,
+    local_url_to_path,
+)
+from pydantic import BaseModel, ConfigDict, Field
+
+logger = logging.getLogger(__name__)
+
+COMPLETION_LOG_NAME = ".completion_log"
+_VERSION = 1
+
+
+class ResumableWriting(BaseModel):
+    """Record the progress of each image, to resume interrupted jobs."""
+
+    sync: bool = Field(default=True, title="Sync To Disk")
+    """
+    Flush each record to the storage before moving on (fsync), so that the
+    log survives a node failure and not only a killed process.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+
+def image_fingerprint(
+    *,
+    tiled_image: TiledImage,
+    converter_options: ConverterOptions,
+    content_options: dict[str, Any],
+) -> str:
+    """Hash of the inputs that define the content of an image.
+
+    Args:
+        tiled_image (TiledImage): The image to convert.
+        converter_options (ConverterOptions): The converter options.
+        content_options (dict[str, Any]): The performance options that change
+            the written data, as JSON compatible values.
+
+    Returns:
+        str: The hexadecimal SHA-256 of the inputs.
+    """
+    digest = hashlib.sha256()
+    digest.update(tiled_image.model_dump_json().encode())
+    digest.update(converter_options.model_dump_json().encode())
+    digest.update(json.dumps(content_options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _encode(record: dict[str, Any]) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def _decode(data: bytes) -> list[dict[str, Any]]:
+    """Parse the valid records of a log, up to the first torn line."""
+    records = []
+    # The last element is empty if the log ends with a complete line
+    for line in data.split(b"\n")[:-1]:
+        crc, _, payload = line.partition(b" ")
+        try:
+            valid = int(crc, 16) == zlib.crc32(payload)
+        except ValueError:
+            valid = False
+        if not valid:
+            logger.warning("Dropping a torn record of the completion log.")
+            break
+        records.append(json.loads(payload))
+    return records
+
+
+def _chunk_ranges(
+    block: tuple[slice, ...], chunks: tuple[int, ...]
+) -> tuple[tuple[int, int], ...]:
+    return tuple(
+        (s.start // c, math.ceil(s.stop / c))
+        for s, c in zip(block, chunks, strict=True)
+    )
+
+
+def _share_chunks(
+    a: tuple[tuple[int, int], ...], b: tuple[tuple[int, int], ...]
+) -> bool:
+    return all(
+        start_a < stop_b and start_b < stop_a
+        for (start_a, stop_a), (start_b, stop_b) in zip(a, b, strict=True)
+    )
+
+
+def fovs_to_rewrite(
+    *,
+    committed: set[int],
+    blocks: list[tuple[slice, ...]],
+    chunks: tuple[int, ...],
+) -> list[int]:
+    """Indices of the FOVs to write when resuming an image.
+
+    A chunk is not written atomically, so a chunk shared with a FOV that was
+    not committed might be torn. The committed FOVs sharing a chunk with a FOV
+    to write are written again too, transitively, so that the shared chunks are
+    rebuilt from all of their FOVs.
+
+    Args:
+        committed (set[int]): The FOVs committed by a previous run.
+        blocks (list[tuple[slice, ...]]): The slices of each FOV in the image.
+        chunks (tuple[int, ...]): The chunk shape of the image.
+
+    Returns:
+        list[int]: The FOVs to write, in increasing order.
+    """
+    ranges = [_chunk_ranges(block, chunks) for block in blocks]
+    pending = [index for index in range(len(blocks)) if index not in committed]
+    to_write = set(pending)
+    while pending:
+        index = pending.pop()
+        for other in committed - to_write:
+            if _share_chunks(ranges[index], ranges[other]):
+                to_write.add(other)
+                pending.append(other)
+    return sorted(to_write)
+
+
+class CompletionLog:
+    """Completion log of the FOVs and stages of an image.
+
+    Records can be committed from multiple threads.
+    """
+
+    def __init__(self, *, path: Path, fingerprint: str, sync: bool) -> None:
+        """Initialize the log, loading the records of a previous run.
+
+        Args:
+            path (Path): Path of the log file.
+            fingerprint (str): Fingerprint of the image, see `image_fingerprint`.
+            sync (bool): Flush each record to the storage.
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.sync = sync
+        self.fovs: set[int] = set()
+        self.stages: set[str] = set()
+        self._lock = threading.Lock()
+        self.resumed = self._load()
+
+    @classmethod
+    def for_image(
+        cls, zarr_url: str, *, fingerprint: str, options: ResumableWriting
+    ) -> "CompletionLog":
+        """Completion log of an image.
+
+        Args:
+            zarr_url (str): URL of the OME-Zarr image.
+            fingerprint (str): Fingerprint of the image, see `image_fingerprint`.
+            options (ResumableWriting): The resumable writing options.
+
+        Returns:
+            CompletionLog: The log, with the records of a previous run if any.
+        """
+        path = local_url_to_path(zarr_url) / COMPLETION_LOG_NAME
+        return cls(path=path, fingerprint=fingerprint, sync=options.sync)
+
+    def _load(self) -> bool:
+        if not self.path.exists():
+            return False
+        records = _decode(self.path.read_bytes())
+        if not records or records[0].get("fingerprint") != self.fingerprint:
+            logger.info(f"Ignoring the completion log of another run: {self.path}")
+            return False
+        for record in records[1:]:
+            if "fov" in record:
+                self.fovs.add(record["fov"])
+            else:
+                self.stages.add(record["stage"])
+        self._rewrite(records)
+        return True
+
+    def _rewrite(self, records: list[dict[str, Any]]) -> None:
+        """Replace the log with the given records, atomically."""
+        temp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(temp_path, "wb") as f:
+            f.writelines(_encode(record) for record in records)
+            if self.sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def _append(self, record: dict[str, Any]) -> None:
+        with self._lock, open(self.path, "ab") as f:
+            f.write(_encode(record))
+            if self.sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def start(self) -> None:
+        """Start a new log, before the empty image is created.
+
+        The creation of the image is committed as the "create" stage, so a run
+        killed while creating it starts over on the next run.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fovs.clear()
+        self.stages.clear()
+        self._rewrite([{"version": _VERSION, "fingerprint": self.fingerprint}])
+
+    def commit_fov(self, index: int, patch: np.ndarray | None = None) -> None:
+        """Record a FOV written at full resolution.
+
+        Args:
+            index (int): Index of the FOV in `group_by_fov()`.
+            patch (np.ndarray | None): The data of the FOV, unused. Kept to
+                match the FOV written callbacks.
+        """
+        self._append({"fov": index})
+        self.fovs.add(index)
+
+    def commit_stage(self, stage: str) -> None:
+        """Record a completed stage of the conversion."""
+        self._append({"stage": stage})
+        self.stages.add(stage)
+
+    def remove(self) -> None:
+        """Remove the log, once the image is complete."""
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,45 @@
+"""Compression of the OME-Zarr arrays."""
+
+from enum import StrEnum
+from typing import Any
+
+import numcodecs
+from zarr.codecs import BloscCodec
+
+
+class Compression(StrEnum):
+    """Compression codec of the OME-Zarr arrays."""
+
+    DEFAULT = "Default"
+    BLOSC_LZ4 = "Blosc LZ4"
+    BLOSC_ZSTD = "Blosc Zstd"
+    UNCOMPRESSED = "Uncompressed"
+
+
+# Blosc settings shared by the two Zarr formats
+_BLOSC_SETTINGS = {
+    Compression.BLOSC_LZ4: ("lz4", 5),
+    Compression.BLOSC_ZSTD: ("zstd", 3),
+}
+
+
+def compressors_for(compression: Compression, zarr_format: int) -> Any:
+    """Compressors argument for `ngio.create_empty_ome_zarr`.
+
+    Args:
+        compression (Compression): The compression to use.
+        zarr_format (int): The Zarr format of the arrays, 2 or 3.
+
+    Returns:
+        Any: The compressors, in the form expected by the Zarr format.
+    """
+    if compression == Compression.DEFAULT:
+        return "auto"
+    if compression == Compression.UNCOMPRESSED:
+        return None
+    cname, clevel = _BLOSC_SETTINGS[compression]
+    if zarr_format == 2:
+        return numcodecs.Blosc(
+            cname=cname, clevel=clevel, shuffle=numcodecs.Blosc.SHUFFLE
+        )
+    return BloscCodec(cname=cname, clevel=clevel, shuffle="shuffle")
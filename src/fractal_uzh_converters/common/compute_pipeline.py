@@ -0,0 +1,626 @@
+"""Compute pipeline converting a single tiled image into an OME-Zarr plate image.
+
+Follows the same steps as `generic_compute_task` from `ome_zarr_converters_tools`
+(load the tiled image, register it, write it, add the tables), with the data
+writing step driven by the performance options of this package and a per-stage
+timing breakdown.
+"""
+
+import logging
+from contextlib import nullcontext, suppress
+
+import numpy as np
+import zarr
+from ngio import OmeZarrContainer, create_empty_ome_zarr, open_ome_zarr_container
+from ngio.tables import RoiTable
+from ome_zarr_converters_tools import (
+    ConverterOptions,
+    ConvertParallelInitArgs,
+    DefaultImageLoader,
+    ImageInPlate,
+    ImageListUpdateDict,
+    OverwriteMode,
+    TiledImage,
+    WriterMode,
+)
+from ome_zarr_converters_tools.fractal import remove_json, tiled_image_from_json
+from ome_zarr_converters_tools.pipelines import (
+    apply_registration_pipeline,
+    build_default_registration_pipeline,
+)
+from pydantic import Field, model_validator
+
+from fractal_uzh_converters.common.async_loading import async_fov_writing
+from fractal_uzh_converters.common.channel_statistics import (
+    ChannelStatistics,
+    write_channel_statistics,
+)
+from fractal_uzh_converters.common.completion_log import (
+    CompletionLog,
+    fovs_to_rewrite,
+    image_fingerprint,
+)
+from fractal_uzh_converters.common.compression import compressors_for
+from fractal_uzh_converters.common.fast_overwrite import trashed_image
+from fractal_uzh_converters.common.incremental import write_source_fingerprint
+from fractal_uzh_converters.common.object_store import configure_object_store
+from fractal_uzh_converters.common.parallelism import (
+    allocated_cpus,
+    limit_zarr_threads,
+)
+from fractal_uzh_converters.common.parallelization_payload import (
+    PayloadReference,
+    load_payload,
+)
+from fractal_uzh_converters.common.performance_options import PerformanceOptions
+from fractal_uzh_converters.common.pipelined_writing import (
+    FovCallback,
+    PipelinedWriting,
+    fov_slices,
+    pipelined_fov_writing,
+)
+from fractal_uzh_converters.common.pyramid import (
+    PYRAMID_PENDING_TYPE,
+    InPassPyramidWriter,
+    PyramidMode,
+    build_pyramid_range,
+)
+from fractal_uzh_converters.common.read_ahead import TileReadAhead
+from fractal_uzh_converters.common.scratch_staging import staged_image
+from fractal_uzh_converters.common.stage_timer import StageTimer
+from fractal_uzh_converters.common.tiled_image_writing import (
+    channels_meta,
+    chunk_size,
+    condition_table,
+    image_list_update,
+    to_pixel_coordinates,
+    write_tiled_image_data,
+)
+from fractal_uzh_converters.common.timepoint_append import (
+    later_timepoints,
+    resize_timepoints,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ImageInPlateInitArgs(ConvertParallelInitArgs):
+    """Arguments for the image in plate compute task.
+
+    Either the full arguments, or a reference to a compact payload holding them.
+    """
+
+    tiled_image_json_dump_url: str | None = None
+    """URL of the JSON dump of the tiled image."""
+    converter_options: ConverterOptions | None = None
+    """Advanced converter options."""
+    performance_options: PerformanceOptions = Field(default_factory=PerformanceOptions)
+    """Advanced options to tune the performance of the conversion."""
+    payload: PayloadReference | None = None
+    """Reference to the image in a compact payload sidecar file."""
+    source_fingerprint: str | None = None
+    """Fingerprint of the inputs, stored once the image is complete."""
+    existing_timepoints: int | None = None
+    """Timepoints already written in the image, only the later ones are written."""
+    estimated_bytes: int | None = None
+    """Estimated bytes read to convert the image, to schedule the compute tasks."""
+
+    @model_validator(mode="after")
+    def _check_arguments(self) -> "ImageInPlateInitArgs":
+        if self.payload is None and (
+            self.tiled_image_json_dump_url is None or self.converter_options is None
+        ):
+            raise ValueError(
+                "Either a payload reference, or the tiled image JSON dump URL and "
+                "the converter options are required."
+            )
+        return self
+
+
+def resolve_init_args(
+    init_args: ImageInPlateInitArgs,
+) -> tuple[ImageInPlateInitArgs, TiledImage]:
+    """Load the tiled image, and the full arguments of a payload reference.
+
+    Args:
+        init_args (ImageInPlateInitArgs): Arguments from the init task.
+
+    Returns:
+        tuple[ImageInPlateInitArgs, TiledImage]: The full arguments and the
+            tiled image.
+    """
+    if init_args.payload is None:
+        assert init_args.tiled_image_json_dump_url is not None
+        tiled_image = tiled_image_from_json(
+            tiled_image_json_dump_url=init_args.tiled_image_json_dump_url,
+            collection_type=ImageInPlate,
+            image_loader_type=DefaultImageLoader,
+        )
+        return init_args, tiled_image
+    shared, tiled_image = load_payload(init_args.payload)
+    full_init_args = ImageInPlateInitArgs.model_validate(
+        {**shared, "payload": init_args.payload}
+    )
+    return full_init_args, tiled_image
+
+
+def _is_committed(completion_log: CompletionLog | None, stage: str) -> bool:
+    return completion_log is not None and stage in completion_log.stages
+
+
+def _commit(completion_log: CompletionLog | None, stage: str) -> None:
+    if completion_log is not None:
+        completion_log.commit_stage(stage)
+
+
+def _write_data(
+    *,
+    tiled_image: TiledImage,
+    ome_zarr: OmeZarrContainer,
+    converter_options: ConverterOptions,
+    performance_options: PerformanceOptions,
+    statistics: ChannelStatistics | None,
+    completion_log: CompletionLog | None,
+    timer: StageTimer,
+) -> bool:
+    """Write the full resolution data, and the pyramid if built during writing.
+
+    With a completion log, only the FOVs not committed by a previous run are
+    written, and each written FOV is committed.
+
+    Returns:
+        bool: True if the lower resolution levels have been written as well.
+    """
+    image = ome_zarr.get_image()
+    groups = tiled_image.group_by_fov()
+    fov_indices = list(range(len(groups)))
+    if completion_log is not None and completion_log.resumed:
+        axes, shape = tuple(image.axes), tuple(image.shape)
+        fov_indices = fovs_to_rewrite(
+            committed=completion_log.fovs,
+            blocks=[fov_slices(group, axes, shape) for group in groups],
+            chunks=tuple(image.chunks),
+        )
+        logger.info(
+            f"Resuming: writing {len(fov_indices)} of {len(groups)} FOVs, "
+            "the others were committed by a previous run."
+        )
+    skipped = sorted(set(range(len(groups))) - set(fov_indices))
+    if statistics is not None:
+        # The statistics of the FOVs written by a previous run are read back
+        for index in skipped:
+            with timer.measure("statistics"):
+                statistics.update(index, image.get_roi(roi=groups[index].roi()))
+
+    pyramid_writer = None
+    if performance_options.pyramid.mode == PyramidMode.DURING_WRITING and skipped:
+        logger.info("Some FOVs are already written, building the pyramid after.")
+    elif performance_options.pyramid.mode == PyramidMode.DURING_WRITING:
+        pyramid_writer = InPassPyramidWriter(
+            ome_zarr=ome_zarr,
+            groups=groups,
+            workers=performance_options.pyramid.workers,
+            timer=timer,
+        )
+        if not pyramid_writer.supported:
+            logger.info("Building the pyramid after writing instead.")
+            pyramid_writer = None
+
+    fov_callbacks: list[FovCallback] = []
+    if statistics is not None:
+
+        def update_statistics(index: int, patch: np.ndarray) -> None:
+            with timer.measure("statistics"):
+                statistics.update(index, patch)
+
+        fov_callbacks.append(update_statistics)
+    if pyramid_writer is not None:
+        fov_callbacks.append(pyramid_writer.submit)
+    read_ahead = None
+    if performance_options.read_ahead is not None:
+        read_ahead = TileReadAhead(groups, fov_indices, performance_options.read_ahead)
+        fov_callbacks.append(read_ahead.fov_done)
+    if completion_log is not None:
+        # Last, so that a FOV is only committed once it has been processed
+        fov_callbacks.append(completion_log.commit_fov)
+
+    def on_fov_written(index: int, patch: np.ndarray) -> None:
+        for callback in fov_callbacks:
+            callback(index, patch)
+
+    cpus = performance_options.cpu_workers or allocated_cpus()
+    pipelined_writing = performance_options.pipelined_writing
+    if (
+        pipelined_writing is None
+        and cpus > 1
+        and converter_options.writer_mode == WriterMode.BY_FOV
+    ):
+        # The FOVs of the image are read and written in parallel on its CPUs
+        pipelined_writing = PipelinedWriting()
+    if pipelined_writing is not None:
+        pipelined_writing = pipelined_writing.sized_for(cpus)
+    try:
+        if read_ahead is not None:
+            read_ahead.start()
+        if performance_options.async_loading is not None:
+            async_fov_writing(
+                tiled_image=tiled_image,
+                image=image,
+                resource=None,
+                options=performance_options.async_loading,
+                timer=timer,
+                on_fov_written=on_fov_written if fov_callbacks else None,
+                fov_indices=fov_indices,
+            )
+        elif pipelined_writing is not None:
+            pipelined_fov_writing(
+                tiled_image=tiled_image,
+                image=image,
+                resource=None,
+                options=pipelined_writing,
+                timer=timer,
+                on_fov_written=on_fov_written if fov_callbacks else None,
+                fov_indices=fov_indices,
+            )
+        elif fov_callbacks:
+            # The callbacks need the data of each FOV, so FOVs are written one
+            # by one regardless of the writer mode
+            for index in fov_indices:
+                group = groups[index]
+                with timer.measure("read"):
+                    patch = group.load_data()
+                with timer.measure("write"):
+                    image.set_roi(roi=group.roi(), patch=patch)
+                on_fov_written(index, patch)
+        else:
+            with timer.measure("write"):
+                write_tiled_image_data(
+                    image=image,
+                    tiled_image=tiled_image,
+                    resource=None,
+                    writer_mode=converter_options.writer_mode,
+                )
+    finally:
+        if read_ahead is not None:
+            read_ahead.close()
+        if pyramid_writer is not None:
+            pyramid_writer.close()
+    return pyramid_writer is not None
+
+
+def _write_tables(
+    *,
+    ome_zarr: OmeZarrContainer,
+    tiled_image: TiledImage,
+    table_backend: str,
+    overwrite: bool,
+) -> None:
+    """Write the FOV, well and condition tables of an image."""
+    fov_groups = tiled_image.group_by_fov()
+    if len(fov_groups) > 1:
+        rois = [
+            group.roi().to_world(pixel_size=tiled_image.pixel_size)
+            for group in fov_groups
+        ]
+        ome_zarr.add_table(
+            "FOV_ROI_table",
+            RoiTable(rois=rois),
+            backend=table_backend,
+            overwrite=overwrite,
+        )
+    ome_zarr.add_table(
+        "well_ROI_table",
+        ome_zarr.build_image_roi_table(),
+        backend=table_backend,
+        overwrite=overwrite,
+    )
+    conditions = condition_table(tiled_image.attributes)
+    if conditions is not None:
+        ome_zarr.add_table(
+            "condition_table", conditions, backend="csv", overwrite=overwrite
+        )
+
+
+def _append_timepoints(
+    *,
+    zarr_url: str,
+    tiled_image: TiledImage,
+    existing_timepoints: int,
+    converter_options: ConverterOptions,
+    performance_options: PerformanceOptions,
+    timer: StageTimer,
+) -> OmeZarrContainer:
+    """Append the new timepoints of a tiled image to an existing image.
+
+    The time axis of every level is resized, then only the regions of the new
+    timepoints are written. Their pyramid slices are built FOV by FOV when the
+    FOVs are aligned with the levels, otherwise plane by plane from level 0.
+    The channel windows of the existing image are kept.
+    """
+    num_timepoints = tiled_image.shape()[list(tiled_image.axes).index("t")]
+    with timer.measure("create"):
+        resize_timepoints(zarr_url, num_timepoints)
+        ome_zarr = open_ome_zarr_container(zarr_url, cache=True)
+    logger.info(f"Appending timepoints {existing_timepoints} to {num_timepoints - 1}.")
+    pyramid = performance_options.pyramid
+    if pyramid.mode == PyramidMode.AFTER_WRITING:
+        # Consolidating would rebuild the levels of all the timepoints
+        pyramid = pyramid.model_copy(update={"mode": PyramidMode.DURING_WRITING})
+    pyramid_built = _write_data(
+        tiled_image=later_timepoints(tiled_image, existing_timepoints),
+        ome_zarr=ome_zarr,
+        converter_options=converter_options,
+        performance_options=performance_options.model_copy(update={"pyramid": pyramid}),
+        statistics=None,
+        completion_log=None,
+        timer=timer,
+    )
+    if pyramid.mode == PyramidMode.DEFERRED:
+        logger.info("Deferring the pyramid.")
+    elif not pyramid_built:
+        with timer.measure("pyramid"):
+            build_pyramid_range(
+                ome_zarr, axis="t", start=existing_timepoints, stop=num_timepoints
+            )
+    with timer.measure("tables"):
+        _write_tables(
+            ome_zarr=ome_zarr,
+            tiled_image=tiled_image,
+            table_backend=converter_options.omezarr_options.table_backend,
+            overwrite=True,
+        )
+    logger.info("Finished appending the timepoints.")
+    return ome_zarr
+
+
+def write_image_in_plate(
+    *,
+    zarr_url: str,
+    tiled_image: TiledImage,
+    converter_options: ConverterOptions,
+    overwrite_mode: OverwriteMode,
+    performance_options: PerformanceOptions,
+    timer: StageTimer,
+    existing_timepoints: int | None = None,
+) -> OmeZarrContainer:
+    """Write a registered tiled image as an OME-Zarr image.
+
+    Args:
+        zarr_url (str): URL of the image to write.
+        tiled_image (TiledImage): The registered tiled image.
+        converter_options (ConverterOptions): Advanced converter options.
+        overwrite_mode (OverwriteMode): Overwrite mode for existing data.
+        performance_options (PerformanceOptions): Performance tuning options.
+        timer (StageTimer): Timer collecting the per-stage timings.
+        existing_timepoints (int | None): Timepoints already written in an
+            existing image, to only append the later timepoints.
+
+    Returns:
+        OmeZarrContainer: The written OME-Zarr container.
+    """
+    if overwrite_mode == OverwriteMode.NO_OVERWRITE:
+        mode = "w-"
+    elif overwrite_mode == OverwriteMode.OVERWRITE:
+        mode = "w"
+    else:  # extend
+        mode = "a"
+    completion_log = None
+    if performance_options.resumable is not None and existing_timepoints is None:
+        fingerprint = image_fingerprint(
+            tiled_image=tiled_image,
+            converter_options=converter_options,
+            content_options=performance_options.content_options(),
+        )
+        completion_log = CompletionLog.for_image(
+            zarr_url, fingerprint=fingerprint, options=performance_options.resumable
+        )
+    resumed = completion_log is not None and completion_log.resumed
+    if resumed:
+        # The image was created by an interrupted run of this conversion
+        mode = "a"
+    omezarr_options = converter_options.omezarr_options
+    zarr_format = 2 if omezarr_options.ngff_version == "0.4" else 3
+    tiled_image.regions = to_pixel_coordinates(
+        tiled_image.regions, tiled_image.pixel_size
+    )
+    limit_zarr_threads(performance_options.cpu_workers or allocated_cpus())
+    if existing_timepoints is not None:
+        return _append_timepoints(
+            zarr_url=zarr_url,
+            tiled_image=tiled_image,
+            existing_timepoints=existing_timepoints,
+            converter_options=converter_options,
+            performance_options=performance_options,
+            timer=timer,
+        )
+
+    with timer.measure("create"):
+        # Without overwriting, the log is started before the image group is
+        # created, so that a run killed in between is resumed by the next run
+        # instead of failing on the existing group
+        log_first = completion_log is not None and not resumed and mode == "w-"
+        if log_first:
+            # The "w-" mode refuses the directory holding the log, so the
+            # image is checked here instead
+            image_dir = completion_log.path.parent
+            if image_dir.exists() and any(image_dir.iterdir()):
+                raise FileExistsError(
+                    f"Cannot create {zarr_url}, it already contains data. Use "
+                    "the overwrite mode to replace it."
+                )
+            completion_log.start()
+            mode = "a"
+        base_group = zarr.open_group(store=zarr_url, mode=mode, zarr_format=zarr_format)
+        if _is_committed(completion_log, "create"):
+            ome_zarr = open_ome_zarr_container(base_group, cache=True)
+        else:
+            if not resumed:
+                # This can only succeed in "extend" mode if the group already
+                # exists
+                with suppress(Exception):
+                    return open_ome_zarr_container(base_group, cache=True)
+            # A new image, or one whose creation was interrupted
+            if completion_log is not None and not log_first:
+                completion_log.start()
+            ome_zarr = create_empty_ome_zarr(
+                store=base_group,
+                axes_names=tiled_image.axes,
+                shape=tiled_image.shape(),
+                chunks=chunk_size(tiled_image, omezarr_options),
+                dtype=tiled_image.data_type,
+                pixelsize=tiled_image.pixelsize,
+                z_spacing=tiled_image.z_spacing,
+                time_spacing=tiled_image.t_spacing,
+                levels=omezarr_options.num_levels,
+                channels_meta=channels_meta(tiled_image),
+                translation=tiled_image.translation,
+                overwrite=True,
+                ngff_version=omezarr_options.ngff_version,
+                compressors=compressors_for(
+                    performance_options.compression, zarr_format
+                ),
+            )
+            _commit(completion_log, "create")
+    image = ome_zarr.get_image()
+    statistics_options = performance_options.channel_statistics
+    statistics = None
+    windows_committed = _is_committed(completion_log, "channel windows")
+    if statistics_options is not None and not windows_committed:
+        statistics = ChannelStatistics(
+            axes=tuple(image.axes),
+            num_channels=image.num_channels,
+            dtype=image.dtype,
+        )
+
+    pyramid_built = _write_data(
+        tiled_image=tiled_image,
+        ome_zarr=ome_zarr,
+        converter_options=converter_options,
+        performance_options=performance_options,
+        statistics=statistics,
+        completion_log=completion_log,
+        timer=timer,
+    )
+    deferred = performance_options.pyramid.mode == PyramidMode.DEFERRED
+    if deferred:
+        logger.info("Deferring the pyramid.")
+    elif not _is_committed(completion_log, "pyramid"):
+        if not pyramid_built:
+            with timer.measure("pyramid"):
+                image.consolidate()
+        _commit(completion_log, "pyramid")
+    if windows_committed:
+        logger.info("Channel windows already set by a previous run.")
+    elif statistics is not None and statistics_options is not None:
+        with timer.measure("channel windows"):
+            write_channel_statistics(
+                ome_zarr=ome_zarr,
+                statistics=statistics,
+                options=statistics_options,
+                backend=omezarr_options.table_backend,
+            )
+        _commit(completion_log, "channel windows")
+    elif not deferred:
+        # Otherwise the channel windows are computed on the lowest resolution
+        # level, so in deferred mode they are set together with the pyramid
+        with timer.measure("channel windows"):
+            ome_zarr.set_channel_windows_with_percentiles()
+        _commit(completion_log, "channel windows")
+    logger.info("OME-Zarr image creation and data writing complete.")
+
+    with timer.measure("tables"):
+        _write_tables(
+            ome_zarr=ome_zarr,
+            tiled_image=tiled_image,
+            table_backend=omezarr_options.table_backend,
+            overwrite=resumed,
+        )
+    logger.info("Finished writing OME-Zarr Tables and metadata.")
+    if completion_log is not None:
+        completion_log.remove()
+    return ome_zarr
+
+
+def run_image_in_plate_compute(
+    *,
+    zarr_url: str,
+    init_args: ImageInPlateInitArgs,
+    timer: StageTimer | None = None,
+) -> ImageListUpdateDict:
+    """Convert a single tiled image and build the image list update.
+
+    Args:
+        zarr_url (str): URL of the image to write.
+        init_args (ImageInPlateInitArgs): Arguments from the init task.
+        timer (StageTimer | None): Optional timer collecting the per-stage
+            timings, e.g. to aggregate them over several images.
+
+    Returns:
+        ImageListUpdateDict: The image list update for Fractal.
+    """
+    logger.info(f"Starting conversion for Zarr URL: {zarr_url}")
+    timer = timer if timer is not None else StageTimer()
+    if init_args.performance_options.object_store is not None:
+        configure_object_store(init_args.performance_options.object_store)
+    with timer.measure("load metadata"):
+        init_args, tiled_image = resolve_init_args(init_args)
+
+    converter_options = init_args.converter_options
+    assert converter_options is not None
+    registration_pipeline = build_default_registration_pipeline(
+        alignment_corrections=converter_options.alignment_correction,
+        tiling_mode=converter_options.tiling_mode,
+        tolerance=converter_options.tiling_tolerance,
+    )
+    with timer.measure("registration"):
+        tiled_image = apply_registration_pipeline(tiled_image, registration_pipeline)
+
+    staging = (
+        staged_image(
+            zarr_url,
+            overwrite_mode=init_args.overwrite_mode,
+            options=init_args.performance_options.staging,
+            timer=timer,
+        )
+        if init_args.performance_options.staging is not None
+        else nullcontext(None)
+    )
+    fast_overwrite = init_args.performance_options.fast_overwrite
+    # A staged image replaces the existing one at its commit, and a resumed
+    # image must be kept
+    overwrite = (
+        trashed_image(
+            zarr_url, image_path=tiled_image.path, options=fast_overwrite, timer=timer
+        )
+        if fast_overwrite is not None
+        and init_args.overwrite_mode == OverwriteMode.OVERWRITE
+        and init_args.existing_timepoints is None
+        and init_args.performance_options.staging is None
+        and init_args.performance_options.resumable is None
+        else nullcontext()
+    )
+    with overwrite, staging as staged_url:
+        ome_zarr = write_image_in_plate(
+            zarr_url=staged_url or zarr_url,
+            tiled_image=tiled_image,
+            converter_options=converter_options,
+            overwrite_mode=init_args.overwrite_mode,
+            performance_options=init_args.performance_options,
+            timer=timer,
+            existing_timepoints=init_args.existing_timepoints,
+        )
+    if staged_url is not None:
+        # The written container points to the staged files, removed by now
+        ome_zarr = open_ome_zarr_container(zarr_url, cache=True)
+    if init_args.source_fingerprint is not None:
+        write_source_fingerprint(zarr_url, init_args.source_fingerprint)
+    if init_args.tiled_image_json_dump_url is not None:
+        remove_json(init_args.tiled_image_json_dump_url)
+    logger.info(f"Stage breakdown: {timer.summary()}")
+    update = image_list_update(
+        zarr_url=zarr_url, ome_zarr=ome_zarr, tiled_image=tiled_image
+    )
+    if init_args.performance_options.pyramid.mode == PyramidMode.DEFERRED:
+        for image_update in update["image_list_updates"]:
+            image_update["types"][PYRAMID_PENDING_TYPE] = True
+    return update
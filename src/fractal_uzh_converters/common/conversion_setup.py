@@ -0,0 +1,284 @@
+"""Shared setup of the parallelization list for the plate converters."""
+
+import logging
+
+from ome_zarr_converters_tools import (
+    ConverterOptions,
+    OverwriteMode,
+    TiledImage,
+    join_url_paths,
+    setup_images_for_conversion,
+)
+from ome_zarr_converters_tools.fractal import cleanup_if_exists
+from ome_zarr_converters_tools.pipelines import setup_ome_zarr_collection
+
+from fractal_uzh_converters.common.chunking import compute_auto_chunking
+from fractal_uzh_converters.common.fast_overwrite import trash_plates
+from fractal_uzh_converters.common.incremental import (
+    select_changed_images,
+    source_fingerprints,
+)
+from fractal_uzh_converters.common.object_store import (
+    configure_object_store,
+    is_remote_url,
+)
+from fractal_uzh_converters.common.parallelization_payload import write_payload
+from fractal_uzh_converters.common.performance_options import PerformanceOptions
+from fractal_uzh_converters.common.plate_metadata import remove_consolidated_metadata
+from fractal_uzh_converters.common.preflight import run_preflight_check
+from fractal_uzh_converters.common.scheduling import estimate_cost, schedule_order
+from fractal_uzh_converters.common.tiff_probe import probe_tiled_images
+from fractal_uzh_converters.common.timepoint_append import select_new_timepoints
+
+logger = logging.getLogger(__name__)
+
+
+def setup_plate_conversion(
+    *,
+    tiled_images: list[TiledImage],
+    zarr_dir: str,
+    converter_options: ConverterOptions,
+    overwrite_mode: OverwriteMode,
+    performance_options: PerformanceOptions,
+) -> list[dict]:
+    """Set up the plates and build the parallelization list.
+
+    With an incremental conversion in "Extend" or "Overwrite" mode, only the
+    images whose inputs changed since their last conversion are set up. The
+    existing plates are kept, and the changed images are overwritten.
+
+    When appending timepoints in "Extend" mode, the existing images without new
+    timepoints are skipped, and the others only get their new timepoints.
+
+    If the preflight check is enabled, the source files of the selected images
+    are checked before anything is written, and all the missing files are
+    reported at once.
+    With the TIFF header probe, the images are checked against the headers of
+    their files, and get the data type of their files.
+
+    The Zarr directory can be an object store URL, with the connection settings
+    of the performance options.
+
+    With fast overwrite in "Overwrite" mode, the existing plates are moved to
+    the trash once the checks passed, and deleted in the background. In
+    "Extend" mode, the consolidated metadata of the existing plates is
+    removed.
+
+    Args:
+        tiled_images (list[TiledImage]): The images to convert.
+        zarr_dir (str): Directory to store the Zarr files.
+        converter_options (ConverterOptions): Advanced converter options.
+        overwrite_mode (OverwriteMode): Overwrite mode for existing data.
+        performance_options (PerformanceOptions): Performance tuning options.
+
+    Returns:
+        list[dict]: The parallelization list, one item per image, ordered by
+            the scheduling policy.
+
+    Raises:
+        SourceFilesError: If the preflight check finds missing or truncated
+            source files.
+        ValueError: If the TIFF headers do not match the metadata, or if
+            resumable writing, scratch staging or fast overwrite is requested
+            for an object store.
+    """
+    if performance_options.object_store is not None:
+        configure_object_store(performance_options.object_store)
+    if is_remote_url(zarr_dir) and performance_options.resumable is not None:
+        # The completion log is appended to, which objects do not support
+        raise ValueError("Resumable Writing requires a local Zarr directory.")
+    if is_remote_url(zarr_dir) and performance_options.staging is not None:
+        raise ValueError("Scratch Staging requires a local Zarr directory.")
+    if is_remote_url(zarr_dir) and performance_options.fast_overwrite is not None:
+        raise ValueError("Fast Overwrite requires a local Zarr directory.")
+
+    fingerprints = None
+    image_overwrite_mode = overwrite_mode
+    incremental = performance_options.incremental
+    if incremental is not None and overwrite_mode == OverwriteMode.NO_OVERWRITE:
+        # New plates: the fingerprints are only recorded for the next runs
+        fingerprints = source_fingerprints(
+            tiled_images,
+            converter_options=converter_options,
+            content_options=performance_options.content_options(),
+            mode=incremental.fingerprint,
+        )
+    elif incremental is not None:
+        tiled_images, fingerprints = select_changed_images(
+            tiled_images,
+            zarr_dir=zarr_dir,
+            converter_options=converter_options,
+            content_options=performance_options.content_options(),
+            options=incremental,
+        )
+        if not tiled_images:
+            return []
+        overwrite_mode = OverwriteMode.EXTEND
+        image_overwrite_mode = OverwriteMode.OVERWRITE
+
+    existing_timepoints = None
+    if performance_options.append_timepoints and overwrite_mode == OverwriteMode.EXTEND:
+        tiled_images, existing_timepoints = select_new_timepoints(
+            tiled_images, zarr_dir=zarr_dir
+        )
+        if not tiled_images:
+            return []
+
+    if performance_options.preflight is not None:
+        run_preflight_check(tiled_images, performance_options.preflight)
+    if performance_options.tiff_probe is not None:
+        tiled_images = probe_tiled_images(
+            tiled_images, zarr_dir=zarr_dir, options=performance_options.tiff_probe
+        )
+
+    chunks = None
+    if performance_options.auto_chunking is not None:
+        chunks = [
+            compute_auto_chunking(
+                tiled_image, performance_options.auto_chunking
+            ).model_dump()
+            for tiled_image in tiled_images
+        ]
+        logger.info(f"Automatic chunking applied to {len(tiled_images)} images.")
+
+    if overwrite_mode == OverwriteMode.EXTEND:
+        # The plates are changed, their consolidated metadata would be stale
+        plate_paths = {
+            tiled_image.collection.plate_path()  # type: ignore[attr-defined]
+            for tiled_image in tiled_images
+        }
+        for plate_path in sorted(plate_paths):
+            remove_consolidated_metadata(join_url_paths(zarr_dir, plate_path))
+
+    if (
+        performance_options.fast_overwrite is not None
+        and overwrite_mode == OverwriteMode.OVERWRITE
+    ):
+        trash_plates(
+            tiled_images,
+            zarr_dir=zarr_dir,
+            options=performance_options.fast_overwrite,
+        )
+
+    setup_function = (
+        _setup_compact_conversion
+        if performance_options.compact_payload is not None
+        else _setup_inline_conversion
+    )
+    parallelization_list = setup_function(
+        tiled_images=tiled_images,
+        zarr_dir=zarr_dir,
+        converter_options=converter_options,
+        overwrite_mode=overwrite_mode,
+        image_overwrite_mode=image_overwrite_mode,
+        performance_options=performance_options,
+        chunks=chunks,
+        fingerprints=fingerprints,
+        existing_timepoints=existing_timepoints,
+    )
+
+    # The parallelization list follows the order of the tiled images
+    costs = [estimate_cost(tiled_image) for tiled_image in tiled_images]
+    for item, cost in zip(parallelization_list, costs, strict=True):
+        item["init_args"]["estimated_bytes"] = cost
+    order = schedule_order(costs, performance_options.scheduling)
+    return [parallelization_list[index] for index in order]
+
+
+def _setup_inline_conversion(
+    *,
+    tiled_images: list[TiledImage],
+    zarr_dir: str,
+    converter_options: ConverterOptions,
+    overwrite_mode: OverwriteMode,
+    image_overwrite_mode: OverwriteMode,
+    performance_options: PerformanceOptions,
+    chunks: list[dict] | None,
+    fingerprints: list[str] | None,
+    existing_timepoints: list[int | None] | None,
+) -> list[dict]:
+    """Set up the plates, with the tiles of each image in its own JSON file."""
+    parallelization_list = setup_images_for_conversion(
+        tiled_images=tiled_images,
+        zarr_dir=zarr_dir,
+        converter_options=converter_options,
+        collection_type="ImageInPlate",
+        overwrite_mode=overwrite_mode,
+        ngff_version=converter_options.omezarr_options.ngff_version,
+    )
+
+    for item in parallelization_list:
+        item["init_args"]["performance_options"] = performance_options.model_dump()
+        if image_overwrite_mode != overwrite_mode:
+            item["init_args"]["overwrite_mode"] = image_overwrite_mode
+
+    if fingerprints is not None:
+        for item, fingerprint in zip(parallelization_list, fingerprints, strict=True):
+            item["init_args"]["source_fingerprint"] = fingerprint
+
+    if existing_timepoints is not None:
+        for item, timepoints in zip(
+            parallelization_list, existing_timepoints, strict=True
+        ):
+            if timepoints is not None:
+                item["init_args"]["existing_timepoints"] = timepoints
+
+    if chunks is not None:
+        for item, image_chunks in zip(parallelization_list, chunks, strict=True):
+            omezarr_options = item["init_args"]["converter_options"]["omezarr_options"]
+            omezarr_options["chunks"] = image_chunks
+    return parallelization_list
+
+
+def _setup_compact_conversion(
+    *,
+    tiled_images: list[TiledImage],
+    zarr_dir: str,
+    converter_options: ConverterOptions,
+    overwrite_mode: OverwriteMode,
+    image_overwrite_mode: OverwriteMode,
+    performance_options: PerformanceOptions,
+    chunks: list[dict] | None,
+    fingerprints: list[str] | None,
+    existing_timepoints: list[int | None] | None,
+) -> list[dict]:
+    """Set up the plates, with the tiles and options written to a sidecar file."""
+    assert performance_options.compact_payload is not None
+    setup_ome_zarr_collection(
+        tiled_images=tiled_images,
+        collection_type="ImageInPlate",
+        zarr_dir=zarr_dir,
+        ngff_version=converter_options.omezarr_options.ngff_version,
+        overwrite_mode=overwrite_mode,
+    )
+    temp_json_url = converter_options.temp_json_options.format_temp_url(
+        zarr_dir=zarr_dir
+    )
+    cleanup_if_exists(temp_json_url=temp_json_url)
+    shared = {
+        "converter_options": converter_options.model_dump(mode="json"),
+        "overwrite_mode": image_overwrite_mode,
+        "performance_options": performance_options.model_dump(mode="json"),
+    }
+    references = write_payload(
+        temp_json_url=temp_json_url,
+        shared=shared,
+        tiled_images=tiled_images,
+        chunks=chunks,
+        options=performance_options.compact_payload,
+        fingerprints=fingerprints,
+        existing_timepoints=existing_timepoints,
+    )
+    init_args: dict = {}
+    if performance_options.object_store is not None:
+        # The compute task needs the connection settings to read the payload
+        init_args["performance_options"] = {
+            "object_store": performance_options.object_store.model_dump()
+        }
+    return [
+        {
+            "zarr_url": join_url_paths(zarr_dir, tiled_image.path),
+            "init_args": {**init_args, "payload": reference.model_dump()},
+        }
+        for tiled_image, reference in zip(tiled_images, references, strict=True)
+    ]
@@ -0,0 +1,246 @@
+"""Fast overwrite of existing plates and images.
+
+In "Overwrite" mode, the existing data is normally deleted file by file before
+the conversion starts, and a plate can hold millions of chunk files. With fast
+overwrite, the existing plate or image is renamed to the trash directory of the
+Zarr directory instead (a single, atomic metadata operation), the conversion
+starts at once and the old tree is deleted in parallel:
+
+- the plates replaced by the init task are deleted by a detached process,
+  started at the end of the init task, or left in the trash to be deleted by a
+  separate cleanup job:
+
+      python -m fractal_uzh_converters.common.fast_overwrite /path/to/zarr_dir
+
+- the images replaced by a compute task (e.g. the changed images of an
+  incremental conversion) are deleted by a background thread while the new
+  image is written.
+
+The trash is a hidden directory of the Zarr directory, on the same filesystem,
+so the renames never copy data. Whatever is left in it (e.g. by an interrupted
+cleanup) is deleted by the next cleanup.
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from pathlib import Path, PurePosixPath
+from uuid import uuid4
+
+from ome_zarr_converters_tools import (
+    TiledImage,
+    local_url_to_path,
+)
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common.stage_timer import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Directory of the Zarr directory holding the replaced plates and images
+TRASH_DIR = ".trash"
+
+
+class FastOverwrite(BaseModel):
+    """Move the data to overwrite to the trash, and delete it in parallel."""
+
+    delete_workers: int = Field(default=16, ge=1, title="Delete Workers")
+    """Number of threads deleting the files of the replaced data."""
+    background: bool = Field(default=True, title="Background Cleanup")
+    """
+    Delete the plates replaced by the init task in a detached process. If
+    false, they are left in the trash directory of the Zarr directory, to be
+    deleted by a separate cleanup job (e.g. when the processes of the init job
+    are killed at its end, as SLURM does).
+    """
+    model_config = ConfigDict(extra="forbid")
+
+
+def _delete_files(directory: str, names: list[str]) -> None:
+    for name in names:
+        # Tolerates a concurrent cleanup of the same tree
+        with suppress(FileNotFoundError):
+            os.unlink(os.path.join(directory, name))
+
+
+def _remove_directory(directory: str) -> None:
+    with suppress(FileNotFoundError):
+        os.rmdir(directory)
+
+
+def delete_tree(path: Path, workers: int) -> int:
+    """Delete a directory tree, with the files deleted by a thread pool.
+
+    Args:
+        path (Path): The directory to delete.
+        workers (int): Number of threads deleting the files.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    directories: dict[int, list[str]] = defaultdict(list)
+    num_files = 0
+    with ThreadPoolExecutor(workers, thread_name_prefix="delete") as pool:
+        futures = []
+        for directory, _, names in os.walk(path):
+            directories[directory.count(os.sep)].append(directory)
+            if names:
+                futures.append(pool.submit(_delete_files, directory, names))
+                num_files += len(names)
+        for future in futures:
+            future.result()
+        # Deepest first, the directories are empty once their children are gone
+        for depth in sorted(directories, reverse=True):
+            list(pool.map(_remove_directory, directories[depth]))
+    return num_files
+
+
+def move_to_trash(path: Path, zarr_dir: Path) -> Path:
+    """Move a plate or image to the trash directory, atomically.
+
+    Args:
+        path (Path): The plate or image to move.
+        zarr_dir (Path): The Zarr directory holding it.
+
+    Returns:
+        Path: The new path of the moved directory.
+    """
+    trash = zarr_dir / TRASH_DIR
+    trash.mkdir(exist_ok=True)
+    trashed = trash / f"{path.name}-{uuid4().hex}"
+    os.rename(path, trashed)
+    logger.info(f"Moved {path} to the trash.")
+    return trashed
+
+
+def empty_trash(zarr_dir: Path, workers: int) -> int:
+    """Delete the content of the trash directory of a Zarr directory.
+
+    Args:
+        zarr_dir (Path): The Zarr directory.
+        workers (int): Number of threads deleting the files.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    trash = zarr_dir / TRASH_DIR
+    if not trash.exists():
+        return 0
+    num_files = 0
+    for entry in sorted(trash.iterdir()):
+        num_files += delete_tree(entry, workers)
+    # Data moved to the trash in the meantime is left for the next cleanup
+    with suppress(OSError):
+        trash.rmdir()
+    logger.info(f"Deleted {num_files} files from {trash}.")
+    return num_files
+
+
+def start_background_cleanup(zarr_dir: Path, workers: int) -> subprocess.Popen:
+    """Empty the trash of a Zarr directory in a detached process.
+
+    The process outlives the calling process, it runs in its own session.
+
+    Args:
+        zarr_dir (Path): The Zarr directory.
+        workers (int): Number of threads deleting the files.
+
+    Returns:
+        subprocess.Popen: The cleanup process.
+    """
+    command = [sys.executable, "-m", __name__, str(zarr_dir), "--workers", str(workers)]
+    logger.info(f"Starting the background cleanup of {zarr_dir / TRASH_DIR}.")
+    return subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def trash_plates(
+    tiled_images: list[TiledImage], *, zarr_dir: str, options: FastOverwrite
+) -> None:
+    """Move the existing plates of the images to the trash, and delete them.
+
+    Args:
+        tiled_images (list[TiledImage]): The images to convert, in plates.
+        zarr_dir (str): The local Zarr directory.
+        options (FastOverwrite): The fast overwrite options.
+    """
+    zarr_dir_path = local_url_to_path(zarr_dir)
+    plate_paths = {
+        zarr_dir_path / tiled_image.collection.plate_path()  # type: ignore[attr-defined]
+        for tiled_image in tiled_images
+    }
+    trashed = [
+        move_to_trash(plate_path, zarr_dir_path)
+        for plate_path in sorted(plate_paths)
+        if plate_path.exists()
+    ]
+    if not trashed:
+        return
+    if options.background:
+        start_background_cleanup(zarr_dir_path, options.delete_workers)
+    else:
+        logger.info(
+            f"The replaced plates are left in {zarr_dir_path / TRASH_DIR}, "
+            f"delete them with: python -m {__name__} {zarr_dir_path}"
+        )
+
+
+@contextmanager
+def trashed_image(
+    zarr_url: str, *, image_path: str, options: FastOverwrite, timer: StageTimer
+) -> Iterator[None]:
+    """Move an existing image to the trash, and delete it while the block runs.
+
+    The deletion is awaited when the block exits. If it fails, the image is
+    left in the trash for the next cleanup.
+
+    Args:
+        zarr_url (str): The URL of the image, in a local Zarr directory.
+        image_path (str): The path of the image in the Zarr directory.
+        options (FastOverwrite): The fast overwrite options.
+        timer (StageTimer): Timer collecting the per-stage timings.
+    """
+    path = local_url_to_path(zarr_url)
+    if not path.exists():
+        yield
+        return
+    zarr_dir = path.parents[len(PurePosixPath(image_path).parts) - 1]
+    with timer.measure("trash"):
+        trashed = move_to_trash(path, zarr_dir)
+    with ThreadPoolExecutor(1, thread_name_prefix="trash") as pool:
+        deletion = pool.submit(delete_tree, trashed, options.delete_workers)
+        try:
+            yield
+        finally:
+            with timer.measure("trash wait"):
+                try:
+                    num_files = deletion.result()
+                except OSError as error:
+                    logger.warning(f"Could not delete {trashed}: {error}")
+                else:
+                    logger.info(f"Deleted {num_files} files of the replaced image.")
+
+
+def main() -> None:
+    """Empty the trash of a Zarr directory."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("zarr_dir", type=Path, help="The Zarr directory.")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    empty_trash(args.zarr_dir, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Finalize the plate and well metadata of the converted images."""
+
+import logging
+
+from pydantic import validate_call
+
+from fractal_uzh_converters.common.plate_metadata import (
+    finalize_plate_metadata,
+    images_by_plate,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@validate_call
+def finalize_plate_metadata_task(
+    *,
+    # Fractal parameters
+    zarr_urls: list[str],
+    zarr_dir: str,
+    # Task parameters
+    consolidate: bool = True,
+    max_workers: int = 16,
+) -> None:
+    """Write the well and plate metadata of the converted images in one pass.
+
+    Adds the converted images missing from the well and plate metadata, and
+    removes the images and wells that do not exist, writing each changed
+    document once. The metadata of each plate can then be consolidated, so
+    that viewers open the plate with a single read.
+
+    Args:
+        zarr_urls (list[str]): List of URLs to the OME-Zarr images.
+        zarr_dir (str): Not used by this task.
+        consolidate (bool): Consolidate the metadata of each plate in its root
+            document. Run this task again after changing the plate.
+        max_workers (int): Number of wells of a plate read and written in
+            parallel.
+    """
+    plates = images_by_plate(zarr_urls)
+    logger.info(f"Finalizing the metadata of {len(plates)} plates.")
+    for plate_url, images in sorted(plates.items()):
+        finalize_plate_metadata(
+            plate_url, images, consolidate=consolidate, workers=max_workers
+        )
+
+
+if __name__ == "__main__":
+    from fractal_task_tools.task_wrapper import run_fractal_task
+
+    run_fractal_task(
+        task_function=finalize_plate_metadata_task, logger_name=logger.name
+    )
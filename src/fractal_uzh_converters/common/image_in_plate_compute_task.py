@@ -3,15 +3,14 @@
 import logging
 import time
 
-from ome_zarr_converters_tools import (
-    ConvertParallelInitArgs,
-    DefaultImageLoader,
-    ImageInPlate,
-    ImageListUpdateDict,
-    generic_compute_task,
-)
+from ome_zarr_converters_tools import ImageListUpdateDict
 from pydantic import validate_call
 
+from fractal_uzh_converters.common.compute_pipeline import (
+    ImageInPlateInitArgs,
+    run_image_in_plate_compute,
+)
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,21 +19,16 @@ def image_in_plate_compute_task(
     *,
     # Fractal parameters
     zarr_url: str,
-    init_args: ConvertParallelInitArgs,
+    init_args: ImageInPlateInitArgs,
 ) -> ImageListUpdateDict:
     """Create a single OME-Zarr image in a OME-Zarr plate.
 
     Args:
         zarr_url (str): URL to the OME-Zarr file.
-        init_args (ConvertParallelInitArgs): Arguments for the compute task.
+        init_args (ImageInPlateInitArgs): Arguments for the compute task.
     """
     timer = time.time()
-    img_list_update = generic_compute_task(
-        zarr_url=zarr_url,
-        init_args=init_args,
-        collection_type=ImageInPlate,
-        image_loader_type=DefaultImageLoader,
-    )
+    img_list_update = run_image_in_plate_compute(zarr_url=zarr_url, init_args=init_args)
     zarr_output = img_list_update["image_list_updates"][0]["zarr_url"]
     run_time = time.time() - timer
     logger.info(f"Succesfully converted: {zarr_output}, in {run_time:.2f}[s]")
@@ -0,0 +1,177 @@
+"""Incremental reconversion of the images whose source files changed.
+
+Each converted image stores a fingerprint of its inputs: the hash of its parsed
+metadata and options, and either the size and modification time or the content
+hash of each of its source files. The fingerprint is only written once the
+compute task has completed the image.
+
+When a plate is converted again in "Extend" or "Overwrite" mode, the init task
+computes the fingerprint of each image and only emits the images whose stored
+fingerprint differs (or is missing) to the parallelization list.
+"""
+
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from enum import StrEnum
+from typing import Any
+
+from ome_zarr_converters_tools import (
+    ConverterOptions,
+    TiledImage,
+    join_url_paths,
+)
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common.completion_log import image_fingerprint
+from fractal_uzh_converters.common.object_store import read_bytes, write_bytes
+from fractal_uzh_converters.common.parallelism import IO_THREADS
+
+logger = logging.getLogger(__name__)
+
+SOURCE_FINGERPRINT_NAME = ".source_fingerprint"
+
+_HASH_BLOCK_SIZE = 2**20
+
+
+class FingerprintMode(StrEnum):
+    """How the source files of an image are fingerprinted."""
+
+    SIZE_AND_TIME = "Size and Modification Time"
+    CONTENT = "Content Hash"
+
+
+class IncrementalConversion(BaseModel):
+    """Only convert again the images whose inputs changed."""
+
+    fingerprint: FingerprintMode = Field(
+        default=FingerprintMode.SIZE_AND_TIME, title="Source File Fingerprint"
+    )
+    """
+    How the source files are compared with the previous conversion.
+    - Size and Modification Time: a single stat per file, the fastest.
+    - Content Hash: hash the content of every file (BLAKE2), to also detect
+        files rewritten with the same size and modification time.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+
+def _source_files(tiled_image: TiledImage) -> list[str]:
+    files = {
+        getattr(region.image_loader, "file_path", None)
+        for region in tiled_image.regions
+    }
+    files.discard(None)
+    return sorted(files)
+
+
+def _file_fingerprint(path: str, mode: FingerprintMode) -> str:
+    try:
+        if mode == FingerprintMode.SIZE_AND_TIME:
+            stat = os.stat(path)
+            return f"{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            while block := f.read(_HASH_BLOCK_SIZE):
+                digest.update(block)
+        return digest.hexdigest()
+    except FileNotFoundError:
+        # Converted again, so that the compute task reports the missing file
+        return "missing"
+
+
+def source_fingerprints(
+    tiled_images: list[TiledImage],
+    *,
+    converter_options: ConverterOptions,
+    content_options: dict[str, Any],
+    mode: FingerprintMode,
+) -> list[str]:
+    """Fingerprint the inputs of each image.
+
+    Args:
+        tiled_images (list[TiledImage]): The images to convert.
+        converter_options (ConverterOptions): The converter options.
+        content_options (dict[str, Any]): The performance options that change
+            the written data, as JSON compatible values.
+        mode (FingerprintMode): How the source files are fingerprinted.
+
+    Returns:
+        list[str]: The fingerprint of each image.
+    """
+    files = [_source_files(tiled_image) for tiled_image in tiled_images]
+    with ThreadPoolExecutor(IO_THREADS) as pool:
+        file_fingerprints = pool.map(
+            lambda path: _file_fingerprint(path, mode),
+            [path for image_files in files for path in image_files],
+        )
+        fingerprints = []
+        for tiled_image, image_files in zip(tiled_images, files, strict=True):
+            digest = hashlib.sha256()
+            digest.update(
+                image_fingerprint(
+                    tiled_image=tiled_image,
+                    converter_options=converter_options,
+                    content_options=content_options,
+                ).encode()
+            )
+            for path in image_files:
+                digest.update(f"{path}={next(file_fingerprints)}\n".encode())
+            fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+def read_source_fingerprint(zarr_url: str) -> str | None:
+    """Fingerprint stored by the last completed conversion of an image."""
+    url = join_url_paths(zarr_url, SOURCE_FINGERPRINT_NAME)
+    try:
+        return read_bytes(url).decode().strip()
+    except FileNotFoundError:
+        return None
+
+
+def write_source_fingerprint(zarr_url: str, fingerprint: str) -> None:
+    """Store the fingerprint of a completed image, atomically."""
+    write_bytes(join_url_paths(zarr_url, SOURCE_FINGERPRINT_NAME), fingerprint.encode())
+
+
+def select_changed_images(
+    tiled_images: list[TiledImage],
+    *,
+    zarr_dir: str,
+    converter_options: ConverterOptions,
+    content_options: dict[str, Any],
+    options: IncrementalConversion,
+) -> tuple[list[TiledImage], list[str]]:
+    """Select the images whose inputs changed since their last conversion.
+
+    Args:
+        tiled_images (list[TiledImage]): The images to convert.
+        zarr_dir (str): Directory of the Zarr files.
+        converter_options (ConverterOptions): The converter options.
+        content_options (dict[str, Any]): The performance options that change
+            the written data, as JSON compatible values.
+        options (IncrementalConversion): The incremental conversion options.
+
+    Returns:
+        tuple[list[TiledImage], list[str]]: The images to convert, and their
+            fingerprints.
+    """
+    fingerprints = source_fingerprints(
+        tiled_images,
+        converter_options=converter_options,
+        content_options=content_options,
+        mode=options.fingerprint,
+    )
+    changed = [
+        (tiled_image, fingerprint)
+        for tiled_image, fingerprint in zip(tiled_images, fingerprints, strict=True)
+        if read_source_fingerprint(join_url_paths(zarr_dir, tiled_image.path))
+        != fingerprint
+    ]
+    logger.info(
+        f"{len(changed)} of {len(tiled_images)} images changed since their last "
+        "conversion."
+    )
+    return [image for image, _ in changed], [fp for _, fp in changed]
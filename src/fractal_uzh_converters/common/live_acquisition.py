@@ -0,0 +1,482 @@
+"""Conversion of acquisitions that are still running.
+
+During long (time-lapse) acquisitions, the metadata file of the microscope
+(e.g. the CQ3K `MeasurementData.mlf` or the Operetta `Index.idx.xml`) keeps
+growing, one record per image file. In live mode, each run of the init task
+only reads the records appended since the previous run, starting from the byte
+offset where the previous run stopped, and emits the images (wells) that are
+now complete. Each record is parsed once when it is read; for the images that
+are not complete yet, only their progress is kept for the next run (the
+timepoints seen and the byte ranges of their records in the file), and their
+records are read back from the file once they are complete.
+
+An image is complete when the acquisition is finished (the root element of the
+metadata file is closed), or when the microscope moved on to another image
+after having acquired all the expected timepoints of this one. The Operetta
+index file does not hold the number of timepoints, so unless it is set in the
+options, its images are only complete once the acquisition is finished.
+
+The state of each acquisition is stored as a JSON file in the `zarr_dir`, and
+only saved once the parallelization list has been built, so that an init task
+that fails emits the same images again on the next run.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from typing import Any, BinaryIO, Protocol
+
+from ome_zarr_converters_tools import (
+    ConverterOptions,
+    TiledImage,
+    join_url_paths,
+    local_url_to_path,
+)
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common.object_store import read_bytes, write_bytes
+from fractal_uzh_converters.common.utils import BaseAcquisitionModel
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATE_DIR = ".live_acquisitions"
+
+# Start or end tag, the attributes may contain quoted ">"
+_TAG = re.compile(rb"<(/?)([\w.:-]+)((?:\"[^\"]*\"|'[^']*'|[^'\">])*?)(/?)>")
+
+
+class LiveAcquisition(BaseModel):
+    """Convert the complete wells of an acquisition that is still running."""
+
+    timepoints: int | None = Field(default=None, ge=1, title="Expected Timepoints")
+    """
+    Number of timepoints of the acquisition. A well is converted as soon as
+    all its timepoints are acquired and the microscope moved on to another
+    well. If not set, the number of timepoints in the metadata is used when
+    available (CQ3K). The Operetta metadata does not hold it, so without this
+    option the Operetta wells are only converted once the acquisition is
+    finished.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+
+class LiveParser(Protocol):
+    """Vendor specific parsing of the records of a live acquisition."""
+
+    record_tag: str
+    """Local name of the elements holding one record each."""
+    container_tag: str
+    """Local name of the element containing the records."""
+
+    def metadata_path(self, acquisition_model: Any) -> str:
+        """Path of the growing metadata file of an acquisition."""
+        ...
+
+    def parse_records(self, document: str) -> list[Any]:
+        """Parse a document into its records, one per record element."""
+        ...
+
+    def image_key(self, record: Any) -> str | None:
+        """Key of the image of a record, or None to ignore the record."""
+        ...
+
+    def timepoint(self, record: Any) -> int:
+        """Timepoint of a record."""
+        ...
+
+    def expected_timepoints(self, acquisition_model: Any) -> int | None:
+        """Number of timepoints of the acquisition, if known in advance."""
+        ...
+
+    def build_tiled_images(
+        self,
+        records: list[Any],
+        *,
+        acquisition_model: Any,
+        converter_options: ConverterOptions,
+    ) -> list[TiledImage]:
+        """Build the tiled images of complete records."""
+        ...
+
+
+class PendingImage(BaseModel):
+    """Progress of an image of a live acquisition that is not complete yet."""
+
+    timepoints: list[int] = Field(default_factory=list)
+    """Distinct timepoints of the records read so far."""
+    spans: list[tuple[int, int]] = Field(default_factory=list)
+    """
+    Start and end byte offsets of the records in the metadata file, merged
+    when the records are consecutive.
+    """
+
+
+class LiveAcquisitionState(BaseModel):
+    """Progress of the conversion of a live acquisition."""
+
+    offset: int = 0
+    """Bytes of the metadata file consumed so far."""
+    header_size: int = 0
+    header_hash: str | None = None
+    """Hash of the start of the file up to the first record, to detect
+    rewritten files."""
+    stamp: str = ""
+    """Size and modification time of the metadata file when its header was
+    read, identifying the version of the file the records are read from."""
+    wrapper_open: str = ""
+    wrapper_close: str = ""
+    """Start and end tags enclosing the records, to parse them on their own."""
+    finished: bool = False
+    pending: dict[str, PendingImage] = Field(default_factory=dict)
+    """Progress of the images that are not complete yet, by key."""
+    current: str | None = None
+    """Key of the image of the last record read, which might get more records."""
+    emitted: dict[str, str] = Field(default_factory=dict)
+    """Keys of the images already emitted, with the stamp of the version of the
+    metadata file they were read from. The images of a rewritten file are
+    emitted again."""
+
+    @property
+    def done(self) -> bool:
+        """Whether the acquisition is finished and all its images emitted."""
+        return self.finished and not self.pending
+
+
+def _local_name(name: bytes) -> bytes:
+    return name.rsplit(b":", 1)[-1]
+
+
+def _find_header(data: bytes, container_tag: str) -> tuple[int, str, str] | None:
+    """Find the start tag of the container of the records.
+
+    Returns:
+        tuple[int, str, str] | None: The end offset of the container start tag,
+            and the tags opening and closing the elements enclosing the records,
+            or None if the container was not written yet.
+    """
+    stack: list[tuple[bytes, bytes]] = []
+    for match in _TAG.finditer(data):
+        closing, name, _, self_closing = match.groups()
+        if closing:
+            if stack:
+                stack.pop()
+        elif not self_closing:
+            stack.append((name, match.group(0)))
+            if _local_name(name) == container_tag.encode():
+                wrapper_open = b"".join(tag for _, tag in stack)
+                wrapper_close = b"".join(b"</%s>" % n for n, _ in reversed(stack))
+                return match.end(), wrapper_open.decode(), wrapper_close.decode()
+    return None
+
+
+def _stamp(f: BinaryIO) -> str:
+    stat = os.fstat(f.fileno())
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _record_pattern(record_tag: str) -> re.Pattern[bytes]:
+    tag = re.escape(record_tag.encode())
+    return re.compile(
+        rb"<(?:[\w.-]+:)?%s\b(?:\"[^\"]*\"|'[^']*'|[^'\">])*?"
+        rb"(?:/>|>.*?</(?:[\w.-]+:)?%s\s*>)" % (tag, tag),
+        re.DOTALL,
+    )
+
+
+def read_appended_records(
+    path: str, state: LiveAcquisitionState, *, parser: LiveParser
+) -> list[tuple[int, int, str]]:
+    """Read the records appended to a metadata file since the last read.
+
+    Records still being written (without their end tag) are left for the
+    next read. If the file was truncated or rewritten, it is read again from
+    the start.
+
+    Args:
+        path (str): Path of the metadata file.
+        state (LiveAcquisitionState): The state of the acquisition, updated.
+        parser (LiveParser): The vendor parser.
+
+    Returns:
+        list[tuple[int, int, str]]: The start and end byte offsets in the file
+            and the raw text of each record read.
+    """
+    with open(local_url_to_path(path), "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if state.header_hash is not None:
+            f.seek(0)
+            header = f.read(state.header_size)
+            if (
+                size < state.offset
+                or hashlib.sha256(header).hexdigest() != state.header_hash
+            ):
+                logger.warning(f"{path} was rewritten, reading it from the start.")
+                state.offset = state.header_size = 0
+                state.header_hash = None
+                state.finished = False
+                state.pending = {}
+                state.current = None
+        if state.header_hash is None:
+            f.seek(0)
+            data = f.read()
+            found = _find_header(data, parser.container_tag)
+            if found is None:
+                return []
+            state.header_size, state.wrapper_open, state.wrapper_close = found
+            state.header_hash = hashlib.sha256(data[: state.header_size]).hexdigest()
+            state.stamp = _stamp(f)
+            state.offset = state.header_size
+            data = data[state.offset :]
+        else:
+            f.seek(state.offset)
+            data = f.read()
+
+    start, records, end = state.offset, [], 0
+    for match in _record_pattern(parser.record_tag).finditer(data):
+        records.append(
+            (start + match.start(), start + match.end(), match.group(0).decode())
+        )
+        end = match.end()
+    state.offset += end
+    container_end = rb"</(?:[\w.-]+:)?%s\s*>" % re.escape(parser.container_tag.encode())
+    if re.search(container_end, data[end:]):
+        state.finished = True
+    return records
+
+
+def read_spans(path: str, spans: list[tuple[int, int]]) -> list[str]:
+    """Read byte ranges of a metadata file, e.g. the records of an image."""
+    chunks = []
+    with open(local_url_to_path(path), "rb") as f:
+        for start, end in spans:
+            f.seek(start)
+            chunks.append(f.read(end - start).decode())
+    return chunks
+
+
+def complete_images(
+    pending: dict[str, PendingImage],
+    *,
+    current: str | None,
+    expected_timepoints: int | None,
+    finished: bool,
+) -> set[str]:
+    """Keys of the complete images, given the progress of the pending ones.
+
+    Args:
+        pending (dict[str, PendingImage]): The images that are not complete
+            yet, by key.
+        current (str | None): The key of the image of the last record read.
+        expected_timepoints (int | None): The number of timepoints of an image.
+        finished (bool): Whether the acquisition is finished.
+
+    Returns:
+        set[str]: The keys of the complete images.
+    """
+    if finished:
+        return set(pending)
+    if expected_timepoints is None:
+        return set()
+    # The image acquired last might still get records
+    return {
+        key
+        for key, image in pending.items()
+        if key != current and len(image.timepoints) >= expected_timepoints
+    }
+
+
+def live_state_path(acquisition_model: BaseAcquisitionModel, zarr_dir: str) -> str:
+    """Path of the state file of a live acquisition."""
+    name = (
+        f"{acquisition_model.normalized_plate_name}_"
+        f"{acquisition_model.acquisition_id}.json"
+    )
+    return join_url_paths(zarr_dir, LIVE_STATE_DIR, name)
+
+
+def _load_state(path: str) -> LiveAcquisitionState:
+    try:
+        return LiveAcquisitionState.model_validate_json(read_bytes(path))
+    except FileNotFoundError:
+        return LiveAcquisitionState()
+
+
+class LiveAcquisitionTracker:
+    """Emit the images of a live acquisition as they complete."""
+
+    def __init__(
+        self,
+        *,
+        parser: LiveParser,
+        acquisition_model: BaseAcquisitionModel,
+        options: LiveAcquisition,
+        zarr_dir: str,
+    ) -> None:
+        """Initialize the tracker, loading the state of the previous runs.
+
+        Args:
+            parser (LiveParser): The vendor parser.
+            acquisition_model (BaseAcquisitionModel): The acquisition.
+            options (LiveAcquisition): The live acquisition options.
+            zarr_dir (str): Directory of the Zarr files.
+        """
+        self.parser = parser
+        self.acquisition_model = acquisition_model
+        self.options = options
+        self.state_path = live_state_path(acquisition_model, zarr_dir)
+        self.state = _load_state(self.state_path)
+        self.started = bool(self.state.emitted)
+
+    def _document(self, records: list[str]) -> str:
+        return self.state.wrapper_open + "".join(records) + self.state.wrapper_close
+
+    def _track(self, appended: list[tuple[int, int, str]], path: str) -> None:
+        """Parse the appended records, and add them to the pending images."""
+        records = self.parser.parse_records(
+            self._document([raw for _, _, raw in appended])
+        )
+        emitted = {
+            key
+            for key, stamp in self.state.emitted.items()
+            if stamp == self.state.stamp
+        }
+        late = 0
+        for (start, end, _), record in zip(appended, records, strict=True):
+            key = self.parser.image_key(record)
+            if key in emitted:
+                late += 1
+                continue
+            if key is None:
+                continue
+            image = self.state.pending.setdefault(key, PendingImage())
+            timepoint = self.parser.timepoint(record)
+            if timepoint not in image.timepoints:
+                image.timepoints.append(timepoint)
+            if key == self.state.current and image.spans:
+                # Only records to ignore can lie in between, they are filtered
+                # out when the image is built
+                image.spans[-1] = (image.spans[-1][0], end)
+            else:
+                image.spans.append((start, end))
+            self.state.current = key
+        if late:
+            logger.warning(
+                f"Ignoring {late} records of images of {path} already converted."
+            )
+
+    def poll(self, converter_options: ConverterOptions) -> list[TiledImage]:
+        """Read the new records and build the images that are now complete.
+
+        Only the appended records are parsed, and the records of the complete
+        images are read back from the metadata file to build them.
+
+        Args:
+            converter_options (ConverterOptions): The converter options.
+
+        Returns:
+            list[TiledImage]: The images completed since the last saved run.
+        """
+        path = self.parser.metadata_path(self.acquisition_model)
+        appended = read_appended_records(path, self.state, parser=self.parser)
+        if appended:
+            self._track(appended, path)
+        if not self.state.pending:
+            return []
+        expected = self.options.timepoints or self.parser.expected_timepoints(
+            self.acquisition_model
+        )
+        complete = complete_images(
+            self.state.pending,
+            current=self.state.current,
+            expected_timepoints=expected,
+            finished=self.state.finished,
+        )
+        logger.info(
+            f"{len(complete)} images of {path} completed, "
+            f"{len(self.state.pending) - len(complete)} still being acquired."
+        )
+        if expected is None and not self.state.finished:
+            logger.info(
+                "The number of timepoints is unknown, the images are converted "
+                "once the acquisition is finished (set Expected Timepoints to "
+                "convert them earlier)."
+            )
+        if not complete:
+            return []
+        # In acquisition order
+        first_record = {key: self.state.pending[key].spans[0][0] for key in complete}
+        for key in sorted(complete, key=first_record.__getitem__):
+            self.state.emitted.pop(key, None)
+            self.state.emitted[key] = self.state.stamp
+        spans = sorted(
+            span for key in complete for span in self.state.pending.pop(key).spans
+        )
+        records = [
+            record
+            for record in self.parser.parse_records(
+                self._document(read_spans(path, spans))
+            )
+            if self.parser.image_key(record) in complete
+        ]
+        return self.parser.build_tiled_images(
+            records,
+            acquisition_model=self.acquisition_model,
+            converter_options=converter_options,
+        )
+
+    def save(self) -> None:
+        """Store the state, once the emitted images are scheduled."""
+        write_bytes(self.state_path, self.state.model_dump_json().encode())
+
+
+def poll_live_acquisitions(
+    *,
+    parser: LiveParser,
+    acquisitions: list[BaseAcquisitionModel],
+    converter_options: ConverterOptions,
+    options: LiveAcquisition,
+    zarr_dir: str,
+) -> tuple[list[TiledImage], list[LiveAcquisitionTracker]]:
+    """Build the images of live acquisitions completed since the last run.
+
+    The trackers must be saved once the images are scheduled for conversion.
+
+    Args:
+        parser (LiveParser): The vendor parser.
+        acquisitions (list[BaseAcquisitionModel]): The acquisitions.
+        converter_options (ConverterOptions): The converter options.
+        options (LiveAcquisition): The live acquisition options.
+        zarr_dir (str): Directory of the Zarr files.
+
+    Returns:
+        tuple[list[TiledImage], list[LiveAcquisitionTracker]]: The completed
+            images, and the tracker of each acquisition.
+    """
+    if not acquisitions:
+        raise ValueError("Acquisitions list is empty.")
+    trackers = [
+        LiveAcquisitionTracker(
+            parser=parser,
+            acquisition_model=acquisition,
+            options=options,
+            zarr_dir=zarr_dir,
+        )
+        for acquisition in acquisitions
+    ]
+    tiled_images = [
+        tiled_image
+        for tracker in trackers
+        for tiled_image in tracker.poll(converter_options)
+    ]
+    return tiled_images, trackers
+
+
+def live_acquisitions_done(
+    acquisitions: list[BaseAcquisitionModel], zarr_dir: str
+) -> bool:
+    """Whether all the live acquisitions are finished and converted."""
+    return all(
+        _load_state(live_state_path(acquisition, zarr_dir)).done
+        for acquisition in acquisitions
+    )
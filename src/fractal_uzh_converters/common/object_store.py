@@ -0,0 +1,131 @@
+"""Writing the plates to an S3-compatible object store.
+
+The Zarr directory can be an `s3://bucket/prefix` URL: the plates, the images
+and the sidecar files of this package are then written through fsspec (the
+`s3fs` package is required), without staging them on a POSIX filesystem.
+
+The connection settings are applied to the fsspec configuration of the
+process, so that every S3 filesystem created afterwards (by zarr, ngio,
+`ome_zarr_converters_tools` and this package) shares them:
+
+- a connection pool sized for the concurrent chunk uploads of zarr;
+- retries with an exponential backoff on throttling and transient errors;
+- multipart uploads of the large objects, with concurrent parts.
+
+The credentials are not part of the options, they are read from the usual AWS
+environment variables or configuration files.
+"""
+
+import logging
+import os
+from typing import Any
+
+import fsspec
+import fsspec.config
+import zarr
+from fsspec.core import split_protocol
+from ome_zarr_converters_tools import local_url_to_path
+from pydantic import BaseModel, ConfigDict, Field
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectStore(BaseModel):
+    """Connection settings of the S3-compatible store holding the Zarr directory."""
+
+    endpoint_url: str | None = Field(default=None, title="Endpoint URL")
+    """
+    URL of the S3 API, for stores other than AWS (e.g. MinIO or Ceph). If not
+    set, the endpoint of the AWS configuration is used.
+    """
+    max_connections: int = Field(default=64, ge=1, title="Max Connections")
+    """
+    Size of the connection pool, also the maximum number of chunks uploaded
+    concurrently by zarr.
+    """
+    max_attempts: int = Field(default=10, ge=1, title="Max Attempts")
+    """
+    Attempts of each request, retried with an exponential backoff on
+    throttling and transient errors.
+    """
+    part_size_mb: int = Field(default=16, ge=5, title="Part Size (MB)")
+    """Objects larger than this are uploaded in parts of this size."""
+    part_concurrency: int = Field(default=8, ge=1, title="Concurrent Parts")
+    """Number of parts of a multipart upload sent concurrently."""
+    model_config = ConfigDict(extra="forbid")
+
+    def storage_options(self) -> dict[str, Any]:
+        """The `s3fs` filesystem arguments of these settings."""
+        options: dict[str, Any] = {
+            "config_kwargs": {
+                "max_pool_connections": self.max_connections,
+                "retries": {"max_attempts": self.max_attempts, "mode": "standard"},
+            },
+            "default_block_size": self.part_size_mb * 2**20,
+            "max_concurrency": self.part_concurrency,
+        }
+        if self.endpoint_url is not None:
+            options["endpoint_url"] = self.endpoint_url
+        return options
+
+
+def is_remote_url(url: str) -> bool:
+    """Whether a file is referenced by a URL (e.g. `s3://...`), not a path."""
+    protocol, _ = split_protocol(url)
+    return protocol is not None
+
+
+def configure_object_store(options: ObjectStore) -> None:
+    """Apply the connection settings to the S3 filesystems of the process.
+
+    Must be called before the first access to the store, as fsspec caches the
+    filesystem instances.
+
+    Args:
+        options (ObjectStore): The connection settings.
+    """
+    fsspec.config.conf["s3"] = options.storage_options()
+    # Zarr otherwise caps the concurrent chunk reads and writes far below
+    # the connection pool
+    zarr.config.set({"async.concurrency": options.max_connections})
+    logger.info(
+        f"Object store configured: {options.max_connections} connections, "
+        f"{options.max_attempts} attempts per request."
+    )
+
+
+def read_bytes(url: str) -> bytes:
+    """Read a whole file, from a local path or a URL.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    if not is_remote_url(url):
+        return local_url_to_path(url).read_bytes()
+    fs, path = fsspec.core.url_to_fs(url)
+    return fs.cat_file(path)
+
+
+def write_bytes(url: str, data: bytes) -> None:
+    """Write a whole file, so that readers never see it partially written.
+
+    Local files are written next to their destination and renamed, objects
+    are written with a single request (a PUT replaces an object atomically).
+    """
+    if is_remote_url(url):
+        fs, path = fsspec.core.url_to_fs(url)
+        fs.pipe_file(path, data)
+        return
+    path = local_url_to_path(url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+
+def url_exists(url: str) -> bool:
+    """Whether a file or directory exists, at a local path or a URL."""
+    if not is_remote_url(url):
+        return local_url_to_path(url).exists()
+    fs, path = fsspec.core.url_to_fs(url)
+    return fs.exists(path)
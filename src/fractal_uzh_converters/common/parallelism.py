@@ -0,0 +1,69 @@
+"""CPUs allocated to a task, and the thread pools sized from them."""
+
+import logging
+import os
+
+import zarr
+
+logger = logging.getLogger(__name__)
+
+# Threads of the pools checking or reading the source files (stat, directory
+# listing, headers), independent of the CPUs as they mostly wait on the storage
+IO_THREADS = 16
+
+# CPUs of the process when it shares the machine with other workers
+_cpu_share: int | None = None
+
+
+def share_cpus(cpus: int) -> None:
+    """Limit the CPUs of the current process to its share of the machine.
+
+    Called in each worker process of a pool converting several images side by
+    side (e.g. by the local runner), so that the thread pools of an image are
+    sized from the share instead of the CPUs of the whole machine.
+
+    Args:
+        cpus (int): The CPUs of the process, at least 1.
+    """
+    global _cpu_share
+    _cpu_share = max(cpus, 1)
+
+
+def allocated_cpus() -> int:
+    """Number of CPUs the current process is allowed to use.
+
+    On clusters, `os.cpu_count()` returns the CPUs of the whole node, while the
+    task only gets `cpus_per_task` of them. The CPU affinity of the process
+    (set by SLURM and by container runtimes) and the `SLURM_CPUS_PER_TASK`
+    environment variable are used instead, whichever is smaller, and the share
+    set by `share_cpus`.
+
+    Returns:
+        int: The number of allocated CPUs, at least 1.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on macOS and Windows
+        cpus = os.cpu_count() or 1
+    slurm_cpus = os.getenv("SLURM_CPUS_PER_TASK")
+    if slurm_cpus is not None and slurm_cpus.isdigit():
+        cpus = min(cpus, int(slurm_cpus))
+    if _cpu_share is not None:
+        cpus = min(cpus, _cpu_share)
+    return max(cpus, 1)
+
+
+def limit_zarr_threads(cpus: int) -> None:
+    """Size the thread pool used by zarr to encode and write chunks.
+
+    By default zarr sizes it from `os.cpu_count()`, i.e. from the CPUs of the
+    whole node. The pool is created on first use, so this has to be called
+    before reading or writing any array in the process.
+
+    Args:
+        cpus (int): The number of threads of the zarr thread pool.
+    """
+    if zarr.config.get("threading.max_workers", None) is None:
+        zarr.config.set({"threading.max_workers": cpus})
+        logger.debug(f"Zarr thread pool limited to {cpus} threads.")
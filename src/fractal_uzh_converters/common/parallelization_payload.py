@@ -0,0 +1,184 @@
+"""Compact parallelization payload, shared by all the images of a conversion.
+
+By default, each item of the parallelization list carries the full converter
+and performance options, and the tiles of each image are dumped to their own
+JSON file. With the compact payload, the init task writes a single sidecar file
+under the temporary JSON directory instead:
+
+- a header with the options shared by all the images;
+- one record per image, with its tiles, its chunking (if picked
+  automatically), its source fingerprint (for incremental conversions) and its
+  existing timepoints (when appending timepoints), each record compressed on
+  its own.
+
+Each item only holds a reference to its record (the sidecar URL and the byte
+range of the record), so the compute task reads the header and its own record,
+without parsing the records of the other images.
+
+The sidecar is kept until the next init task run on the same `zarr_dir`, which
+clears the temporary JSON directory.
+"""
+
+import json
+import logging
+import struct
+import time
+import zlib
+from typing import Any
+from uuid import uuid4
+
+import fsspec
+from ome_zarr_converters_tools import (
+    DefaultImageLoader,
+    ImageInPlate,
+    TiledImage,
+    join_url_paths,
+)
+from pydantic import BaseModel, ConfigDict, Field
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_SUFFIX = ".payload"
+
+# Magic bytes, then the header length and whether the records are compressed
+_PREFIX = struct.Struct("<8sQ?")
+_MAGIC = b"FUZCPL01"
+
+
+class CompactPayload(BaseModel):
+    """Write the shared structures of the parallelization list once."""
+
+    compress: bool = Field(default=True, title="Compress")
+    """Compress the records of the sidecar file (zlib)."""
+    model_config = ConfigDict(extra="forbid")
+
+
+class PayloadReference(BaseModel):
+    """Reference to the record of an image in a payload sidecar file."""
+
+    url: str
+    """URL of the sidecar file."""
+    offset: int = Field(ge=0)
+    """Offset of the image record in the sidecar file, in bytes."""
+    length: int = Field(ge=0)
+    """Length of the image record in the sidecar file, in bytes."""
+    model_config = ConfigDict(extra="forbid")
+
+
+def write_payload(
+    *,
+    temp_json_url: str,
+    shared: dict[str, Any],
+    tiled_images: list[TiledImage],
+    chunks: list[dict[str, Any]] | None,
+    options: CompactPayload,
+    fingerprints: list[str] | None = None,
+    existing_timepoints: list[int | None] | None = None,
+) -> list[PayloadReference]:
+    """Write the sidecar file of a conversion.
+
+    Args:
+        temp_json_url (str): Directory of the sidecar file.
+        shared (dict[str, Any]): The init arguments shared by all the images.
+        tiled_images (list[TiledImage]): The images to convert.
+        chunks (list[dict[str, Any]] | None): The chunking of each image, if
+            picked per image.
+        options (CompactPayload): The compact payload options.
+        fingerprints (list[str] | None): The source fingerprint of each image,
+            for incremental conversions.
+        existing_timepoints (list[int | None] | None): The timepoints already
+            written in each image, when appending timepoints.
+
+    Returns:
+        list[PayloadReference]: The reference of each image, in the order of
+            the tiled images.
+    """
+    fs, directory = fsspec.core.url_to_fs(temp_json_url)
+    fs.makedirs(directory, exist_ok=True)
+    file_name = f"{uuid4()}{PAYLOAD_SUFFIX}"
+    url = join_url_paths(temp_json_url, file_name)
+
+    def encode(data: bytes) -> bytes:
+        return zlib.compress(data, level=1) if options.compress else data
+
+    header = encode(json.dumps(shared).encode())
+    references = []
+    with fs.open(f"{directory}/{file_name}", "wb") as f:
+        f.write(_PREFIX.pack(_MAGIC, len(header), options.compress))
+        f.write(header)
+        offset = _PREFIX.size + len(header)
+        for index, tiled_image in enumerate(tiled_images):
+            image_chunks = json.dumps(chunks[index] if chunks else None)
+            fingerprint = json.dumps(fingerprints[index] if fingerprints else None)
+            timepoints = json.dumps(
+                existing_timepoints[index] if existing_timepoints else None
+            )
+            record = encode(
+                f'{{"chunks":{image_chunks},"source_fingerprint":{fingerprint},'
+                f'"existing_timepoints":{timepoints},'
+                f'"tiled_image":{tiled_image.model_dump_json()}}}'.encode()
+            )
+            f.write(record)
+            references.append(
+                PayloadReference(url=url, offset=offset, length=len(record))
+            )
+            offset += len(record)
+    logger.info(f"Payload of {len(tiled_images)} images written to {url}.")
+    return references
+
+
+def _read_record(
+    reference: PayloadReference,
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    fs, path = fsspec.core.url_to_fs(reference.url)
+    with fs.open(path, "rb") as f:
+        magic, header_length, compressed = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != _MAGIC:
+            raise ValueError(f"{reference.url} is not a payload sidecar file.")
+        header = f.read(header_length)
+        f.seek(reference.offset)
+        record = f.read(reference.length)
+    if compressed:
+        header, record = zlib.decompress(header), zlib.decompress(record)
+    return json.loads(header), json.loads(record)
+
+
+def load_payload(
+    reference: PayloadReference, retries: int = 3
+) -> tuple[dict[str, Any], TiledImage]:
+    """Load the shared init arguments and the tiled image of a reference.
+
+    The sidecar file might not be visible yet on shared filesystems, so loading
+    is retried with an exponential backoff.
+
+    Args:
+        reference (PayloadReference): The reference to the image record.
+        retries (int): Number of attempts before giving up.
+
+    Returns:
+        tuple[dict[str, Any], TiledImage]: The shared init arguments, with the
+            chunking, the source fingerprint and the existing timepoints of the
+            image applied, and the tiled image.
+    """
+    for attempt in range(retries):
+        try:
+            shared, record = _read_record(reference)
+            break
+        except FileNotFoundError:
+            logger.error(f"Payload does not exist: {reference.url}, retrying...")
+            time.sleep(2 ** (attempt + 1))
+    else:
+        raise FileNotFoundError(
+            f"Payload does not exist after {retries} retries: {reference.url}"
+        )
+    if record["chunks"] is not None:
+        omezarr_options = shared["converter_options"]["omezarr_options"]
+        omezarr_options["chunks"] = record["chunks"]
+    if record.get("source_fingerprint") is not None:
+        shared["source_fingerprint"] = record["source_fingerprint"]
+    if record.get("existing_timepoints") is not None:
+        shared["existing_timepoints"] = record["existing_timepoints"]
+    tiled_image = TiledImage[ImageInPlate, DefaultImageLoader].model_validate(
+        record["tiled_image"]
+    )
+    return shared, tiled_image
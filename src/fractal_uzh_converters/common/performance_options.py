@@ -0,0 +1,199 @@
+"""Options to tune the performance of the conversion."""
+
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+from fractal_uzh_converters.common.async_loading import AsyncLoading
+from fractal_uzh_converters.common.channel_statistics import ChannelStatisticsOptions
+from fractal_uzh_converters.common.chunking import AutoChunking
+from fractal_uzh_converters.common.completion_log import ResumableWriting
+from fractal_uzh_converters.common.compression import Compression
+from fractal_uzh_converters.common.fast_overwrite import FastOverwrite
+from fractal_uzh_converters.common.incremental import IncrementalConversion
+from fractal_uzh_converters.common.object_store import ObjectStore
+from fractal_uzh_converters.common.parallelization_payload import CompactPayload
+from fractal_uzh_converters.common.pipelined_writing import PipelinedWriting
+from fractal_uzh_converters.common.preflight import PreflightCheck
+from fractal_uzh_converters.common.pyramid import PyramidOptions
+from fractal_uzh_converters.common.read_ahead import ReadAhead
+from fractal_uzh_converters.common.scheduling import SchedulingPolicy
+from fractal_uzh_converters.common.scratch_staging import ScratchStaging
+from fractal_uzh_converters.common.tiff_probe import TiffProbe
+
+
+class PerformanceOptions(BaseModel):
+    """Advanced options to tune the performance of the conversion."""
+
+    auto_chunking: AutoChunking | None = Field(default=None, title="Automatic Chunking")
+    """
+    If set, the chunk shape of each image is picked from its geometry (FOV size,
+    Z depth and data type), and overrides the chunking strategy set in the
+    converter options.
+    """
+    pipelined_writing: PipelinedWriting | None = Field(
+        default=None, title="Pipelined Writing"
+    )
+    """
+    Reading, assembling and writing of the FOVs run concurrently in the compute
+    task, instead of the sequential writer mode set in the converter options.
+    If not set, it is enabled with the default options when the image is
+    converted with more than one CPU and the writer mode is "By FOV".
+    """
+    async_loading: AsyncLoading | None = Field(
+        default=None, title="Asynchronous Loading"
+    )
+    """
+    If set, the compute task reads the tile files with many concurrent
+    requests from an asyncio event loop, and decodes them in a thread pool.
+    Useful on high-latency storage (network filesystems, object stores), where
+    each read mostly waits for the storage. Replaces pipelined writing.
+    """
+    cpu_workers: int | None = Field(default=None, ge=1, title="CPU Workers")
+    """
+    Number of CPUs used to convert a single image. If not set, the CPUs
+    allocated to the compute task (cpus_per_task) are used. They size the
+    zarr thread pool compressing the chunks, and the threads of the pipelined
+    writing reading and writing several FOVs in parallel.
+    """
+    read_ahead: ReadAhead | None = Field(default=None, title="Read-Ahead")
+    """
+    If set, the compute task hints the kernel to read the tile files of the
+    next FOVs into the page cache while the current ones are decoded and
+    written. Useful on a cold page cache, when the files are read for the
+    first time.
+    """
+    pyramid: PyramidOptions = Field(
+        default_factory=PyramidOptions, title="Pyramid Options"
+    )
+    """Options for building the lower resolution levels."""
+    compression: Compression = Field(default=Compression.DEFAULT, title="Compression")
+    """
+    Compression codec of the OME-Zarr arrays.
+    - Default: the default of the Zarr format (Blosc LZ4 for Zarr v2).
+    - Blosc LZ4: fast compression, moderate ratio.
+    - Blosc Zstd: slower compression, better ratio.
+    - Uncompressed: no compression, the fastest to write on fast storage.
+    """
+    channel_statistics: ChannelStatisticsOptions | None = Field(
+        default=None, title="Channel Statistics"
+    )
+    """
+    If set, per-channel statistics are gathered from the FOVs while they are
+    written, and used for the channel display windows and a statistics table,
+    instead of a separate pass over the lowest resolution level.
+    """
+    compact_payload: CompactPayload | None = Field(
+        default=None, title="Compact Parallelization Payload"
+    )
+    """
+    If set, the options and tiles of all the images are written once to a
+    sidecar file under the Zarr directory, and each parallelization item only
+    holds a reference to its image. Recommended for plates with many images.
+    """
+    scheduling: SchedulingPolicy = Field(
+        default=SchedulingPolicy.ACQUISITION_ORDER, title="Scheduling Policy"
+    )
+    """
+    Order in which the images are dispatched to the compute tasks.
+    - Acquisition Order: the order in which the images are parsed.
+    - Largest First: the images with the most data to read first, so that the
+        biggest images do not run alone at the end of the conversion.
+    """
+    resumable: ResumableWriting | None = Field(default=None, title="Resumable Writing")
+    """
+    If set, the FOVs and stages completed for each image are recorded in a log,
+    so that a compute job killed halfway only writes what is missing when it is
+    run again.
+    """
+    incremental: IncrementalConversion | None = Field(
+        default=None, title="Incremental Conversion"
+    )
+    """
+    If set, each image stores a fingerprint of its metadata and source files,
+    and a conversion in "Extend" or "Overwrite" mode only converts again the
+    images whose fingerprint changed.
+    """
+    append_timepoints: bool = Field(default=False, title="Append Timepoints")
+    """
+    In "Extend" mode, append the new timepoints of the acquisitions to the
+    existing time-lapse images: the time axis is resized and only the new
+    timepoints are written, leaving the existing data untouched.
+    """
+    preflight: PreflightCheck | None = Field(
+        default_factory=PreflightCheck, title="Preflight Check"
+    )
+    """
+    Unless disabled, the init task checks that the source files of all the
+    tiles exist (from a single listing of each data directory) before
+    dispatching the compute tasks, and reports all the missing files at once.
+    """
+    tiff_probe: TiffProbe | None = Field(default=None, title="TIFF Header Probe")
+    """
+    If set, the init task reads the headers of a sample of the TIFF files of
+    each image (without decoding the pixels) and checks the tile shapes and
+    the data type given by the metadata against them. The data type of the
+    files is used when the metadata gives a different one.
+    """
+    object_store: ObjectStore | None = Field(default=None, title="Object Store")
+    """
+    Connection settings of the S3-compatible object store, when the Zarr
+    directory is an `s3://` URL: connection pool, retries and multipart
+    uploads. The credentials are read from the AWS environment variables or
+    configuration files.
+    """
+    staging: ScratchStaging | None = Field(default=None, title="Scratch Staging")
+    """
+    If set, the compute task writes each image to node-local scratch storage
+    first, then copies it to the Zarr directory in bulk and renames it into
+    place, so that readers never see a partially written image. Useful on
+    shared filesystems that are slow to create many small files.
+    """
+    fast_overwrite: FastOverwrite | None = Field(default=None, title="Fast Overwrite")
+    """
+    If set, the data replaced in "Overwrite" mode is renamed to a trash
+    directory of the Zarr directory instead of being deleted before the
+    conversion, and deleted in parallel while the conversion runs.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    @model_validator(mode="after")
+    def _check_append_timepoints(self) -> "PerformanceOptions":
+        if self.append_timepoints and self.incremental is not None:
+            raise ValueError(
+                "Append Timepoints and Incremental Conversion cannot be combined."
+            )
+        return self
+
+    @model_validator(mode="after")
+    def _check_staging(self) -> "PerformanceOptions":
+        if self.staging is not None and self.resumable is not None:
+            # The completion log would be removed with the staged files
+            raise ValueError(
+                "Scratch Staging and Resumable Writing cannot be combined."
+            )
+        return self
+
+    @model_validator(mode="after")
+    def _check_async_loading(self) -> "PerformanceOptions":
+        if self.async_loading is not None and self.pipelined_writing is not None:
+            raise ValueError(
+                "Asynchronous Loading and Pipelined Writing cannot be combined."
+            )
+        return self
+
+    def content_options(self) -> dict[str, Any]:
+        """The options that change the written data, as JSON compatible values.
+
+        The settings that only change the speed (e.g. the number of threads)
+        are left out, so that tuning them keeps the image fingerprints.
+        """
+        return self.model_dump(
+            mode="json",
+            include={
+                "auto_chunking": True,
+                "compression": True,
+                "pyramid": {"mode"},
+                "channel_statistics": True,
+            },
+        )
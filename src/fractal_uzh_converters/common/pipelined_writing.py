@@ -0,0 +1,279 @@
+"""Pipelined writing of the FOVs of a tiled image.
+
+The sequential writers load a FOV, assemble it, and write it to the OME-Zarr
+before moving to the next one, so the storage sits idle while the CPU is busy
+and vice versa. Here the stages run concurrently, connected by bounded queues:
+
+    read (tile loading) -> assemble (FOV buffer) -> encode + write (zarr)
+
+Compression and the storage write are fused inside zarr, so they form a single
+stage, parallelized over FOVs when no chunk is shared between FOVs.
+"""
+
+import functools
+import logging
+import math
+import threading
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+import numpy as np
+from ngio import Image
+from ome_zarr_converters_tools import TiledImage, TileFOVGroup
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common.parallelism import allocated_cpus
+from fractal_uzh_converters.common.stage_timer import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Callback receiving the index of a FOV in `group_by_fov()` and its data
+FovCallback = Callable[[int, np.ndarray], None]
+
+# Slices of a tile in its FOV buffer, and the function loading its data
+TileLoader = tuple[tuple[slice, ...], Callable[[], np.ndarray]]
+
+
+class PipelinedWriting(BaseModel):
+    """Overlap reading, assembling and writing of the FOVs of an image."""
+
+    read_workers: int | None = Field(default=None, ge=1, title="Read Workers")
+    """
+    Number of threads loading tiles from the source files. If not set, two per
+    CPU used to convert the image.
+    """
+    write_workers: int | None = Field(default=None, ge=1, title="Write Workers")
+    """
+    Number of threads compressing and writing FOVs to the OME-Zarr. If some
+    chunks are shared between FOVs, a single writer is used. If not set, one per
+    CPU used to convert the image.
+    """
+    buffered_fovs: int | None = Field(default=None, ge=1, title="Buffered FOVs")
+    """
+    Number of FOVs buffered between stages. With 2 (double buffering) the next
+    FOV is read while the current one is written. Higher values smooth out
+    latency spikes at the cost of memory. If not set, one per writer plus one.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    @classmethod
+    def for_cpus(cls, cpus: int) -> "PipelinedWriting":
+        """Pipeline options using `cpus` CPUs.
+
+        Compression runs on one writer per CPU. Reading is mostly waiting for
+        the storage, so it gets two threads per CPU, and one FOV is buffered
+        per writer (plus one being assembled).
+        """
+        return cls(read_workers=2 * cpus, write_workers=cpus, buffered_fovs=cpus + 1)
+
+    def sized_for(self, cpus: int) -> "PipelinedWriting":
+        """These options, with the unset worker counts sized for `cpus` CPUs."""
+        defaults = self.for_cpus(cpus)
+        return self.model_copy(
+            update={
+                name: getattr(defaults, name)
+                for name in ("read_workers", "write_workers", "buffered_fovs")
+                if getattr(self, name) is None
+            }
+        )
+
+
+def fov_slices(
+    group: TileFOVGroup, axes: tuple[str, ...], shape: tuple[int, ...]
+) -> tuple[slice, ...]:
+    """Integer slices of a FOV in the full resolution image.
+
+    Args:
+        group (TileFOVGroup): The FOV, in pixel coordinates.
+        axes (tuple[str, ...]): The axes of the image.
+        shape (tuple[int, ...]): The shape of the image.
+
+    Returns:
+        tuple[slice, ...]: One slice per axis of the image.
+    """
+    slicing = group.roi().to_slicing_dict(pixel_size=group.pixel_size)
+    slices = []
+    for axis, size in zip(axes, shape, strict=True):
+        if axis in slicing:
+            ax_slice = slicing[axis]
+            slices.append(slice(math.floor(ax_slice.start), math.ceil(ax_slice.stop)))
+        else:
+            slices.append(slice(0, size))
+    return tuple(slices)
+
+
+def tile_loaders(group: TileFOVGroup, resource: Any | None) -> list[TileLoader]:
+    """Slices of the tiles of a FOV in the FOV buffer, with their loaders.
+
+    The tiles are placed relative to the reference tile of the FOV, as in
+    `TileFOVGroup.load_data`, and loaded through their own image loader.
+
+    Args:
+        group (TileFOVGroup): The FOV, in pixel coordinates.
+        resource (Any | None): Optional resource passed to the image loaders.
+
+    Returns:
+        list[TileLoader]: One entry per tile of the FOV.
+    """
+    origin = group.ref_slice().roi.to_slicing_dict(pixel_size=group.pixel_size)
+    loaders = []
+    for region in group.regions:
+        slicing = region.roi.to_slicing_dict(pixel_size=group.pixel_size)
+        slices = []
+        for axis in group.axes:
+            offset = origin[axis].start
+            slices.append(
+                slice(
+                    math.floor(slicing[axis].start - offset),
+                    math.ceil(slicing[axis].stop - offset),
+                )
+            )
+        # A partial of the region, not a closure over the group, so that a
+        # loader only carries its own tile
+        loader = functools.partial(region.load_data, axes=group.axes, resource=resource)
+        loaders.append((tuple(slices), loader))
+    return loaders
+
+
+def blocks_share_chunks(
+    blocks: list[tuple[slice, ...]],
+    chunks: tuple[int, ...],
+    shape: tuple[int, ...],
+) -> bool:
+    """Check if any chunk of an array is covered by more than one block.
+
+    The check is conservative: a block whose boundaries are not on the chunk
+    grid is considered to share chunks with its neighbours.
+
+    Args:
+        blocks (list[tuple[slice, ...]]): The blocks to write.
+        chunks (tuple[int, ...]): The chunk shape of the array.
+        shape (tuple[int, ...]): The shape of the array.
+
+    Returns:
+        bool: True if concurrent block writes could touch the same chunk.
+    """
+    for block in blocks:
+        for ax_slice, chunk, size in zip(block, chunks, shape, strict=True):
+            if ax_slice.start % chunk != 0:
+                return True
+            if ax_slice.stop % chunk != 0 and ax_slice.stop < size:
+                return True
+    return False
+
+
+def fovs_share_chunks(groups: list[TileFOVGroup], image: Image) -> bool:
+    """Check if any chunk of the image is written by more than one FOV.
+
+    Args:
+        groups (list[TileFOVGroup]): The FOVs to write, in pixel coordinates.
+        image (Image): The image to write to.
+
+    Returns:
+        bool: True if concurrent FOV writes could touch the same chunk.
+    """
+    axes, shape = tuple(image.axes), tuple(image.shape)
+    blocks = [fov_slices(group, axes, shape) for group in groups]
+    return blocks_share_chunks(blocks, tuple(image.chunks), shape)
+
+
+def pipelined_fov_writing(
+    *,
+    tiled_image: TiledImage,
+    image: Image,
+    resource: Any | None,
+    options: PipelinedWriting,
+    timer: StageTimer,
+    on_fov_written: FovCallback | None = None,
+    fov_indices: list[int] | None = None,
+) -> None:
+    """Write the FOVs of a tiled image with overlapping read and write stages.
+
+    Args:
+        tiled_image (TiledImage): The image to write, in pixel coordinates.
+        image (Image): The OME-Zarr image to write to.
+        resource (Any | None): Optional resource passed to the image loaders.
+        options (PipelinedWriting): The pipeline options, the unset worker
+            counts are sized from the allocated CPUs.
+        timer (StageTimer): Timer collecting the per-stage timings.
+        on_fov_written (FovCallback | None): Optional
+            callback receiving the index of each FOV in `group_by_fov()` and its
+            data, once the FOV has been written.
+        fov_indices (list[int] | None): Indices of the FOVs to write in
+            `group_by_fov()`. All the FOVs if not set.
+    """
+    groups = tiled_image.group_by_fov()
+    if fov_indices is None:
+        fov_indices = list(range(len(groups)))
+    options = options.sized_for(allocated_cpus())
+    assert options.read_workers is not None and options.buffered_fovs is not None
+    write_workers = options.write_workers
+    assert write_workers is not None
+    if write_workers > 1 and fovs_share_chunks(groups, image):
+        logger.info("Some chunks are shared between FOVs, using a single writer.")
+        write_workers = 1
+    logger.info(
+        f"Starting pipelined FOV writing - Number of FOVs: {len(fov_indices)}, "
+        f"read workers: {options.read_workers}, write workers: {write_workers}."
+    )
+    # Each slot is a FOV buffer, taken when the FOV is assembled and released
+    # once it has been written
+    slots = threading.BoundedSemaphore(options.buffered_fovs)
+
+    def read(loader: Callable[[], np.ndarray]) -> np.ndarray:
+        with timer.measure("read"):
+            return loader()
+
+    def write(index: int, group: TileFOVGroup, patch: np.ndarray) -> None:
+        try:
+            with timer.measure("encode+write"):
+                image.set_roi(roi=group.roi(), patch=patch)
+            if on_fov_written is not None:
+                on_fov_written(index, patch)
+        finally:
+            slots.release()
+
+    read_pool = ThreadPoolExecutor(options.read_workers, thread_name_prefix="read")
+    write_pool = ThreadPoolExecutor(write_workers, thread_name_prefix="write")
+    groups_iter = ((index, groups[index]) for index in fov_indices)
+    pending_reads: deque[tuple[int, TileFOVGroup, list]] = deque()
+
+    def submit_next_reads() -> None:
+        index, group = next(groups_iter, (None, None))
+        if group is None:
+            return
+        reads = [
+            (slicing, read_pool.submit(read, loader))
+            for slicing, loader in tile_loaders(group, resource)
+        ]
+        pending_reads.append((index, group, reads))
+
+    try:
+        for _ in range(options.buffered_fovs):
+            submit_next_reads()
+        writes: list[Future] = []
+        while pending_reads:
+            index, group, reads = pending_reads.popleft()
+            submit_next_reads()
+            tiles = [(slicing, future.result()) for slicing, future in reads]
+            slots.acquire()
+            try:
+                with timer.measure("assemble"):
+                    patch = np.zeros(group.shape(), dtype=tiles[0][1].dtype)
+                    for slicing, data in tiles:
+                        patch[slicing] = data
+            except BaseException:
+                slots.release()
+                raise
+            writes.append(write_pool.submit(write, index, group, patch))
+            # Surface write errors as soon as possible
+            for future in [f for f in writes if f.done()]:
+                future.result()
+                writes.remove(future)
+        for future in writes:
+            future.result()
+    finally:
+        read_pool.shutdown(wait=True, cancel_futures=True)
+        write_pool.shutdown(wait=True)
@@ -0,0 +1,175 @@
+"""Finalization of the plate and well metadata after a conversion.
+
+The init task writes the plate and well metadata of the images it sets up,
+and the compute tasks only write their own image. Once all the images are
+written, the metadata is finalized in a single pass per plate:
+
+1. the plate metadata is read once and the well metadata of all the wells in a
+   thread pool;
+2. the converted images missing from their well are added, and the listed
+   images that do not exist (e.g. failed conversions) are removed, as are the
+   wells left without images;
+3. only the well and plate documents that changed are written;
+4. optionally, the metadata of the whole plate is consolidated in its root
+   document (`zarr.json`, or `.zmetadata` for NGFF 0.4), so that viewers open
+   the plate with a single read instead of one per group and array.
+
+The consolidated metadata is a snapshot: the plates that are changed later
+(e.g. extended by another conversion) have it removed first, and need to be
+finalized again.
+"""
+
+import json
+import logging
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import fsspec
+import zarr
+from ngio import open_ome_zarr_plate, open_ome_zarr_well
+from ngio.ome_zarr_meta import NgioWellMeta, update_ngio_well_meta
+from ngio.utils import ZarrGroupHandler
+from ome_zarr_converters_tools import (
+    join_url_paths,
+    local_url_to_path,
+)
+
+from fractal_uzh_converters.common.object_store import (
+    is_remote_url,
+    read_bytes,
+    url_exists,
+    write_bytes,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def images_by_plate(zarr_urls: list[str]) -> dict[str, dict[str, list[str]]]:
+    """Group image URLs (`plate.zarr/row/column/path`) by plate and well.
+
+    Returns:
+        dict[str, dict[str, list[str]]]: The paths of the images in each well
+            (`row/column`), by plate URL.
+    """
+    plates: dict[str, dict[str, list[str]]] = defaultdict(lambda: defaultdict(list))
+    for zarr_url in zarr_urls:
+        plate_url, row, column, path = zarr_url.rstrip("/").rsplit("/", 3)
+        plates[plate_url][f"{row}/{column}"].append(path)
+    return {plate_url: dict(wells) for plate_url, wells in plates.items()}
+
+
+def _acquisition_id(image_path: str) -> int | None:
+    """Acquisition of an image, from its path in the well (e.g. `1_corr`)."""
+    match = re.match(r"\d+", image_path)
+    return int(match.group()) if match else None
+
+
+def _remove_file(url: str) -> None:
+    if is_remote_url(url):
+        fs, path = fsspec.core.url_to_fs(url)
+        fs.rm_file(path)
+    else:
+        local_url_to_path(url).unlink()
+
+
+def remove_consolidated_metadata(plate_url: str) -> bool:
+    """Remove the consolidated metadata of a plate, before changing the plate.
+
+    Returns:
+        bool: Whether the plate had consolidated metadata.
+    """
+    zmetadata_url = join_url_paths(plate_url, ".zmetadata")
+    if url_exists(zmetadata_url):
+        _remove_file(zmetadata_url)
+    else:
+        zarr_json_url = join_url_paths(plate_url, "zarr.json")
+        if not url_exists(zarr_json_url):
+            return False
+        document = json.loads(read_bytes(zarr_json_url))
+        if document.pop("consolidated_metadata", None) is None:
+            return False
+        write_bytes(zarr_json_url, json.dumps(document, indent=2).encode())
+    logger.info(f"Removed the consolidated metadata of {plate_url}.")
+    return True
+
+
+def finalize_plate_metadata(
+    plate_url: str,
+    images: dict[str, list[str]],
+    *,
+    consolidate: bool,
+    workers: int,
+) -> None:
+    """Reconcile the well and plate metadata with the images, in one pass.
+
+    Args:
+        plate_url (str): URL of the plate.
+        images (dict[str, list[str]]): Paths of the converted images in each
+            well (`row/column`), see `images_by_plate`.
+        consolidate (bool): Consolidate the metadata of the plate.
+        workers (int): Number of threads reading and writing the wells.
+    """
+    remove_consolidated_metadata(plate_url)
+    plate = open_ome_zarr_plate(plate_url, cache=True, mode="r+")
+    plate_meta = plate.meta
+    version = plate_meta.version
+    zarr_format = 2 if version == "0.4" else 3
+    existing_wells = set(plate_meta.wells_paths)
+    image_metadata = "zarr.json" if zarr_format == 3 else ".zgroup"
+
+    def finalize_well(well_path: str) -> NgioWellMeta:
+        well_url = join_url_paths(plate_url, well_path)
+        try:
+            original = open_ome_zarr_well(well_url, cache=True, mode="r").meta
+        except Exception:
+            # A well missing from the plate may have no metadata, or no group
+            if well_path in existing_wells:
+                raise
+            original = NgioWellMeta.default_init(ngff_version=version)
+        meta = original
+        converted = images.get(well_path, [])
+        for path in meta.paths():
+            if path not in converted and not url_exists(
+                join_url_paths(well_url, path, image_metadata)
+            ):
+                logger.warning(f"Removing the missing image {well_path}/{path}.")
+                meta = meta.remove_image(path)
+        for path in converted:
+            if path not in meta.paths():
+                meta = meta.add_image(
+                    path=path, acquisition=_acquisition_id(path), strict=False
+                )
+        if meta != original:
+            handler = ZarrGroupHandler(
+                store=well_url, cache=True, mode="a", zarr_format=zarr_format
+            )
+            update_ngio_well_meta(handler, meta)
+        return meta
+
+    well_paths = sorted(existing_wells | images.keys())
+    with ThreadPoolExecutor(workers, thread_name_prefix="well") as pool:
+        wells = dict(zip(well_paths, pool.map(finalize_well, well_paths), strict=True))
+
+    new_meta = plate_meta
+    for well_path, well_meta in wells.items():
+        row, column = well_path.split("/")
+        if not well_meta.images:
+            if well_path in existing_wells:
+                new_meta = new_meta.remove_well(row=row, column=column)
+            continue
+        if well_path not in existing_wells:
+            new_meta = new_meta.add_well(row=row, column=column)
+        for acquisition_id in well_meta.acquisition_ids:
+            new_meta = new_meta.add_acquisition(
+                acquisition_id=acquisition_id, acquisition_name=str(acquisition_id)
+            )
+    if new_meta != plate_meta:
+        plate.meta_handler.update_meta(new_meta)
+    logger.info(
+        f"Finalized the metadata of {plate_url}: "
+        f"{sum(bool(meta.images) for meta in wells.values())} wells."
+    )
+    if consolidate:
+        zarr.consolidate_metadata(plate_url, zarr_format=zarr_format)
+        logger.info(f"Consolidated the metadata of {plate_url}.")
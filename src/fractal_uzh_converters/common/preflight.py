@@ -0,0 +1,165 @@
+"""Preflight check of the source files before the compute tasks are dispatched.
+
+The tiles only reference their TIFF files by path, so a missing or truncated
+file used to fail deep inside a compute task, after the other images had
+started. The init task instead lists each data directory once (`Images/` for
+Operetta, `data/` for ScanR, the acquisition directory for CQ3K) and checks the
+referenced files against this index, reporting all the problems at once. The
+files referenced by a URL (e.g. `s3://...`) are not checked.
+
+The existence check only uses the names of the directory listing, without a
+stat per file. The optional size checks need the size of each referenced file,
+i.e. one stat per file on POSIX systems: these run in a thread pool, as they
+mostly wait on the storage.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from ome_zarr_converters_tools import TiledImage
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common.object_store import is_remote_url
+from fractal_uzh_converters.common.parallelism import IO_THREADS
+from fractal_uzh_converters.common.tiled_image_writing import roi_shape
+
+logger = logging.getLogger(__name__)
+
+# Problems listed in the error message, all of them are logged
+_MAX_REPORTED = 20
+
+
+class PreflightCheck(BaseModel):
+    """Check the source files of the tiles before converting them."""
+
+    check_empty_files: bool = Field(default=False, title="Check Empty Files")
+    """
+    Also report the empty files. Needs the size of each file, i.e. one stat per
+    file on top of the directory listings.
+    """
+    check_pixel_size: bool = Field(default=False, title="Check Pixel Data Size")
+    """
+    Also report the empty files, and the files smaller than the pixel data of
+    their tiles as truncated. Only valid for uncompressed TIFF files (as
+    written by the acquisition software), compressed files would be reported as
+    truncated. Needs one stat per file, as the empty file check.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+
+class SourceFilesError(FileNotFoundError):
+    """Some source files of the tiles are missing or truncated."""
+
+
+def _referenced_files(tiled_images: list[TiledImage]) -> dict[str, int]:
+    """Minimum size in bytes of each file referenced by the tiles."""
+    files: dict[str, int] = defaultdict(int)
+    for tiled_image in tiled_images:
+        itemsize = np.dtype(tiled_image.data_type).itemsize
+        for region in tiled_image.regions:
+            file_path = getattr(region.image_loader, "file_path", None)
+            if file_path is None or is_remote_url(file_path):
+                continue
+            shape = roi_shape(region.roi, tiled_image.axes, tiled_image.pixel_size)
+            files[os.path.abspath(file_path)] += int(np.prod(shape)) * itemsize
+    return files
+
+
+def _index_directory(directory: str) -> set[str] | None:
+    """Names of the entries of a directory, None if it can not be listed."""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except OSError:
+        return None
+
+
+def _file_size(path: str) -> int | None:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        # Removed since the directory was listed
+        return None
+
+
+def find_source_file_problems(
+    tiled_images: list[TiledImage], options: PreflightCheck
+) -> list[str]:
+    """Check the files referenced by the tiles against their directory index.
+
+    Args:
+        tiled_images (list[TiledImage]): The images to convert.
+        options (PreflightCheck): The preflight check options.
+
+    Returns:
+        list[str]: A description of each missing or truncated file.
+    """
+    files = _referenced_files(tiled_images)
+    by_directory: dict[str, list[str]] = defaultdict(list)
+    for path in files:
+        by_directory[os.path.dirname(path)].append(path)
+
+    with ThreadPoolExecutor(IO_THREADS) as pool:
+        directories = list(by_directory)
+        indexes = dict(
+            zip(directories, pool.map(_index_directory, directories), strict=True)
+        )
+        problems, found = [], []
+        for directory, paths in by_directory.items():
+            index = indexes[directory]
+            if index is None:
+                problems.append(
+                    f"{directory}: directory not found ({len(paths)} files)"
+                )
+                continue
+            for path in paths:
+                if os.path.basename(path) in index:
+                    found.append(path)
+                else:
+                    problems.append(f"{path}: file not found")
+        if not (options.check_empty_files or options.check_pixel_size):
+            found = []
+        sizes = pool.map(_file_size, found)
+        for path, size in zip(found, sizes, strict=True):
+            if size is None:
+                problems.append(f"{path}: file not found")
+            elif size == 0:
+                problems.append(f"{path}: empty file")
+            elif options.check_pixel_size and size < files[path]:
+                problems.append(
+                    f"{path}: truncated file ({size} bytes, "
+                    f"expected at least {files[path]})"
+                )
+    logger.info(
+        f"Preflight check of {len(files)} source files in "
+        f"{len(by_directory)} directories: {len(problems)} problems."
+    )
+    return problems
+
+
+def run_preflight_check(
+    tiled_images: list[TiledImage], options: PreflightCheck
+) -> None:
+    """Check the source files of the tiles, and fail on any problem.
+
+    Args:
+        tiled_images (list[TiledImage]): The images to convert.
+        options (PreflightCheck): The preflight check options.
+
+    Raises:
+        SourceFilesError: If some files are missing or truncated.
+    """
+    problems = find_source_file_problems(tiled_images, options)
+    if not problems:
+        return
+    for problem in problems:
+        logger.error(problem)
+    listed = "\n".join(problems[:_MAX_REPORTED])
+    if len(problems) > _MAX_REPORTED:
+        listed += f"\n... and {len(problems) - _MAX_REPORTED} more (see the log)"
+    raise SourceFilesError(
+        f"Found {len(problems)} problems with the source files:\n{listed}"
+    )
@@ -0,0 +1,301 @@
+"""Generation of the lower resolution levels of the OME-Zarr images."""
+
+import itertools
+import logging
+import math
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from enum import StrEnum
+
+import numpy as np
+import zarr
+from ngio import OmeZarrContainer, open_ome_zarr_container
+from ngio.common import numpy_zoom
+from ome_zarr_converters_tools import (
+    TileFOVGroup,
+)
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common.channel_statistics import CHANNEL_STATISTICS_TABLE
+from fractal_uzh_converters.common.pipelined_writing import (
+    blocks_share_chunks,
+    fov_slices,
+)
+from fractal_uzh_converters.common.stage_timer import StageTimer
+
+logger = logging.getLogger(__name__)
+
+
+class PyramidMode(StrEnum):
+    """When to build the lower resolution levels."""
+
+    AFTER_WRITING = "After Writing"
+    DURING_WRITING = "During Writing"
+    DEFERRED = "Deferred"
+
+
+# Image type set on the images whose lower resolution levels are left to the
+# "Build Pyramid Levels" task
+PYRAMID_PENDING_TYPE = "pyramid_pending"
+
+
+class PyramidOptions(BaseModel):
+    """Options for building the lower resolution levels."""
+
+    mode: PyramidMode = Field(default=PyramidMode.AFTER_WRITING, title="Mode")
+    """
+    When to build the lower resolution levels.
+    - After Writing: build each level from the previous one, re-reading the
+        full resolution data from disk once it is written.
+    - During Writing: downsample each FOV in memory as soon as it is written,
+        so the full resolution data is never read back. Falls back to "After
+        Writing" if the FOVs are not aligned with the pyramid levels.
+    - Deferred: only write the full resolution level. The lower levels and
+        the channel windows are built later by the "Build Pyramid Levels"
+        task, which processes many images in parallel.
+    """
+    workers: int = Field(default=4, ge=1, title="Workers")
+    """Number of threads downsampling FOVs when building levels during writing."""
+    model_config = ConfigDict(extra="forbid")
+
+
+def _level_factors(arrays: list[zarr.Array]) -> list[tuple[int, ...]]:
+    """Integer downsampling factors between consecutive levels."""
+    factors = []
+    for source, target in itertools.pairwise(arrays):
+        factors.append(
+            tuple(
+                max(1, s // t) for s, t in zip(source.shape, target.shape, strict=True)
+            )
+        )
+    return factors
+
+
+def _is_aligned(
+    blocks: list[tuple[slice, ...]],
+    shape: tuple[int, ...],
+    total_factors: tuple[int, ...],
+) -> bool:
+    """Check that every block starts and ends on the coarsest pyramid grid."""
+    for block in blocks:
+        for ax_slice, size, factor in zip(block, shape, total_factors, strict=True):
+            if ax_slice.start % factor != 0:
+                return False
+            if ax_slice.stop % factor != 0 and ax_slice.stop < size:
+                return False
+    return True
+
+
+def _overlaps(blocks: list[tuple[slice, ...]]) -> bool:
+    """Check if any two blocks overlap."""
+    starts = np.array([[s.start for s in block] for block in blocks])
+    stops = np.array([[s.stop for s in block] for block in blocks])
+    for i in range(len(blocks) - 1):
+        overlap = (starts[i + 1 :] < stops[i]) & (stops[i + 1 :] > starts[i])
+        if np.any(np.all(overlap, axis=1)):
+            return True
+    return False
+
+
+def downsample_block(block: np.ndarray, factors: tuple[int, ...]) -> np.ndarray:
+    """Downsample a block by integer factors.
+
+    Uses the same interpolation as the pyramid consolidation in ngio, so a
+    level built block by block is identical to one built from the full image,
+    as long as the blocks are aligned with the downsampling factors. Trailing
+    pixels that do not fill a full factor are dropped, as in the consolidation.
+
+    Args:
+        block (np.ndarray): The block to downsample.
+        factors (tuple[int, ...]): The downsampling factor for each axis.
+
+    Returns:
+        np.ndarray: The downsampled block.
+    """
+    cropped = block[
+        tuple(slice(0, (s // f) * f) for s, f in zip(block.shape, factors, strict=True))
+    ]
+    target_shape = tuple(s // f for s, f in zip(block.shape, factors, strict=True))
+    return numpy_zoom(cropped, target_shape=target_shape, order="linear")
+
+
+def build_pyramid(zarr_url: str) -> None:
+    """Build the lower resolution levels of an image written in deferred mode.
+
+    The channel windows are computed on the lowest resolution level, so they
+    are set here as well, unless they were already set from the statistics
+    gathered during writing.
+
+    Args:
+        zarr_url (str): URL of the OME-Zarr image.
+    """
+    ome_zarr = open_ome_zarr_container(zarr_url)
+    ome_zarr.get_image().consolidate()
+    if CHANNEL_STATISTICS_TABLE not in ome_zarr.list_tables():
+        ome_zarr.set_channel_windows_with_percentiles()
+
+
+def build_pyramid_range(
+    ome_zarr: OmeZarrContainer, *, axis: str, start: int, stop: int
+) -> None:
+    """Build the lower resolution levels for a range of an axis.
+
+    Each level is built from the previous one, one plane at a time, only over
+    `[start, stop)` along `axis`, e.g. for the timepoints appended to an image.
+    The axis must not be downsampled between levels.
+
+    Args:
+        ome_zarr (OmeZarrContainer): The container to write the levels to.
+        axis (str): The axis to restrict, e.g. "t".
+        start (int): First index of the range.
+        stop (int): End of the range, exclusive.
+    """
+    axes = tuple(ome_zarr.get_image().axes)
+    index = axes.index(axis)
+    arrays = [ome_zarr.get_image(path=path).zarr_array for path in ome_zarr.level_paths]
+    for source, target, factors in zip(
+        arrays, arrays[1:], _level_factors(arrays), strict=False
+    ):
+        if factors[index] != 1:
+            raise ValueError(f"The {axis} axis is downsampled between levels.")
+        # One block per plane, grouping the planes downsampled together
+        ranges = []
+        for i, (name, size, factor) in enumerate(
+            zip(axes, source.shape, factors, strict=True)
+        ):
+            if i == index:
+                ranges.append([slice(j, j + 1) for j in range(start, stop)])
+            elif name in ("y", "x"):
+                ranges.append([slice(0, size)])
+            else:
+                stop_j = (size // factor) * factor
+                ranges.append([slice(j, j + factor) for j in range(0, stop_j, factor)])
+        for block in itertools.product(*ranges):
+            patch = downsample_block(source[block], factors)
+            target[
+                tuple(
+                    slice(s.start // f, s.start // f + n)
+                    for s, f, n in zip(block, factors, patch.shape, strict=True)
+                )
+            ] = patch
+
+
+class InPassPyramidWriter:
+    """Build the lower resolution levels from the FOVs written at level 0.
+
+    Each FOV is downsampled level by level in a thread pool, without reading
+    back the full resolution data. Writes to a level are serialized when a chunk
+    of that level is shared between FOVs.
+    """
+
+    def __init__(
+        self,
+        *,
+        ome_zarr: OmeZarrContainer,
+        groups: list[TileFOVGroup],
+        workers: int,
+        timer: StageTimer,
+    ) -> None:
+        """Initialize the writer.
+
+        Args:
+            ome_zarr (OmeZarrContainer): The container to write the levels to.
+            groups (list[TileFOVGroup]): The FOVs that will be written.
+            workers (int): Number of downsampling threads.
+            timer (StageTimer): Timer collecting the per-stage timings.
+        """
+        image = ome_zarr.get_image()
+        self._axes = tuple(image.axes)
+        self._arrays = [
+            ome_zarr.get_image(path=path).zarr_array for path in ome_zarr.level_paths
+        ]
+        self._factors = _level_factors(self._arrays)
+        self._timer = timer
+        self._blocks = [
+            fov_slices(group, self._axes, self._arrays[0].shape) for group in groups
+        ]
+        self.supported = self._check_supported()
+        self._locks: list[AbstractContextManager] = []
+        self._pool: ThreadPoolExecutor | None = None
+        self._futures: list[Future] = []
+        self._pending = threading.BoundedSemaphore(2 * workers)
+        if self.supported:
+            self._locks = self._build_locks()
+            self._pool = ThreadPoolExecutor(workers, thread_name_prefix="pyramid")
+
+    def _check_supported(self) -> bool:
+        if len(self._arrays) < 2:
+            return True
+        total_factors = tuple(
+            math.prod(factors[i] for factors in self._factors)
+            for i in range(len(self._axes))
+        )
+        if not _is_aligned(self._blocks, self._arrays[0].shape, total_factors):
+            logger.info("FOVs are not aligned with the pyramid levels.")
+            return False
+        if _overlaps(self._blocks):
+            logger.info("FOVs overlap.")
+            return False
+        return True
+
+    def _build_locks(self) -> list[AbstractContextManager]:
+        locks: list[AbstractContextManager] = []
+        blocks = self._blocks
+        for array, factors in zip(self._arrays[1:], self._factors, strict=True):
+            blocks = [self._downsample_slices(block, factors) for block in blocks]
+            shared = blocks_share_chunks(blocks, array.chunks, array.shape)
+            locks.append(threading.Lock() if shared else nullcontext())
+        return locks
+
+    @staticmethod
+    def _downsample_slices(
+        block: tuple[slice, ...], factors: tuple[int, ...]
+    ) -> tuple[slice, ...]:
+        return tuple(
+            slice(s.start // f, s.stop // f)
+            for s, f in zip(block, factors, strict=True)
+        )
+
+    def _write_levels(self, index: int, patch: np.ndarray) -> None:
+        try:
+            block = self._blocks[index]
+            for array, factors, lock in zip(
+                self._arrays[1:], self._factors, self._locks, strict=True
+            ):
+                with self._timer.measure("pyramid"):
+                    patch = downsample_block(patch, factors)
+                    block = self._downsample_slices(block, factors)
+                    start = tuple(s.start for s in block)
+                    target = tuple(
+                        slice(st, st + size)
+                        for st, size in zip(start, patch.shape, strict=True)
+                    )
+                    with lock:
+                        array[target] = patch
+        finally:
+            self._pending.release()
+
+    def submit(self, index: int, patch: np.ndarray) -> None:
+        """Schedule the lower levels of a FOV written at level 0.
+
+        Blocks if too many FOVs are already waiting to be downsampled.
+
+        Args:
+            index (int): Index of the FOV in the groups passed at initialization.
+            patch (np.ndarray): The full resolution data of the FOV.
+        """
+        if self._pool is None:
+            raise RuntimeError("In pass pyramid building is not supported.")
+        self._pending.acquire()
+        self._futures.append(self._pool.submit(self._write_levels, index, patch))
+
+    def close(self) -> None:
+        """Wait for all the levels to be written and raise any error."""
+        if self._pool is None:
+            return
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
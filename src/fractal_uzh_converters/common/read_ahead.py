@@ -0,0 +1,139 @@
+"""Kernel read-ahead hints for the tile files about to be read.
+
+The compute task reads the tile files of an image FOV by FOV, in an order fully
+known from the tiled image. On a cold page cache each file read waits for the
+storage; hinting the next files to the kernel (`posix_fadvise` with
+`POSIX_FADV_WILLNEED`) lets it fetch them while the current FOVs are decoded
+and written. On systems without `posix_fadvise`, the files are read once in
+the background instead, which also brings them into the page cache.
+
+A background thread issues the hints FOV by FOV, keeping at most the configured
+number of files hinted ahead of the FOVs written. The files of a FOV are hinted
+sorted by directory and name, for locality on the storage.
+"""
+
+import logging
+import os
+import queue
+import threading
+
+import numpy as np
+from ome_zarr_converters_tools import TileFOVGroup
+from pydantic import BaseModel, ConfigDict, Field
+
+logger = logging.getLogger(__name__)
+
+# Buffer of the fallback read, when posix_fadvise is not available
+_READ_BLOCK_SIZE = 2**20
+
+
+class ReadAhead(BaseModel):
+    """Hint the kernel to read the next tile files ahead."""
+
+    files_ahead: int = Field(default=64, ge=1, title="Files Ahead")
+    """
+    Maximum number of tile files hinted ahead of the FOVs written. The files
+    of a whole FOV are always hinted together.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+
+def advise_will_need(path: str) -> None:
+    """Ask the kernel to start reading a file into the page cache."""
+    try:
+        if hasattr(os, "posix_fadvise"):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        else:
+            buffer = bytearray(_READ_BLOCK_SIZE)
+            with open(path, "rb", buffering=0) as f:
+                while f.readinto(buffer):
+                    pass
+    except OSError:
+        # Only a hint: a missing file is reported when it is read
+        pass
+
+
+def _group_files(group: TileFOVGroup) -> list[str]:
+    files = {
+        getattr(region.image_loader, "file_path", None) for region in group.regions
+    }
+    files.discard(None)
+    return sorted(files, key=lambda path: os.path.split(path))
+
+
+class TileReadAhead:
+    """Hint the tile files of the next FOVs while the current ones are written.
+
+    Call `fov_done` with the index of each written FOV, and `close` once the
+    image is written.
+    """
+
+    def __init__(
+        self,
+        groups: list[TileFOVGroup],
+        fov_indices: list[int],
+        options: ReadAhead,
+    ) -> None:
+        """Prepare the hints of the FOVs, in the order they are written.
+
+        Args:
+            groups (list[TileFOVGroup]): The FOVs of the image.
+            fov_indices (list[int]): The indices of the FOVs to write, in the
+                order they are read.
+            options (ReadAhead): The read-ahead options.
+        """
+        self._files = {index: _group_files(groups[index]) for index in fov_indices}
+        self._order = list(fov_indices)
+        self._files_ahead = options.files_ahead
+        self._next = 0
+        self._outstanding = 0
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue[list[str] | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="read-ahead", daemon=True
+        )
+
+    def start(self) -> None:
+        """Start hinting the files of the first FOVs."""
+        logger.info(
+            f"Hinting up to {self._files_ahead} tile files ahead of the FOVs written."
+        )
+        self._thread.start()
+        with self._lock:
+            self._fill()
+
+    def fov_done(self, index: int, patch: np.ndarray | None = None) -> None:
+        """Record that a FOV was written, and hint the files of the next ones.
+
+        Args:
+            index (int): The index of the written FOV.
+            patch (np.ndarray | None): The written data, unused (so that the
+                method can be used as a FOV callback).
+        """
+        with self._lock:
+            self._outstanding -= len(self._files.get(index, ()))
+            self._fill()
+
+    def close(self) -> None:
+        """Stop the background thread, once the queued hints are issued."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _fill(self) -> None:
+        while self._next < len(self._order):
+            files = self._files[self._order[self._next]]
+            if self._outstanding and self._outstanding + len(files) > self._files_ahead:
+                break
+            self._queue.put(files)
+            self._outstanding += len(files)
+            self._next += 1
+
+    def _run(self) -> None:
+        while (files := self._queue.get()) is not None:
+            for path in files:
+                advise_will_need(path)
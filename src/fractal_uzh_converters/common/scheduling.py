@@ -0,0 +1,78 @@
+"""Cost-aware ordering of the parallelization list.
+
+The compute jobs are dispatched in the order of the parallelization list. When
+the images have very different sizes (e.g. some wells with 100 FOVs and others
+with one), starting the biggest jobs last leaves them running alone at the end
+of the conversion. Starting them first (longest processing time first, LPT)
+brings the total wall time close to its lower bound.
+"""
+
+from collections.abc import Callable, Sequence
+from enum import StrEnum
+
+import numpy as np
+from ome_zarr_converters_tools import TiledImage
+
+from fractal_uzh_converters.common.tiled_image_writing import roi_shape
+
+OrderingFunction = Callable[[Sequence[int]], list[int]]
+"""Function mapping the cost of each item to the order of the items."""
+
+
+class SchedulingPolicy(StrEnum):
+    """Order of the parallelization list."""
+
+    ACQUISITION_ORDER = "Acquisition Order"
+    LARGEST_FIRST = "Largest First"
+
+
+def estimate_cost(tiled_image: TiledImage) -> int:
+    """Estimate the cost of converting an image, as the bytes to read.
+
+    The cost is the number of tiles times the size of a tile, taking the first
+    tile as representative of all the tiles of the image.
+
+    Args:
+        tiled_image (TiledImage): The image to convert.
+
+    Returns:
+        int: The estimated number of bytes read to convert the image.
+    """
+    if not tiled_image.regions:
+        return 0
+    tile_shape = roi_shape(
+        tiled_image.regions[0].roi, tiled_image.axes, tiled_image.pixel_size
+    )
+    tile_bytes = int(np.prod(tile_shape)) * np.dtype(tiled_image.data_type).itemsize
+    return len(tiled_image.regions) * tile_bytes
+
+
+def _largest_first(costs: Sequence[int]) -> list[int]:
+    # Stable, so images of equal cost keep the acquisition order
+    return sorted(range(len(costs)), key=lambda index: -costs[index])
+
+
+_POLICIES: dict[SchedulingPolicy, OrderingFunction] = {
+    SchedulingPolicy.ACQUISITION_ORDER: lambda costs: list(range(len(costs))),
+    SchedulingPolicy.LARGEST_FIRST: _largest_first,
+}
+
+
+def schedule_order(
+    costs: Sequence[int], policy: SchedulingPolicy | OrderingFunction
+) -> list[int]:
+    """Order of the items of the parallelization list.
+
+    Args:
+        costs (Sequence[int]): The estimated cost of each item.
+        policy (SchedulingPolicy | OrderingFunction): The scheduling policy, or
+            a custom function returning the order from the costs.
+
+    Returns:
+        list[int]: The indices of the items, in the order to dispatch them.
+    """
+    ordering = _POLICIES[policy] if isinstance(policy, SchedulingPolicy) else policy
+    order = ordering(costs)
+    if sorted(order) != list(range(len(costs))):
+        raise ValueError("The scheduling policy must return a permutation.")
+    return order
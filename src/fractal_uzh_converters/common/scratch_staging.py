@@ -0,0 +1,277 @@
+"""Staging of the images on node-local scratch storage.
+
+Shared parallel filesystems (GPFS, Lustre, NFS) pay a round trip to their
+metadata servers for every file created, and an OME-Zarr image is made of
+thousands to millions of small chunk files. With staging, the compute task
+writes the image to a directory on node-local scratch storage, then commits it
+to the Zarr directory in bulk:
+
+1. the files are copied by a thread pool to a hidden directory next to the
+   image, in the same parent directory (skipped if the scratch directory is on
+   the same filesystem as the Zarr directory);
+2. the copy is verified against the staged files (relative paths and sizes);
+3. the hidden directory is renamed to the image path, atomically.
+
+Readers never see a half-written image: the image path either does not exist,
+holds the previous image, or holds the complete new image. When an existing
+image is overwritten, it is swapped with the new one in a single atomic
+exchange (`renameat2` with `RENAME_EXCHANGE`, Linux only), then deleted by a
+thread pool. Where the exchange is not supported (other systems, or
+filesystems such as some NFS versions), the previous image is renamed out of
+the way just before the new one is renamed into place, leaving a short window
+where the image path does not exist.
+"""
+
+import ctypes
+import errno
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from uuid import uuid4
+
+from ome_zarr_converters_tools import (
+    OverwriteMode,
+    local_url_to_path,
+)
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common.fast_overwrite import delete_tree
+from fractal_uzh_converters.common.stage_timer import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the hidden directories of the images being committed or replaced
+STAGING_PREFIX = ".staging-"
+
+# `renameat2` arguments: paths relative to the working directory, and swap
+_AT_FDCWD = -100
+_RENAME_EXCHANGE = 2
+
+
+class ScratchStaging(BaseModel):
+    """Write each image to node-local scratch, then commit it in bulk."""
+
+    scratch_dir: str | None = Field(default=None, title="Scratch Directory")
+    """
+    Node-local directory where the images are written first. If not set, the
+    temporary directory of the node is used (`TMPDIR`, e.g. set by SLURM to
+    the job scratch directory).
+    """
+    copy_workers: int = Field(default=16, ge=1, title="Copy Workers")
+    """
+    Number of threads copying the files to the Zarr directory, and deleting
+    the replaced image.
+    """
+    verify: bool = Field(default=True, title="Verify Copy")
+    """Check the paths and sizes of the copied files before the commit."""
+    model_config = ConfigDict(extra="forbid")
+
+
+class StagingError(OSError):
+    """A staged image cannot be committed, e.g. its copy does not match it."""
+
+
+def _list_files(root: Path) -> dict[str, int]:
+    """Size of each file below a directory, by relative path."""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            files[os.path.relpath(path, root)] = os.path.getsize(path)
+    return files
+
+
+def copy_tree(source: Path, destination: Path, workers: int) -> int:
+    """Copy a directory tree, with the files copied by a thread pool.
+
+    Args:
+        source (Path): The directory to copy.
+        destination (Path): The copy, must not exist.
+        workers (int): Number of threads copying the files.
+
+    Returns:
+        int: The number of bytes copied.
+    """
+    files = _list_files(source)
+    directories = {os.path.dirname(path) for path in files}
+    destination.mkdir(parents=True)
+    # Parents first, the directories are created once
+    for directory in sorted(directories):
+        (destination / directory).mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(workers) as pool:
+        list(
+            pool.map(
+                lambda path: shutil.copyfile(source / path, destination / path),
+                files,
+            )
+        )
+    return sum(files.values())
+
+
+def verify_copy(source: Path, destination: Path) -> None:
+    """Check that a copy holds the same files as its source, with their sizes.
+
+    Raises:
+        StagingError: If files are missing, extra or of a different size.
+    """
+    expected, copied = _list_files(source), _list_files(destination)
+    if expected == copied:
+        return
+    missing = sorted(expected.keys() - copied.keys())
+    extra = sorted(copied.keys() - expected.keys())
+    resized = sorted(
+        path
+        for path in expected.keys() & copied.keys()
+        if expected[path] != copied[path]
+    )
+    raise StagingError(
+        f"The copy of {source} to {destination} does not match: "
+        f"{len(missing)} missing, {len(extra)} extra and {len(resized)} resized "
+        f"files (e.g. {(missing + extra + resized)[:5]})."
+    )
+
+
+def _same_filesystem(path: Path, other: Path) -> bool:
+    return os.stat(path).st_dev == os.stat(other).st_dev
+
+
+def _load_renameat2() -> Callable[..., int] | None:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        # The C library predates renameat2 (glibc < 2.28)
+        return None
+    renameat2.argtypes = [
+        ctypes.c_int,
+        ctypes.c_char_p,
+        ctypes.c_int,
+        ctypes.c_char_p,
+        ctypes.c_uint,
+    ]
+    return renameat2
+
+
+_renameat2 = _load_renameat2()
+
+
+def exchange_paths(path: Path, other: Path) -> bool:
+    """Swap two existing paths in a single atomic operation.
+
+    Returns:
+        bool: False if the system or the filesystem does not support the
+            exchange, in which case nothing was changed.
+    """
+    if _renameat2 is None:
+        return False
+    result = _renameat2(
+        _AT_FDCWD, os.fsencode(path), _AT_FDCWD, os.fsencode(other), _RENAME_EXCHANGE
+    )
+    if result == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+        return False
+    raise OSError(error, os.strerror(error), str(path), None, str(other))
+
+
+def commit_image(
+    staged: Path, image_path: Path, options: ScratchStaging, timer: StageTimer
+) -> None:
+    """Move a staged image to its final path, atomically.
+
+    An existing image is swapped with the new one where the filesystem
+    supports it, and otherwise renamed out of the way just before.
+
+    Args:
+        staged (Path): The staged image directory.
+        image_path (Path): The final path of the image.
+        options (ScratchStaging): The staging options.
+        timer (StageTimer): Timer collecting the per-stage timings.
+
+    Raises:
+        StagingError: If nothing was staged, or the copy does not match.
+    """
+    if not staged.is_dir():
+        raise StagingError(
+            f"No image was staged in {staged}, there is nothing to commit to "
+            f"{image_path}. Check that the image was written to the staged URL."
+        )
+    parent = image_path.parent
+    parent.mkdir(parents=True, exist_ok=True)
+    if _same_filesystem(staged, parent):
+        committed = staged
+    else:
+        committed = parent / f"{STAGING_PREFIX}{image_path.name}-{uuid4().hex}"
+        try:
+            with timer.measure("commit copy"):
+                num_bytes = copy_tree(staged, committed, options.copy_workers)
+            if options.verify:
+                with timer.measure("commit verify"):
+                    verify_copy(staged, committed)
+        except BaseException:
+            shutil.rmtree(committed, ignore_errors=True)
+            raise
+        logger.info(f"Copied {num_bytes / 2**20:.1f} MB of staged files.")
+    with timer.measure("commit rename"):
+        replaced = None
+        if not image_path.exists():
+            os.rename(committed, image_path)
+        elif exchange_paths(committed, image_path):
+            # The committed path now holds the previous image
+            replaced = committed
+        else:
+            replaced = parent / f"{STAGING_PREFIX}{image_path.name}-{uuid4().hex}"
+            os.rename(image_path, replaced)
+            os.rename(committed, image_path)
+    if replaced is not None:
+        with timer.measure("commit cleanup"):
+            delete_tree(replaced, options.copy_workers)
+    logger.info(f"Committed the staged image to {image_path}.")
+
+
+@contextmanager
+def staged_image(
+    zarr_url: str,
+    *,
+    overwrite_mode: OverwriteMode,
+    options: ScratchStaging,
+    timer: StageTimer,
+) -> Iterator[str | None]:
+    """Stage an image on scratch, and commit it when the block completes.
+
+    Yields the URL to write the image to, or None if the image is extended in
+    place (it already exists in "Extend" mode). The staged files are removed
+    in any case, and nothing is committed if the block raises.
+
+    Args:
+        zarr_url (str): The final URL of the image.
+        overwrite_mode (OverwriteMode): Overwrite mode for existing data.
+        options (ScratchStaging): The staging options.
+        timer (StageTimer): Timer collecting the per-stage timings.
+
+    Raises:
+        FileExistsError: If the image exists in "No Overwrite" mode.
+    """
+    image_path = local_url_to_path(zarr_url)
+    if image_path.exists():
+        if overwrite_mode == OverwriteMode.EXTEND:
+            yield None
+            return
+        if overwrite_mode == OverwriteMode.NO_OVERWRITE:
+            raise FileExistsError(f"The image {zarr_url} already exists.")
+    scratch = tempfile.mkdtemp(prefix="fractal-uzh-staging-", dir=options.scratch_dir)
+    try:
+        staged = Path(scratch) / image_path.name
+        logger.info(f"Staging the image in {staged}.")
+        yield str(staged)
+        commit_image(staged, image_path, options, timer)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
@@ -0,0 +1,62 @@
+"""Per-stage timing of a compute job."""
+
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Accumulate the time spent in each stage of a compute job.
+
+    Stages can run concurrently in worker threads, in which case the reported
+    time is the sum over all threads and can exceed the wall time of the job.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty timer."""
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Add time to a stage.
+
+        Args:
+            stage (str): Name of the stage.
+            seconds (float): Time to add, in seconds.
+        """
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """Measure the time spent in the context and add it to a stage.
+
+        Args:
+            stage (str): Name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    @property
+    def stages(self) -> dict[str, float]:
+        """Accumulated time per stage, in seconds."""
+        with self._lock:
+            return dict(self._stages)
+
+    @property
+    def wall_time(self) -> float:
+        """Wall time since the timer was created, in seconds."""
+        return time.perf_counter() - self._start
+
+    def summary(self) -> str:
+        """Format the stage breakdown as a single line."""
+        stages = ", ".join(f"{name} {sec:.2f}s" for name, sec in self.stages.items())
+        return f"{stages} (wall time {self.wall_time:.2f}s)"
@@ -0,0 +1,207 @@
+"""Probe the headers of the source TIFF files before the conversion.
+
+The parsers trust the acquisition metadata for the data type and the shape of
+the tiles: Operetta guesses the data type from the maximum intensity of the
+images, and CQ3K does not set it at all. The probe reads the first IFD of a
+sample of the referenced TIFFs (shape, data type, compression and strip layout,
+without decoding any pixel) in a thread pool, and checks the images against it
+before their arrays are created.
+
+The headers are cached in the Zarr directory, keyed by the size and
+modification time of each file, so that running the init task again (e.g. for
+a live acquisition or an incremental conversion) only probes the new files.
+The files referenced by a URL are not probed.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tifffile
+from ome_zarr_converters_tools import DataTypeEnum, TiledImage, join_url_paths
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common.object_store import (
+    is_remote_url,
+    read_bytes,
+    write_bytes,
+)
+from fractal_uzh_converters.common.parallelism import IO_THREADS
+from fractal_uzh_converters.common.tiled_image_writing import roi_shape
+
+logger = logging.getLogger(__name__)
+
+TIFF_HEADERS_NAME = ".tiff_headers.json"
+
+
+class TiffProbe(BaseModel):
+    """Check the images against the headers of their TIFF files."""
+
+    files_per_image: int | None = Field(default=4, ge=1, title="Files per Image")
+    """
+    Number of TIFF files probed per image, evenly spread over its tiles. If not
+    set, all the files are probed.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+
+class TiffHeader(BaseModel):
+    """Layout of the first image of a TIFF file."""
+
+    shape: tuple[int, ...]
+    dtype: str
+    compression: str
+    contiguous: bool
+    """The pixels are stored uncompressed in one contiguous block."""
+
+
+def read_tiff_header(path: str) -> TiffHeader:
+    """Read the layout of the first image of a TIFF file, without its pixels."""
+    with tifffile.TiffFile(path) as tiff:
+        page = tiff.pages.first
+        return TiffHeader(
+            shape=page.shape,
+            dtype=np.dtype(page.dtype).name,
+            compression=page.compression.name,
+            contiguous=bool(page.is_contiguous) and page.compression.name == "NONE",
+        )
+
+
+def _stamp(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _probe(path: str, cached: dict | None) -> tuple[str, TiffHeader] | None:
+    try:
+        stamp = _stamp(path)
+    except FileNotFoundError:
+        # Left to the compute task, when the preflight check is disabled
+        return None
+    if cached is not None and cached["stamp"] == stamp:
+        return stamp, TiffHeader.model_validate(cached["header"])
+    return stamp, read_tiff_header(path)
+
+
+def _sample(files: list[str], size: int | None) -> list[str]:
+    if size is None or len(files) <= size:
+        return files
+    indices = np.linspace(0, len(files) - 1, size).round().astype(int)
+    return [files[index] for index in sorted(set(indices))]
+
+
+def _tile_files(tiled_image: TiledImage) -> dict[str, tuple[int, int]]:
+    """The YX shape of the tile of each file referenced by an image."""
+    y, x = tiled_image.axes.index("y"), tiled_image.axes.index("x")
+    files = {}
+    for region in tiled_image.regions:
+        file_path = getattr(region.image_loader, "file_path", None)
+        if file_path is None or is_remote_url(file_path):
+            continue
+        shape = roi_shape(region.roi, tiled_image.axes, tiled_image.pixel_size)
+        files[file_path] = (shape[y], shape[x])
+    return files
+
+
+def _load_cache(zarr_dir: str) -> dict[str, dict]:
+    try:
+        return json.loads(read_bytes(join_url_paths(zarr_dir, TIFF_HEADERS_NAME)))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_cache(zarr_dir: str, cache: dict[str, dict]) -> None:
+    url = join_url_paths(zarr_dir, TIFF_HEADERS_NAME)
+    write_bytes(url, json.dumps(cache).encode())
+
+
+def _check_image(
+    tiled_image: TiledImage,
+    tile_shapes: dict[str, tuple[int, int]],
+    headers: dict[str, TiffHeader],
+) -> tuple[TiledImage, list[str]]:
+    """Check an image against the headers of its probed files."""
+    problems = []
+    for path, header in headers.items():
+        # The last two dimensions of a plane, ignoring the samples of RGB files
+        yx = header.shape[-3:-1] if header.shape[-1] in (3, 4) else header.shape[-2:]
+        if tuple(yx) != tile_shapes[path]:
+            problems.append(
+                f"{path}: shape {header.shape}, the metadata gives "
+                f"{tile_shapes[path]} pixels"
+            )
+    dtypes = {header.dtype for header in headers.values()}
+    if len(dtypes) > 1:
+        problems.append(f"{tiled_image.path}: mixed data types {sorted(dtypes)}")
+    elif dtypes:
+        (dtype,) = dtypes
+        if dtype not in {member.value for member in DataTypeEnum}:
+            problems.append(f"{tiled_image.path}: unsupported data type {dtype}")
+        elif dtype != tiled_image.data_type:
+            logger.warning(
+                f"{tiled_image.path}: the metadata gives {tiled_image.data_type}, "
+                f"using {dtype} from the TIFF files."
+            )
+            tiled_image = tiled_image.model_copy(update={"data_type": dtype})
+    slow = [path for path, header in headers.items() if not header.contiguous]
+    if slow:
+        logger.info(
+            f"{tiled_image.path}: {len(slow)} of {len(headers)} probed files are "
+            "compressed or not contiguous, and are decoded when read."
+        )
+    return tiled_image, problems
+
+
+def probe_tiled_images(
+    tiled_images: list[TiledImage], *, zarr_dir: str, options: TiffProbe
+) -> list[TiledImage]:
+    """Check the images against the headers of a sample of their TIFF files.
+
+    The data type of an image is taken from its files when the metadata gives
+    a different one.
+
+    Args:
+        tiled_images (list[TiledImage]): The images to convert.
+        zarr_dir (str): Directory of the Zarr files, where the headers are
+            cached.
+        options (TiffProbe): The probe options.
+
+    Returns:
+        list[TiledImage]: The images, with the data type of their files.
+    """
+    tile_files = [_tile_files(tiled_image) for tiled_image in tiled_images]
+    samples = [_sample(list(files), options.files_per_image) for files in tile_files]
+    paths = sorted({path for sample in samples for path in sample})
+    cache = _load_cache(zarr_dir)
+    with ThreadPoolExecutor(IO_THREADS) as pool:
+        results = list(pool.map(lambda p: _probe(p, cache.get(p)), paths))
+    headers = {}
+    for path, result in zip(paths, results, strict=True):
+        if result is None:
+            continue
+        stamp, headers[path] = result
+        cache[path] = {"stamp": stamp, "header": headers[path].model_dump(mode="json")}
+    _save_cache(zarr_dir, cache)
+
+    checked, problems = [], []
+    for tiled_image, files, sample in zip(
+        tiled_images, tile_files, samples, strict=True
+    ):
+        tiled_image, image_problems = _check_image(
+            tiled_image,
+            files,
+            {path: headers[path] for path in sample if path in headers},
+        )
+        checked.append(tiled_image)
+        problems.extend(image_problems)
+    logger.info(f"Probed the headers of {len(headers)} TIFF files.")
+    if problems:
+        for problem in problems:
+            logger.error(problem)
+        raise ValueError(
+            f"The TIFF files do not match the metadata in {len(problems)} cases:\n"
+            + "\n".join(problems[:20])
+        )
+    return checked
@@ -0,0 +1,183 @@
+"""Writing steps of a tiled image, built on the public API of the converters tools.
+
+`generic_compute_task` from `ome_zarr_converters_tools` does not expose its
+individual steps, so the ones the compute pipeline needs (pixel coordinates,
+chunking, channel metadata, data writing, condition table and image list
+update) are implemented here on top of the public `TiledImage` and ngio models.
+"""
+
+import logging
+import math
+from collections.abc import Sequence
+from typing import Any
+
+import polars
+from ngio import Image, OmeZarrContainer, PixelSize, Roi
+from ngio.ome_zarr_meta import Channel, ChannelVisualisation
+from ngio.tables import ConditionTable
+from ome_zarr_converters_tools import (
+    AttributeType,
+    ImageInPlate,
+    ImageListUpdateDict,
+    OmeZarrOptions,
+    TiledImage,
+    TileSlice,
+    WriterMode,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def to_pixel_coordinates(
+    regions: list[TileSlice], pixel_size: PixelSize
+) -> list[TileSlice]:
+    """Convert the ROIs of the regions to integer pixel coordinates, in place.
+
+    The interval endpoints are rounded, not the start and the length, so that
+    adjacent tiles neither overlap nor leave a gap.
+    """
+    for region in regions:
+        roi = region.roi.to_pixel(pixel_size=pixel_size)
+        slices = []
+        for ax_slice in roi.slices:
+            assert ax_slice.start is not None and ax_slice.length is not None
+            start = round(ax_slice.start)
+            stop = round(ax_slice.start + ax_slice.length)
+            slices.append(
+                ax_slice.model_copy(update={"start": start, "length": stop - start})
+            )
+        region.roi = roi.model_copy(update={"slices": slices})
+    return regions
+
+
+def roi_shape(roi: Roi, axes: Sequence[str], pixel_size: PixelSize) -> tuple[int, ...]:
+    """Shape of the data covered by a ROI, in pixels."""
+    lengths = {}
+    for ax_slice in roi.to_pixel(pixel_size=pixel_size).slices:
+        assert ax_slice.length is not None
+        lengths[ax_slice.axis_name] = math.ceil(ax_slice.length)
+    return tuple(lengths[axis] for axis in axes)
+
+
+def chunk_size(
+    tiled_image: TiledImage, omezarr_options: OmeZarrOptions
+) -> tuple[int, ...]:
+    """Chunk shape of an image, from the shape of its first FOV."""
+    strategy = omezarr_options.chunks
+    fov_shape = tiled_image.group_by_fov()[0].shape()
+    chunks = []
+    for axis, size in zip(tiled_image.axes, fov_shape, strict=True):
+        if axis in ("x", "y"):
+            chunks.append(strategy.get_xy_chunk(size))
+        elif axis == "z":
+            chunks.append(strategy.z_chunk)
+        elif axis == "c":
+            chunks.append(strategy.c_chunk)
+        elif axis == "t":
+            chunks.append(strategy.t_chunk)
+        else:
+            logger.warning(f"Unknown axis '{axis}', setting its chunk size to 1.")
+            chunks.append(1)
+    return tuple(chunks)
+
+
+def channels_meta(tiled_image: TiledImage) -> list[Channel] | None:
+    """Channel metadata of an image, None if it declares no channels."""
+    if tiled_image.channels is None:
+        return None
+    return [
+        Channel(
+            label=channel.channel_label,
+            wavelength_id=channel.wavelength_id,
+            channel_visualisation=ChannelVisualisation(color=channel.color),
+        )
+        for channel in tiled_image.channels
+    ]
+
+
+def condition_table(
+    attributes: dict[str, AttributeType],
+) -> ConditionTable | None:
+    """Condition table of the attributes of an image, None without attributes."""
+    if not attributes:
+        return None
+    if len({len(values) for values in attributes.values()}) > 1:
+        raise ValueError(
+            "All attributes must have the same number of values. "
+            f"Got attributes {attributes}."
+        )
+    return ConditionTable(table_data=polars.DataFrame(attributes))
+
+
+def write_tiled_image_data(
+    *,
+    image: Image,
+    tiled_image: TiledImage,
+    resource: Any | None,
+    writer_mode: WriterMode,
+) -> None:
+    """Write the data of a tiled image, following the writer mode.
+
+    Args:
+        image (Image): The OME-Zarr image to write to.
+        tiled_image (TiledImage): The image to write, in pixel coordinates.
+        resource (Any | None): Optional resource passed to the image loaders.
+        writer_mode (WriterMode): How the data is loaded and written.
+    """
+    logger.info(f"Writing the data with writer mode '{writer_mode}'.")
+    if writer_mode == WriterMode.BY_TILE:
+        for region in tiled_image.regions:
+            patch = region.load_data(axes=tiled_image.axes, resource=resource)
+            image.set_roi(roi=region.roi, patch=patch)
+    elif writer_mode == WriterMode.BY_TILE_DASK:
+        patch = tiled_image.load_data_dask(resource=resource)
+        image.set_roi(roi=tiled_image.roi(), patch=patch)
+    elif writer_mode == WriterMode.BY_FOV:
+        for group in tiled_image.group_by_fov():
+            image.set_roi(roi=group.roi(), patch=group.load_data(resource=resource))
+    elif writer_mode == WriterMode.BY_FOV_DASK:
+        for group in tiled_image.group_by_fov():
+            patch = group.load_data_dask(resource=resource)
+            image.set_roi(roi=group.roi(), patch=patch)
+    elif writer_mode == WriterMode.IN_MEMORY:
+        patch = tiled_image.load_data(resource=resource)
+        image.set_roi(roi=tiled_image.roi(), patch=patch)
+    else:
+        raise ValueError(f"Unknown writer mode: {writer_mode}")
+
+
+def _attribute_value(values: AttributeType) -> Any:
+    if len(values) == 1:
+        return values[0]
+    return " & ".join(str(value) for value in values)
+
+
+def image_list_update(
+    *, zarr_url: str, ome_zarr: OmeZarrContainer, tiled_image: TiledImage
+) -> ImageListUpdateDict:
+    """Image list update of a converted image, for Fractal.
+
+    Args:
+        zarr_url (str): URL of the converted image.
+        ome_zarr (OmeZarrContainer): The converted image.
+        tiled_image (TiledImage): The tiled image it was converted from.
+
+    Returns:
+        ImageListUpdateDict: The types and attributes of the image.
+    """
+    types = {"is_3D": ome_zarr.is_3d}
+    if ome_zarr.is_time_series:
+        types["is_time_series"] = True
+    attributes = {
+        key: _attribute_value(values) for key, values in tiled_image.attributes.items()
+    }
+    collection = tiled_image.collection
+    if isinstance(collection, ImageInPlate):
+        attributes["plate"] = collection.plate_path()
+        attributes["well"] = collection.well
+        attributes["acquisition"] = collection.acquisition
+    return ImageListUpdateDict(
+        image_list_updates=[
+            {"zarr_url": zarr_url, "types": types, "attributes": attributes}
+        ]
+    )
@@ -0,0 +1,115 @@
+"""Append the new timepoints of a time-lapse acquisition to existing images.
+
+When a time-lapse plate is converted again in "Extend" mode, the init task
+reads the number of timepoints already written in each existing image. Images
+without new timepoints are skipped, and the others are emitted with the number
+of existing timepoints. The compute task then resizes the time axis of every
+resolution level and only writes the new timepoints (their chunks and their
+pyramid slices), leaving the existing data untouched.
+
+The number of existing timepoints is fixed by the init task, so that a compute
+task run again after a failure writes the same timepoints.
+"""
+
+import logging
+
+import zarr
+from ngio import open_ome_zarr_container
+from ome_zarr_converters_tools import TiledImage, join_url_paths
+
+from fractal_uzh_converters.common.object_store import url_exists
+
+logger = logging.getLogger(__name__)
+
+
+def timepoint_count(zarr_url: str) -> int | None:
+    """Number of timepoints of an existing image.
+
+    Args:
+        zarr_url (str): URL of the OME-Zarr image.
+
+    Returns:
+        int | None: The size of the time axis, or None if the image does not
+            exist or has no time axis.
+    """
+    if not url_exists(zarr_url):
+        return None
+    image = open_ome_zarr_container(zarr_url).get_image()
+    if "t" not in image.axes:
+        return None
+    return image.shape[list(image.axes).index("t")]
+
+
+def _num_timepoints(tiled_image: TiledImage) -> int | None:
+    if "t" not in tiled_image.axes:
+        return None
+    return tiled_image.shape()[list(tiled_image.axes).index("t")]
+
+
+def select_new_timepoints(
+    tiled_images: list[TiledImage], *, zarr_dir: str
+) -> tuple[list[TiledImage], list[int | None]]:
+    """Select the images with timepoints that are not written yet.
+
+    Args:
+        tiled_images (list[TiledImage]): The images to convert.
+        zarr_dir (str): Directory of the Zarr files.
+
+    Returns:
+        tuple[list[TiledImage], list[int | None]]: The images to convert, and
+            the number of timepoints already written in each of them (None for
+            the images to create).
+    """
+    selected, existing = [], []
+    for tiled_image in tiled_images:
+        num_timepoints = _num_timepoints(tiled_image)
+        written = timepoint_count(join_url_paths(zarr_dir, tiled_image.path))
+        if num_timepoints is None or written is None:
+            selected.append(tiled_image)
+            existing.append(None)
+        elif num_timepoints > written:
+            selected.append(tiled_image)
+            existing.append(written)
+    appended = sum(count is not None for count in existing)
+    logger.info(
+        f"Appending timepoints to {appended} images, "
+        f"{len(tiled_images) - len(selected)} images have no new timepoints."
+    )
+    return selected, existing
+
+
+def resize_timepoints(zarr_url: str, num_timepoints: int) -> None:
+    """Grow the time axis of every resolution level of an image.
+
+    Args:
+        zarr_url (str): URL of the OME-Zarr image.
+        num_timepoints (int): The new size of the time axis.
+    """
+    ome_zarr = open_ome_zarr_container(zarr_url)
+    t_index = list(ome_zarr.get_image().axes).index("t")
+    group = zarr.open_group(store=zarr_url, mode="r+")
+    for path in ome_zarr.level_paths:
+        array = group[path]
+        assert isinstance(array, zarr.Array)
+        shape = list(array.shape)
+        if shape[t_index] < num_timepoints:
+            shape[t_index] = num_timepoints
+            array.resize(tuple(shape))
+
+
+def later_timepoints(tiled_image: TiledImage, start: int) -> TiledImage:
+    """Copy of a tiled image with only the regions from a timepoint on.
+
+    Args:
+        tiled_image (TiledImage): The tiled image, in pixel coordinates.
+        start (int): The first timepoint to keep.
+
+    Returns:
+        TiledImage: The tiled image restricted to the later timepoints.
+    """
+    regions = []
+    for region in tiled_image.regions:
+        slicing = region.roi.to_slicing_dict(pixel_size=tiled_image.pixel_size)
+        if slicing["t"].start >= start:
+            regions.append(region)
+    return tiled_image.model_copy(update={"regions": regions})
@@ -5,19 +5,26 @@ import logging
 from ome_zarr_converters_tools import (
     ConverterOptions,
     OverwriteMode,
-    setup_images_for_conversion,
 )
 from pydantic import validate_call
 
-from fractal_uzh_converters.common import parse_acquisitions
+from fractal_uzh_converters.common import (
+    LiveAcquisition,
+    PerformanceOptions,
+    parse_acquisitions,
+    poll_live_acquisitions,
+    setup_plate_conversion,
+)
 from fractal_uzh_converters.cq3k.utils import (
     CQ3KAcquisitionModel,
+    CQ3KLiveParser,
     parse_cq3k_metadata,
 )
 
 logger = logging.getLogger("convert_cq3k_task")
 
 default_converter_options = ConverterOptions()
+default_performance_options = PerformanceOptions()
 
 
 @validate_call
@@ -29,6 +36,8 @@ def convert_cq3k_init_task(
     acquisitions: list[CQ3KAcquisitionModel],
     converter_options: ConverterOptions = default_converter_options,
     overwrite: OverwriteMode = OverwriteMode.NO_OVERWRITE,
+    performance_options: PerformanceOptions = default_performance_options,
+    live_acquisition: LiveAcquisition | None = None,
 ):
     """Initialize the task to convert a CQ3K dataset to OME-Zarr.
 
@@ -42,21 +51,43 @@ def convert_cq3k_init_task(
             - "Overwrite": Remove and replace existing data.
             - "Extend": Extend existing data without removing it.
             Default is "No Overwrite".
+        performance_options (PerformanceOptions): Advanced options to tune the
+            performance of the conversion.
+        live_acquisition (LiveAcquisition | None): If set, the acquisition may
+            still be running: only the wells completed since the previous run
+            of the task are converted, and the task can be run again as the
+            acquisition progresses.
     """
-    tiled_images = parse_acquisitions(
-        parse_function=parse_cq3k_metadata,
-        acquisitions=acquisitions,
-        converter_options=converter_options,
-    )
+    if live_acquisition is not None:
+        tiled_images, trackers = poll_live_acquisitions(
+            parser=CQ3KLiveParser(),
+            acquisitions=acquisitions,
+            converter_options=converter_options,
+            options=live_acquisition,
+            zarr_dir=zarr_dir,
+        )
+        if any(tracker.started for tracker in trackers):
+            # The plates were created by a previous run
+            overwrite = OverwriteMode.EXTEND
+    else:
+        tiled_images = parse_acquisitions(
+            parse_function=parse_cq3k_metadata,
+            acquisitions=acquisitions,
+            converter_options=converter_options,
+        )
+        trackers = []
 
-    parallelization_list = setup_images_for_conversion(
-        tiled_images=tiled_images,
-        zarr_dir=zarr_dir,
-        converter_options=converter_options,
-        collection_type="ImageInPlate",
-        overwrite_mode=overwrite,
-        ngff_version=converter_options.omezarr_options.ngff_version,
-    )
+    parallelization_list = []
+    if tiled_images:
+        parallelization_list = setup_plate_conversion(
+            tiled_images=tiled_images,
+            zarr_dir=zarr_dir,
+            converter_options=converter_options,
+            overwrite_mode=overwrite,
+            performance_options=performance_options,
+        )
+    for tracker in trackers:
+        tracker.save()
     logger.info(
         f"Prepared parallelization list with {len(parallelization_list)} items."
     )
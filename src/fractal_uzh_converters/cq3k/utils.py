@@ -17,7 +17,7 @@ from ome_zarr_converters_tools import (
     join_url_paths,
     tiles_aggregation_pipeline,
 )
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from pydantic.alias_generators import to_pascal
 
 from fractal_uzh_converters.common import (
@@ -163,16 +163,20 @@ class MeasurementDetail(Base):
 ######################################################################
 
 
+def _parse_text(text: str) -> dict[str, Any]:
+    return xmltodict.parse(
+        text,
+        process_namespaces=True,
+        namespaces={"http://www.yokogawa.co.jp/BTS/BTSSchema/1.0": None},  # type: ignore
+        attr_prefix="",
+        cdata_key="Value",
+    )
+
+
 def _parse(path: str) -> dict[str, Any]:
     try:
         with open(path, encoding="utf-8") as f:
-            return xmltodict.parse(
-                f.read(),
-                process_namespaces=True,
-                namespaces={"http://www.yokogawa.co.jp/BTS/BTSSchema/1.0": None},  # type: ignore
-                attr_prefix="",
-                cdata_key="Value",
-            )
+            return _parse_text(f.read())
     except FileNotFoundError as e:
         logger.error(f"File not found: {path}")
         raise e
@@ -181,14 +185,17 @@ def _parse(path: str) -> dict[str, Any]:
         raise e
 
 
+def _load_detail(path: str) -> MeasurementDetail:
+    mrf_path = join_url_paths(path, "MeasurementDetail.mrf")
+    mrf_dict = _parse(mrf_path)
+    return MeasurementDetail(**mrf_dict["MeasurementDetail"])
+
+
 def _load_models(path: str) -> tuple[MeasurementData, MeasurementDetail]:
     mlf_path = join_url_paths(path, "MeasurementData.mlf")
-    mrf_path = join_url_paths(path, "MeasurementDetail.mrf")
     mlf_dict = _parse(mlf_path)
-    mrf_dict = _parse(mrf_path)
     mlf = MeasurementData(**mlf_dict["MeasurementData"])
-    mrf = MeasurementDetail(**mrf_dict["MeasurementDetail"])
-    return mlf, mrf
+    return mlf, _load_detail(path)
 
 
 ######################################################################
@@ -340,14 +347,18 @@ def _build_tiles(
 ######################################################################
 
 
-def parse_cq3k_metadata(
+def build_cq3k_tiled_images(
+    records: list[ImageMeasurementRecord | ErrorMeasurementRecord],
     *,
+    detail: MeasurementDetail,
     acquisition_model: CQ3KAcquisitionModel,
     converter_options: ConverterOptions,
 ) -> list[TiledImage]:
-    """Parse CQ3K metadata and return a list of TiledImages.
+    """Build the TiledImages of CQ3K measurement records.
 
     Args:
+        records: Measurement records, the error records are skipped.
+        detail: Measurement detail of the acquisition.
         acquisition_model: Acquisition input model containing path and options.
         converter_options: Converter options for tile processing.
 
@@ -355,18 +366,14 @@ def parse_cq3k_metadata(
         List of TiledImage objects ready for conversion.
     """
     acquisition_dir = acquisition_model.path
-    data, detail = _load_models(path=acquisition_dir)
     condition_table = acquisition_model.get_condition_table()
 
-    if data.measurement_record is None:
-        raise ValueError(f"No measurement records found in {acquisition_dir}")
-
     # Group images by z_type, well (row, column), and field of view
     plates_groups: dict[
         tuple[str | None, str, int, int], list[ImageMeasurementRecord]
     ] = {}
 
-    for record in data.measurement_record:
+    for record in records:
         if not isinstance(record, ImageMeasurementRecord):
             continue
 
@@ -415,3 +422,94 @@ def parse_cq3k_metadata(
     )
 
     return tiled_images
+
+
+def parse_cq3k_metadata(
+    *,
+    acquisition_model: CQ3KAcquisitionModel,
+    converter_options: ConverterOptions,
+) -> list[TiledImage]:
+    """Parse CQ3K metadata and return a list of TiledImages.
+
+    Args:
+        acquisition_model: Acquisition input model containing path and options.
+        converter_options: Converter options for tile processing.
+
+    Returns:
+        List of TiledImage objects ready for conversion.
+    """
+    acquisition_dir = acquisition_model.path
+    data, detail = _load_models(path=acquisition_dir)
+
+    if data.measurement_record is None:
+        raise ValueError(f"No measurement records found in {acquisition_dir}")
+
+    return build_cq3k_tiled_images(
+        data.measurement_record,
+        detail=detail,
+        acquisition_model=acquisition_model,
+        converter_options=converter_options,
+    )
+
+
+######################################################################
+#
+# Live acquisition parsing
+#
+######################################################################
+
+
+_measurement_record_adapter = TypeAdapter(
+    ImageMeasurementRecord | ErrorMeasurementRecord
+)
+
+
+class CQ3KLiveParser:
+    """Parse the records appended to the `MeasurementData.mlf` of a CQ3K."""
+
+    record_tag = "MeasurementRecord"
+    container_tag = "MeasurementData"
+
+    def metadata_path(self, acquisition_model: CQ3KAcquisitionModel) -> str:
+        """Path of the measurement data file."""
+        return join_url_paths(acquisition_model.path, "MeasurementData.mlf")
+
+    def parse_records(
+        self, document: str
+    ) -> list[ImageMeasurementRecord | ErrorMeasurementRecord]:
+        """Parse the measurement records of a document."""
+        records = _parse_text(document)["MeasurementData"].get("MeasurementRecord")
+        if isinstance(records, dict):
+            records = [records]
+        return [_measurement_record_adapter.validate_python(r) for r in records or []]
+
+    def image_key(
+        self, record: ImageMeasurementRecord | ErrorMeasurementRecord
+    ) -> str | None:
+        """Key of the image (plate and well) of a record."""
+        if not isinstance(record, ImageMeasurementRecord):
+            return None
+        return f"{record.z_image_processing}/{record.row}/{record.column}"
+
+    def timepoint(self, record: ImageMeasurementRecord | ErrorMeasurementRecord) -> int:
+        """Timepoint of a record."""
+        return record.time_point
+
+    def expected_timepoints(self, acquisition_model: CQ3KAcquisitionModel) -> int:
+        """Number of timepoints in the measurement detail."""
+        return _load_detail(acquisition_model.path).time_point_count
+
+    def build_tiled_images(
+        self,
+        records: list[ImageMeasurementRecord | ErrorMeasurementRecord],
+        *,
+        acquisition_model: CQ3KAcquisitionModel,
+        converter_options: ConverterOptions,
+    ) -> list[TiledImage]:
+        """Build the TiledImages of complete records."""
+        return build_cq3k_tiled_images(
+            records,
+            detail=_load_detail(acquisition_model.path),
+            acquisition_model=acquisition_model,
+            converter_options=converter_options,
+        )
@@ -0,0 +1,271 @@
+"""Simulated slow network filesystem for tests and benchmarks.
+
+Local SSDs hide the cost of the network filesystems (NFS, GPFS) the converters
+usually read from. `SlowFilesystem` wraps the Python file opening functions
+(`open`, `io.open` and therefore `pathlib.Path.open`) and slows down the files
+below some root directories:
+
+- every open waits for a fixed latency, plus a random jitter;
+- the bytes read are limited by a bandwidth shared by all the open files, as a
+  network link would be.
+
+The delays are implemented with `time.sleep`, which releases the GIL, so
+prefetching, thread pools, batching and caching strategies behave as they
+would on a real network filesystem.
+
+Files opened by native code (e.g. lxml parsing an XML file from its path) do
+not go through the Python functions and are not slowed down.
+
+`SlowAsyncFileSystem` simulates instead an object store with a native async
+fsspec implementation: the local files are served under the `slowfile://`
+protocol, and each read waits with `asyncio.sleep`, so concurrent reads from
+an event loop overlap.
+
+Example:
+    ```python
+    with SlowFilesystem([acquisition_dir], latency=0.005, bandwidth=200) as fs:
+        convert_cq3k_init_task(zarr_dir=zarr_dir, acquisitions=[acquisition])
+    print(fs.num_opens, fs.max_concurrent_opens, fs.bytes_read, fs.delay)
+    ```
+"""
+
+import asyncio
+import builtins
+import io
+import os
+import random
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Self
+
+import fsspec
+from fsspec.asyn import AsyncFileSystem
+
+
+class SlowFilesystem:
+    """Context manager slowing down the files below some root directories."""
+
+    def __init__(
+        self,
+        roots: Iterable[str | Path],
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        bandwidth: float | None = None,
+        seed: int | None = None,
+    ) -> None:
+        """Initialize the simulated storage conditions.
+
+        Args:
+            roots (Iterable[str | Path]): Directories whose files are slowed
+                down.
+            latency (float): Time in seconds waited by each open.
+            jitter (float): Maximum random deviation in seconds of the latency.
+            bandwidth (float | None): Bandwidth in MB/s shared by all the reads,
+                or None for unlimited bandwidth.
+            seed (int | None): Seed of the jitter, for reproducible runs.
+        """
+        if latency < 0 or jitter < 0:
+            raise ValueError("latency and jitter must be non-negative.")
+        if bandwidth is not None and bandwidth <= 0:
+            raise ValueError("bandwidth must be positive.")
+        self.roots = tuple(os.path.abspath(root) for root in roots)
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.num_opens = 0
+        """Number of files opened below the roots."""
+        self.max_concurrent_opens = 0
+        """Maximum number of opens waiting for their latency at the same time."""
+        self.bytes_read = 0
+        """Number of bytes read from the files below the roots."""
+        self.delay = 0.0
+        """Total time in seconds spent waiting, summed over all threads."""
+        self.transfer_time = 0.0
+        """Time in seconds the simulated link spent transferring the bytes read."""
+        self._opening = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Time at which the simulated link is free for the next transfer
+        self._link_free_at = 0.0
+        self._original_open: Any = None
+
+    def __enter__(self) -> Self:
+        """Start slowing down the files opened from Python."""
+        if self._original_open is not None:
+            raise RuntimeError("The slow filesystem is already active.")
+        self._original_open = builtins.open
+        builtins.open = io.open = self._open
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Restore the original file opening functions."""
+        builtins.open = io.open = self._original_open
+        self._original_open = None
+
+    def is_slow(self, file: Any) -> bool:
+        """Whether a file passed to `open` is below one of the roots."""
+        if not isinstance(file, str | bytes | os.PathLike):
+            # File descriptors
+            return False
+        path = os.path.abspath(os.fsdecode(file))
+        return any(
+            path == root or path.startswith(root + os.sep) for root in self.roots
+        )
+
+    def _open(self, file: Any, *args: Any, **kwargs: Any) -> Any:
+        f = self._original_open(file, *args, **kwargs)
+        if not self.is_slow(file):
+            return f
+        latency = self.latency
+        if self.jitter:
+            latency += self._random.uniform(-self.jitter, self.jitter)
+        with self._lock:
+            self.num_opens += 1
+            self._opening += 1
+            self.max_concurrent_opens = max(self.max_concurrent_opens, self._opening)
+        try:
+            self._wait(max(latency, 0.0))
+        finally:
+            with self._lock:
+                self._opening -= 1
+        return _SlowFile(f, self)
+
+    def _transfer(self, num_bytes: int) -> None:
+        """Account for `num_bytes` read, waiting for the simulated link."""
+        with self._lock:
+            self.bytes_read += num_bytes
+            if self.bandwidth is None:
+                return
+            duration = num_bytes / (self.bandwidth * 1024**2)
+            self.transfer_time += duration
+            start = max(time.perf_counter(), self._link_free_at)
+            self._link_free_at = start + duration
+            end = self._link_free_at
+        self._wait(end - time.perf_counter())
+
+    def _wait(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        time.sleep(seconds)
+        with self._lock:
+            self.delay += seconds
+
+
+class _SlowFile:
+    """File proxy accounting the reads to a `SlowFilesystem`."""
+
+    def __init__(self, file: Any, filesystem: SlowFilesystem) -> None:
+        self._file = file
+        self._filesystem = filesystem
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._file, name)
+
+    def __enter__(self) -> Self:
+        self._file.__enter__()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._file.__exit__(*args)
+
+    def __iter__(self) -> Iterator[Any]:
+        for line in self._file:
+            self._filesystem._transfer(len(line))
+            yield line
+
+    def read(self, *args: Any) -> Any:
+        data = self._file.read(*args)
+        self._filesystem._transfer(len(data))
+        return data
+
+    def read1(self, *args: Any) -> Any:
+        data = self._file.read1(*args)
+        self._filesystem._transfer(len(data))
+        return data
+
+    def readline(self, *args: Any) -> Any:
+        line = self._file.readline(*args)
+        self._filesystem._transfer(len(line))
+        return line
+
+    def readlines(self, *args: Any) -> list[Any]:
+        lines = self._file.readlines(*args)
+        self._filesystem._transfer(sum(len(line) for line in lines))
+        return lines
+
+    def readinto(self, buffer: Any) -> int:
+        num_bytes = self._file.readinto(buffer)
+        self._filesystem._transfer(num_bytes or 0)
+        return num_bytes
+
+
+class SlowAsyncFileSystem(AsyncFileSystem):
+    """Local files behind a native async fsspec filesystem, with a read latency.
+
+    Use `register_slow_async_filesystem` to serve the local files under the
+    `slowfile://` protocol. The reads are counted on the registered class, as
+    fsspec creates the instances.
+    """
+
+    protocol = "slowfile"
+    latency = 0.0
+    """Time in seconds waited by each read."""
+    num_reads = 0
+    """Number of files read."""
+    max_in_flight = 0
+    """Maximum number of concurrent reads."""
+    _in_flight = 0
+
+    async def _cat_file(
+        self, path: str, start: int | None = None, end: int | None = None, **kwargs
+    ) -> bytes:
+        cls = type(self)
+        cls.num_reads += 1
+        cls._in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls._in_flight)
+        try:
+            await asyncio.sleep(cls.latency)
+            data = Path(self._strip_protocol(path)).read_bytes()
+        finally:
+            cls._in_flight -= 1
+        return data[start:end]
+
+    async def _info(self, path: str, **kwargs) -> dict[str, Any]:
+        await asyncio.sleep(type(self).latency)
+        local_path = Path(self._strip_protocol(path))
+        stat = local_path.stat()
+        return {
+            "name": path,
+            "size": stat.st_size,
+            "type": "directory" if local_path.is_dir() else "file",
+        }
+
+
+def register_slow_async_filesystem(latency: float) -> type[SlowAsyncFileSystem]:
+    """Serve the local files under `slowfile://`, with a latency per read.
+
+    Args:
+        latency (float): Time in seconds waited by each read.
+
+    Returns:
+        type[SlowAsyncFileSystem]: The registered filesystem class, holding the
+            read counters.
+    """
+    if latency < 0:
+        raise ValueError("latency must be non-negative.")
+    fs_class = type(
+        "SlowAsyncFileSystem",
+        (SlowAsyncFileSystem,),
+        {"latency": latency, "num_reads": 0, "max_in_flight": 0, "_in_flight": 0},
+    )
+    fsspec.register_implementation(SlowAsyncFileSystem.protocol, fs_class, clobber=True)
+    return fs_class
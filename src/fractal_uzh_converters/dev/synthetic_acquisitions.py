@@ -0,0 +1,584 @@
+"""Synthetic acquisition metadata for tests and benchmarks.
+
+Writes valid CQ3K (`MeasurementData.mlf` + `MeasurementDetail.mrf`), Operetta
+(`Images/Index.idx.xml`) and Olympus ScanR (`data/metadata.ome.xml`) metadata
+for a plate of configurable size. Only the first TIFF file is written by
+default, since the parsers read it to find the data type; the others can be
+written with `write_synthetic_images`.
+
+The metadata files are streamed to disk record by record, so plates with
+millions of records can be generated with a small memory footprint.
+
+`build_synthetic_tiled_images` builds instead the tiled images of the compute
+step directly, with one TIFF file per plane.
+"""
+
+import itertools
+import math
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Literal, NamedTuple, TextIO
+
+import numpy as np
+import tifffile
+from ome_zarr_converters_tools import (
+    AcquisitionDetails,
+    ConverterOptions,
+    DefaultImageLoader,
+    ImageInPlate,
+    Tile,
+    TiledImage,
+    default_axes_builder,
+    tiles_aggregation_pipeline,
+)
+from pydantic import BaseModel, ConfigDict, Field
+
+from fractal_uzh_converters.common import STANDARD_ROWS_NAMES
+
+Vendor = Literal["cq3k", "operetta", "scanr"]
+VENDORS: tuple[Vendor, ...] = ("cq3k", "operetta", "scanr")
+
+
+class SyntheticPlate(BaseModel):
+    """Geometry of a synthetic plate acquisition."""
+
+    rows: int = Field(default=1, ge=1, le=16)
+    """Number of well rows, starting from row A."""
+    columns: int = Field(default=1, ge=1, le=24)
+    """Number of well columns, starting from column 1."""
+    fields: int = Field(default=1, ge=1)
+    """Number of fields of view per well, laid out on a square grid."""
+    channels: int = Field(default=1, ge=1)
+    """Number of channels."""
+    z_planes: int = Field(default=1, ge=1)
+    """Number of Z planes."""
+    timepoints: int = Field(default=1, ge=1)
+    """Number of timepoints."""
+    fov_size: int = Field(default=64, ge=1)
+    """Size of each (square) field of view, in pixels."""
+    dtype: Literal["uint8", "uint16"] = "uint16"
+    """Data type of the images."""
+    pixel_size: float = Field(default=0.5, gt=0)
+    """Pixel size in micrometers."""
+    z_spacing: float = Field(default=1.0, gt=0)
+    """Distance between Z planes in micrometers."""
+    error_records: int = Field(default=0, ge=0)
+    """Number of error records (CQ3K only, ignored by the parser)."""
+    model_config = ConfigDict(extra="forbid")
+
+    @classmethod
+    def with_num_records(
+        cls, num_records: int, *, channels: int = 4, z_planes: int = 1, **kwargs
+    ) -> "SyntheticPlate":
+        """Plate with approximately `num_records` image records.
+
+        Uses a 384-well layout (fewer wells for small sizes) and sets the
+        number of fields to reach the requested number of records.
+        """
+        per_fov = channels * z_planes * kwargs.get("timepoints", 1)
+        wells = max(1, min(384, num_records // per_fov))
+        columns = min(24, wells)
+        rows = max(1, min(16, wells // columns))
+        fields = max(1, round(num_records / (rows * columns * per_fov)))
+        return cls(
+            rows=rows,
+            columns=columns,
+            fields=fields,
+            channels=channels,
+            z_planes=z_planes,
+            **kwargs,
+        )
+
+    @property
+    def num_records(self) -> int:
+        """Number of image records (one per TIFF file)."""
+        return (
+            self.rows
+            * self.columns
+            * self.fields
+            * self.channels
+            * self.z_planes
+            * self.timepoints
+        )
+
+    @property
+    def bit_depth(self) -> int:
+        """Number of bits per pixel."""
+        return np.dtype(self.dtype).itemsize * 8
+
+    @property
+    def num_images(self) -> int:
+        """Number of OME-Zarr images produced by the conversion (one per well)."""
+        return self.rows * self.columns
+
+    @property
+    def scanr_layout(self) -> Literal["96-well", "384-well"]:
+        """Smallest ScanR plate layout fitting the wells."""
+        return "96-well" if self.rows <= 8 and self.columns <= 12 else "384-well"
+
+
+class SyntheticRecord(NamedTuple):
+    """A single image record of a synthetic acquisition."""
+
+    row: int
+    """0-based row index."""
+    column: int
+    """1-based column number."""
+    field: int
+    """1-based field index."""
+    channel: int
+    """0-based channel index."""
+    z: int
+    """0-based Z index."""
+    t: int
+    """0-based timepoint index."""
+    x: float
+    """Position of the field in micrometers, image coordinates."""
+    y: float
+    """Position of the field in micrometers, image coordinates (y down)."""
+
+    @property
+    def row_name(self) -> str:
+        """Row letter."""
+        return STANDARD_ROWS_NAMES[self.row]
+
+
+def iter_records(plate: SyntheticPlate) -> Iterator[SyntheticRecord]:
+    """Iterate over the image records of a plate, well by well.
+
+    The fields of a well are laid out on a square grid without overlap, at
+    positions that are multiples of the pixel size.
+
+    Args:
+        plate (SyntheticPlate): The plate geometry.
+    """
+    grid = math.ceil(math.sqrt(plate.fields))
+    fov_um = plate.fov_size * plate.pixel_size
+    for row in range(plate.rows):
+        for column in range(1, plate.columns + 1):
+            for field in range(1, plate.fields + 1):
+                grid_y, grid_x = divmod(field - 1, grid)
+                for t in range(plate.timepoints):
+                    for z in range(plate.z_planes):
+                        for channel in range(plate.channels):
+                            yield SyntheticRecord(
+                                row=row,
+                                column=column,
+                                field=field,
+                                channel=channel,
+                                z=z,
+                                t=t,
+                                x=grid_x * fov_um,
+                                y=grid_y * fov_um,
+                            )
+
+
+def _channel_name(channel: int) -> str:
+    return f"Channel {channel + 1}"
+
+
+######################################################################
+#
+# CQ3K
+#
+######################################################################
+
+_CQ3K_NS = 'xmlns:bts="http://www.yokogawa.co.jp/BTS/BTSSchema/1.0"'
+_CQ3K_TIME = "2025-01-01T10:00:00.000+01:00"
+
+
+def _cq3k_file_name(plate: SyntheticPlate, record: SyntheticRecord) -> str:
+    well = record.row * plate.columns + record.column
+    return (
+        f"W{well:04d}F{record.field:04d}T{record.t + 1:04d}"
+        f"Z{record.z + 1:03d}C{record.channel + 1}.tif"
+    )
+
+
+def _write_cq3k(path: Path, plate: SyntheticPlate) -> None:
+    with open(path / "MeasurementData.mlf", "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        f.write(f'<bts:MeasurementData bts:Version="1.0" {_CQ3K_NS}>\n')
+        for record in iter_records(plate):
+            f.write(
+                f'<bts:MeasurementRecord bts:Type="IMG" bts:Time="{_CQ3K_TIME}" '
+                f'bts:Column="{record.column}" bts:Row="{record.row + 1}" '
+                f'bts:TimePoint="{record.t + 1}" bts:FieldIndex="{record.field}" '
+                f'bts:ZIndex="{record.z + 1}" bts:TimelineIndex="1" '
+                f'bts:ActionIndex="1" bts:Action="3D" bts:X="{record.x}" '
+                f'bts:Y="{-record.y}" bts:Z="{record.z * plate.z_spacing}" '
+                f'bts:Ch="{record.channel + 1}">'
+                f"{_cq3k_file_name(plate, record)}</bts:MeasurementRecord>\n"
+            )
+        for index in range(plate.error_records):
+            f.write(
+                f'<bts:MeasurementRecord bts:Type="ERR" bts:Time="{_CQ3K_TIME}" '
+                f'bts:Column="1" bts:Row="1" bts:TimePoint="1" '
+                f'bts:FieldIndex="{index + 1}" bts:TimelineIndex="1" '
+                f'bts:X="0" bts:Y="0">Synthetic error {index}</bts:MeasurementRecord>\n'
+            )
+        f.write("</bts:MeasurementData>\n")
+
+    channels = "".join(
+        f'  <bts:MeasurementChannel bts:Ch="{channel + 1}" '
+        f'bts:HorizontalPixelDimension="{plate.pixel_size}" '
+        f'bts:VerticalPixelDimension="{plate.pixel_size}" bts:CameraNumber="1" '
+        f'bts:InputBitDepth="{plate.bit_depth}" '
+        f'bts:InputLevel="{2**plate.bit_depth - 1}" '
+        f'bts:HorizontalPixels="{plate.fov_size}" '
+        f'bts:VerticalPixels="{plate.fov_size}" bts:FilterWheelPosition="1" '
+        f'bts:FilterPosition="1" bts:ShadingCorrectionSource="" '
+        f'bts:ObjectiveMagnificationRatio="1.0" '
+        f'bts:OriginalHorizontalPixels="{plate.fov_size}" '
+        f'bts:OriginalVerticalPixels="{plate.fov_size}" />\n'
+        for channel in range(plate.channels)
+    )
+    with open(path / "MeasurementDetail.mrf", "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        f.write(
+            f'<bts:MeasurementDetail bts:Version="1.0" bts:OperatorName="synthetic" '
+            f'bts:Title="synthetic" bts:Application="" bts:BeginTime="{_CQ3K_TIME}" '
+            f'bts:EndTime="{_CQ3K_TIME}" bts:MeasurementSettingFileName="384WP.mes" '
+            f'bts:ColumnCount="24" bts:RowCount="16" '
+            f'bts:TimePointCount="{plate.timepoints}" '
+            f'bts:FieldCount="{plate.fields}" bts:ZCount="{plate.z_planes}" '
+            f'bts:TargetSystem="synthetic" bts:ReleaseNumber="R1.00.00.00" '
+            f'bts:Status="0" {_CQ3K_NS}>\n'
+            f'  <bts:MeasurementSamplePlate bts:Name="384WP" '
+            f'bts:WellPlateFileName="384WP.wpi" '
+            f'bts:WellPlateProductFileName="synthetic.wpp" />\n'
+            f"{channels}"
+            "</bts:MeasurementDetail>\n"
+        )
+
+
+######################################################################
+#
+# Operetta
+#
+######################################################################
+
+
+def _operetta_file_name(record: SyntheticRecord) -> str:
+    return (
+        f"r{record.row + 1:02d}c{record.column:02d}f{record.field:02d}"
+        f"p{record.z + 1:02d}-ch{record.channel + 1}sk{record.t + 1}fk1fl1.tiff"
+    )
+
+
+def _write_operetta_image(
+    f: TextIO, plate: SyntheticPlate, record: SyntheticRecord
+) -> None:
+    pixel_size_m = plate.pixel_size * 1e-6
+    f.write(
+        '    <Image Version="1">\n'
+        f"      <State>Ok</State>\n"
+        f"      <URL>{_operetta_file_name(record)}</URL>\n"
+        f"      <Row>{record.row + 1}</Row>\n"
+        f"      <Col>{record.column}</Col>\n"
+        f"      <FieldID>{record.field}</FieldID>\n"
+        f"      <PlaneID>{record.z + 1}</PlaneID>\n"
+        f"      <TimepointID>{record.t}</TimepointID>\n"
+        f"      <ChannelID>{record.channel + 1}</ChannelID>\n"
+        f"      <ChannelName>{_channel_name(record.channel)}</ChannelName>\n"
+        f'      <ImageResolutionX Unit="m">{pixel_size_m}</ImageResolutionX>\n'
+        f'      <ImageResolutionY Unit="m">{pixel_size_m}</ImageResolutionY>\n'
+        f"      <ImageSizeX>{plate.fov_size}</ImageSizeX>\n"
+        f"      <ImageSizeY>{plate.fov_size}</ImageSizeY>\n"
+        f"      <MaxIntensity>{2**plate.bit_depth - 1}</MaxIntensity>\n"
+        f'      <PositionX Unit="um">{record.x}</PositionX>\n'
+        f'      <PositionY Unit="um">{-record.y}</PositionY>\n'
+        f'      <PositionZ Unit="um">{record.z * plate.z_spacing}</PositionZ>\n'
+        f'      <AbsPositionZ Unit="um">{record.z * plate.z_spacing}</AbsPositionZ>\n'
+        "    </Image>\n"
+    )
+
+
+def _write_operetta(path: Path, plate: SyntheticPlate) -> None:
+    images_dir = path / "Images"
+    images_dir.mkdir(exist_ok=True)
+    with open(images_dir / "Index.idx.xml", "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        f.write(
+            '<EvaluationInputData Version="1" '
+            'xmlns="http://www.perkinelmer.com/PEHH/HarmonyV5">\n'
+            "  <User>synthetic</User>\n"
+            "  <Plates>\n    <Plate>\n"
+            "      <PlateID>synthetic</PlateID>\n"
+            "      <PlateRows>16</PlateRows>\n"
+            "      <PlateColumns>24</PlateColumns>\n"
+            "    </Plate>\n  </Plates>\n"
+            "  <Images>\n"
+        )
+        for record in iter_records(plate):
+            _write_operetta_image(f, plate, record)
+        f.write("  </Images>\n</EvaluationInputData>\n")
+
+
+######################################################################
+#
+# Olympus ScanR
+#
+######################################################################
+
+_SCANR_LAYOUT_COLUMNS = {"96-well": 12, "384-well": 24}
+
+
+def _scanr_well_id(plate: SyntheticPlate, record: SyntheticRecord) -> int:
+    return record.row * _SCANR_LAYOUT_COLUMNS[plate.scanr_layout] + record.column
+
+
+def _scanr_file_name(plate: SyntheticPlate, record: SyntheticRecord) -> str:
+    well_name = f"{record.row_name}{record.column}"
+    return (
+        f"{well_name}--W{_scanr_well_id(plate, record):05d}"
+        f"--P{record.field:05d}--Z{record.z:05d}--T{record.t:05d}"
+        f"--{_channel_name(record.channel)}.tif"
+    )
+
+
+def _write_scanr_image(
+    f: TextIO, plate: SyntheticPlate, records: list[SyntheticRecord]
+) -> None:
+    first = records[0]
+    image_id = f"W{_scanr_well_id(plate, first)}P{first.field}"
+    f.write(
+        f'  <Image ID="Image:{image_id}" Name="Well {image_id}">\n'
+        f'    <Pixels DimensionOrder="XYCZT" ID="Pixels:{image_id}" '
+        f'PhysicalSizeX="{plate.pixel_size}" PhysicalSizeY="{plate.pixel_size}" '
+        f'SignificantBits="{plate.bit_depth}" SizeC="{plate.channels}" '
+        f'SizeT="{plate.timepoints}" '
+        f'SizeX="{plate.fov_size}" SizeY="{plate.fov_size}" '
+        f'SizeZ="{plate.z_planes}" Type="{plate.dtype}">\n'
+    )
+    for channel in range(plate.channels):
+        f.write(
+            f'      <Channel ID="Channel:{image_id}:{channel}" '
+            f'Name="{_channel_name(channel)}"/>\n'
+        )
+    for record in records:
+        file_uuid = uuid.uuid5(uuid.NAMESPACE_URL, _scanr_file_name(plate, record))
+        f.write(
+            f'      <TiffData FirstC="{record.channel}" FirstT="{record.t}" '
+            f'FirstZ="{record.z}">\n'
+            f'        <UUID FileName="{_scanr_file_name(plate, record)}">'
+            f"urn:uuid:{file_uuid}</UUID>\n"
+            "      </TiffData>\n"
+        )
+    for record in records:
+        f.write(
+            f'      <Plane PositionX="{record.x}" PositionY="{-record.y}" '
+            f'PositionZ="{record.z * plate.z_spacing}" TheC="{record.channel}" '
+            f'TheT="{record.t}" TheZ="{record.z}"/>\n'
+        )
+    f.write("    </Pixels>\n  </Image>\n")
+
+
+def _write_scanr(path: Path, plate: SyntheticPlate) -> None:
+    data_dir = path / "data"
+    data_dir.mkdir(exist_ok=True)
+    with open(data_dir / "metadata.ome.xml", "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n')
+        f.write(
+            '<OME Creator="synthetic" '
+            'xmlns="http://www.openmicroscopy.org/Schemas/OME/2013-06">\n'
+        )
+        # One OME image per well position, holding all its planes
+        records: list[SyntheticRecord] = []
+        for record in iter_records(plate):
+            if records and (record.row, record.column, record.field) != (
+                records[0].row,
+                records[0].column,
+                records[0].field,
+            ):
+                _write_scanr_image(f, plate, records)
+                records = []
+            records.append(record)
+        if records:
+            _write_scanr_image(f, plate, records)
+        f.write("</OME>\n")
+
+
+######################################################################
+#
+# Public API
+#
+######################################################################
+
+_WRITERS = {"cq3k": _write_cq3k, "operetta": _write_operetta, "scanr": _write_scanr}
+
+
+def write_synthetic_acquisition(
+    vendor: Vendor, path: str | Path, plate: SyntheticPlate
+) -> str:
+    """Write the metadata of a synthetic acquisition, and its first image.
+
+    Args:
+        vendor (Vendor): The microscope format to write.
+        path (str | Path): The acquisition directory, created if missing.
+        plate (SyntheticPlate): The plate geometry.
+
+    Returns:
+        str: The acquisition directory, to use as the acquisition path.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    _WRITERS[vendor](path, plate)
+    write_synthetic_images(vendor, path, plate, max_images=1)
+    return str(path)
+
+
+def synthetic_image_data(plate: SyntheticPlate, index: int) -> np.ndarray:
+    """Reproducible image content: a smooth gradient with Poisson noise.
+
+    Args:
+        plate (SyntheticPlate): The plate geometry.
+        index (int): Index of the record, used as the random seed.
+    """
+    rng = np.random.default_rng(index)
+    max_value = 2**plate.bit_depth - 1
+    yy, xx = np.mgrid[0 : plate.fov_size, 0 : plate.fov_size]
+    background = (max_value // 16) * (1 + (yy + xx) / (2 * plate.fov_size))
+    data = rng.poisson(background)
+    return np.clip(data, 0, max_value).astype(plate.dtype)
+
+
+def write_synthetic_images(
+    vendor: Vendor,
+    path: str | Path,
+    plate: SyntheticPlate,
+    *,
+    compression: str | None = None,
+    max_images: int | None = None,
+) -> int:
+    """Write the TIFF files referenced by a synthetic acquisition.
+
+    Args:
+        vendor (Vendor): The microscope format of the acquisition.
+        path (str | Path): The acquisition directory.
+        plate (SyntheticPlate): The plate geometry.
+        compression (str | None): TIFF compression, e.g. "zlib" or "lzw".
+        max_images (int | None): Only write the first images.
+
+    Returns:
+        int: The number of files written.
+    """
+    images = itertools.islice(iter_synthetic_images(vendor, path, plate), max_images)
+    count = 0
+    for index, (tiff_path, _) in enumerate(images):
+        tiff_path.parent.mkdir(parents=True, exist_ok=True)
+        tifffile.imwrite(
+            tiff_path, synthetic_image_data(plate, index), compression=compression
+        )
+        count += 1
+    return count
+
+
+def iter_synthetic_images(
+    vendor: Vendor, path: str | Path, plate: SyntheticPlate
+) -> Iterator[tuple[Path, SyntheticRecord]]:
+    """Iterate over the TIFF files referenced by a synthetic acquisition.
+
+    Args:
+        vendor (Vendor): The microscope format of the acquisition.
+        path (str | Path): The acquisition directory.
+        plate (SyntheticPlate): The plate geometry.
+
+    Yields:
+        tuple[Path, SyntheticRecord]: The path of each TIFF file and its record.
+    """
+    path = Path(path)
+    for record in iter_records(plate):
+        if vendor == "cq3k":
+            yield path / _cq3k_file_name(plate, record), record
+        elif vendor == "operetta":
+            yield path / "Images" / _operetta_file_name(record), record
+        else:
+            yield path / "data" / _scanr_file_name(plate, record), record
+
+
+def build_synthetic_tiled_images(
+    root: Path,
+    *,
+    wells: tuple[tuple[str, int], ...] = (("A", 1),),
+    fov_grid: tuple[int, int] = (2, 2),
+    fov_yx: tuple[int, int] = (64, 64),
+    num_z: int = 1,
+    num_c: int = 1,
+    num_t: int = 1,
+    dtype: str = "uint16",
+    converter_options: ConverterOptions | None = None,
+    url_prefix: str = "",
+) -> list[TiledImage]:
+    """Write one TIFF per plane and build the matching tiled images.
+
+    Unlike the synthetic acquisitions, the tiles are built directly, without
+    metadata files and parsers, e.g. to test or benchmark the compute step.
+
+    Args:
+        root (Path): Directory to write the TIFF files to, in `tiffs/`.
+        wells (tuple[tuple[str, int], ...]): Row and column of each image.
+        fov_grid (tuple[int, int]): Number of FOVs along Y and X.
+        fov_yx (tuple[int, int]): FOV size in pixels.
+        num_z (int): Number of Z planes.
+        num_c (int): Number of channels.
+        num_t (int): Number of timepoints.
+        dtype (str): Data type of the TIFF files.
+        converter_options (ConverterOptions | None): Options of the tiles
+            aggregation.
+        url_prefix (str): Prefix of the file paths referenced by the tiles,
+            e.g. a protocol.
+
+    Returns:
+        list[TiledImage]: One tiled image per well.
+    """
+    rng = np.random.default_rng(0)
+    tiff_dir = root / "tiffs"
+    tiff_dir.mkdir(parents=True, exist_ok=True)
+    acquisition_details = AcquisitionDetails(
+        pixelsize=0.5,
+        axes=default_axes_builder(is_time_series=num_t > 1),
+        data_type=dtype,
+        start_z_coo="pixel",
+        start_t_coo="pixel",
+    )
+    len_y, len_x = fov_yx
+    tiles = []
+    for row, column in wells:
+        collection = ImageInPlate(
+            plate_name="plate", row=row, column=column, acquisition=0
+        )
+        for fov_y in range(fov_grid[0]):
+            for fov_x in range(fov_grid[1]):
+                fov = fov_y * fov_grid[1] + fov_x
+                for t in range(num_t):
+                    for c in range(num_c):
+                        for z in range(num_z):
+                            name = f"{row}{column:02d}_F{fov}_T{t}_C{c}_Z{z}.tif"
+                            data = rng.integers(0, 1000, size=fov_yx).astype(dtype)
+                            tifffile.imwrite(tiff_dir / name, data)
+                            tiles.append(
+                                Tile(
+                                    fov_name=f"FOV_{fov}",
+                                    start_x=fov_x * len_x * 0.5,
+                                    length_x=len_x,
+                                    start_y=fov_y * len_y * 0.5,
+                                    length_y=len_y,
+                                    start_z=z,
+                                    length_z=1,
+                                    start_c=c,
+                                    length_c=1,
+                                    start_t=t,
+                                    length_t=1,
+                                    collection=collection,
+                                    image_loader=DefaultImageLoader(
+                                        file_path=f"{url_prefix}{tiff_dir / name}"
+                                    ),
+                                    acquisition_details=acquisition_details,
+                                )
+                            )
+    return tiles_aggregation_pipeline(
+        tiles=tiles,
+        converter_options=converter_options or ConverterOptions(),
+    )
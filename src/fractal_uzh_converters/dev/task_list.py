@@ -1,6 +1,6 @@
 """Contains the list of tasks available to fractal."""
 
-from fractal_task_tools.task_models import ConverterCompoundTask
+from fractal_task_tools.task_models import ConverterCompoundTask, NonParallelTask
 
 AUTHORS = "Fractal Core Team"
 DOCS_LINK = "https://fractal-analytics-platform.github.io/fractal-uzh-converters/stable"
@@ -12,7 +12,7 @@ TASK_LIST = [
         executable_init="olympus_scanr/convert_scanr_init_task.py",
         executable="common/image_in_plate_compute_task.py",
         meta_init={"cpus_per_task": 1, "mem": 4000},
-        meta={"cpus_per_task": 1, "mem": 4000},
+        meta={"cpus_per_task": 4, "mem": 8000},
         category="Conversion",
         modality="HCS",
         tags=[
@@ -27,7 +27,7 @@ TASK_LIST = [
         executable_init="cq3k/convert_cq3k_init_task.py",
         executable="common/image_in_plate_compute_task.py",
         meta_init={"cpus_per_task": 1, "mem": 4000},
-        meta={"cpus_per_task": 1, "mem": 4000},
+        meta={"cpus_per_task": 4, "mem": 8000},
         category="Conversion",
         modality="HCS",
         tags=[
@@ -42,7 +42,7 @@ TASK_LIST = [
         executable_init="operetta/convert_operetta_init_task.py",
         executable="common/image_in_plate_compute_task.py",
         meta_init={"cpus_per_task": 1, "mem": 4000},
-        meta={"cpus_per_task": 1, "mem": 4000},
+        meta={"cpus_per_task": 4, "mem": 8000},
         category="Conversion",
         modality="HCS",
         tags=[
@@ -51,4 +51,42 @@ TASK_LIST = [
         ],
         docs_info="file:docs_info/operetta_task.md",
     ),
+    NonParallelTask(
+        name="Build Pyramid Levels",
+        executable="common/build_pyramids_task.py",
+        meta={"cpus_per_task": 4, "mem": 16000},
+        input_types={"pyramid_pending": True},
+        output_types={"pyramid_pending": False},
+        category="Conversion",
+        modality="HCS",
+        tags=[
+            "Pyramid",
+            "Plate converter",
+        ],
+        docs_info="file:docs_info/build_pyramids_task.md",
+    ),
+    NonParallelTask(
+        name="Aggregate Channel Statistics",
+        executable="common/aggregate_channel_statistics_task.py",
+        meta={"cpus_per_task": 1, "mem": 4000},
+        category="Conversion",
+        modality="HCS",
+        tags=[
+            "Statistics",
+            "Plate converter",
+        ],
+        docs_info="file:docs_info/aggregate_channel_statistics_task.md",
+    ),
+    NonParallelTask(
+        name="Finalize Plate Metadata",
+        executable="common/finalize_plate_metadata_task.py",
+        meta={"cpus_per_task": 1, "mem": 4000},
+        category="Conversion",
+        modality="HCS",
+        tags=[
+            "Metadata",
+            "Plate converter",
+        ],
+        docs_info="file:docs_info/finalize_plate_metadata_task.md",
+    ),
 ]
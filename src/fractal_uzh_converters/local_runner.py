@@ -0,0 +1,560 @@
+"""Run a whole conversion on a single node, without a Fractal server.
+
+The init task of the converter runs in the current process, then the items of
+the parallelization list run through `image_in_plate_compute_task` on a pool
+of worker processes:
+
+- at most `workers` images are converted at the same time, each with its share
+  of the CPUs (unless `CPU Workers` is set in the performance options);
+- an image only starts if its estimated memory fits in the memory limit next to
+  the running images (an image larger than the limit runs alone);
+- failed images are retried up to `retries` times; an image created from
+  scratch by the failed attempt is removed first (or resumed, with `Resumable
+  Writing`), while an image that existed before is left to the overwrite mode
+  of the retry (e.g. an image whose timepoints are appended is never removed);
+- when a worker dies (e.g. killed when out of memory), the images running at
+  that time are not charged an attempt, but run again one at a time, so that
+  only the image killing its worker fails;
+- a progress bar shows the converted images, and a summary with the throughput
+  and the failures is returned (and printed by the CLI).
+
+Once all the images are converted, the plate and well metadata is finalized in
+a single pass, and consolidated with `--consolidate-metadata`.
+
+With `--live`, the acquisitions may still be running (CQ3K and Operetta): the
+init task runs again every `--poll-interval` seconds and the wells completed in
+the meantime are converted, until the acquisitions are finished.
+
+Example:
+    ```bash
+    fractal-uzh-convert cq3k /data/plate1 /data/plate2 --zarr-dir /data/zarr
+    ```
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any
+
+import fsspec
+from ome_zarr_converters_tools import (
+    ConverterOptions,
+    OverwriteMode,
+    join_url_paths,
+    local_url_to_path,
+)
+from pydantic import BaseModel, Field
+from tqdm import tqdm
+
+from fractal_uzh_converters.common import (
+    ImageInPlateInitArgs,
+    LiveAcquisition,
+    PerformanceOptions,
+    estimate_cost,
+    image_in_plate_compute_task,
+)
+from fractal_uzh_converters.common.completion_log import COMPLETION_LOG_NAME
+from fractal_uzh_converters.common.compute_pipeline import resolve_init_args
+from fractal_uzh_converters.common.finalize_plate_metadata_task import (
+    finalize_plate_metadata_task,
+)
+from fractal_uzh_converters.common.live_acquisition import live_acquisitions_done
+from fractal_uzh_converters.common.object_store import is_remote_url, url_exists
+from fractal_uzh_converters.common.parallelism import allocated_cpus, share_cpus
+from fractal_uzh_converters.cq3k.convert_cq3k_init_task import convert_cq3k_init_task
+from fractal_uzh_converters.cq3k.utils import CQ3KAcquisitionModel
+from fractal_uzh_converters.olympus_scanr.convert_scanr_init_task import (
+    convert_scanr_init_task,
+)
+from fractal_uzh_converters.operetta.convert_operetta_init_task import (
+    convert_operetta_init_task,
+)
+from fractal_uzh_converters.operetta.utils import OperettaAcquisitionModel
+
+logger = logging.getLogger(__name__)
+
+INIT_TASKS = {
+    "cq3k": convert_cq3k_init_task,
+    "operetta": convert_operetta_init_task,
+    "scanr": convert_scanr_init_task,
+}
+
+LIVE_ACQUISITION_MODELS = {
+    "cq3k": CQ3KAcquisitionModel,
+    "operetta": OperettaAcquisitionModel,
+}
+
+
+class LocalRunSummary(BaseModel):
+    """Summary of a local conversion."""
+
+    num_images: int = 0
+    """Number of images in the parallelization list."""
+    converted: list[str] = Field(default_factory=list)
+    """URLs of the converted images."""
+    failed: dict[str, str] = Field(default_factory=dict)
+    """Last error of each image that failed after all the retries."""
+    retried: int = 0
+    """Number of retried attempts."""
+    init_time_s: float = 0.0
+    """Wall time of the init task."""
+    compute_time_s: float = 0.0
+    """Wall time of the compute tasks."""
+    finalize_time_s: float = 0.0
+    """Wall time of the plate metadata finalization."""
+    estimated_bytes: int = 0
+    """Estimated bytes read for the converted images."""
+    image_list_updates: list[dict[str, Any]] = Field(default_factory=list)
+    """Image list updates of the converted images."""
+
+    def report(self) -> str:
+        """Human readable summary."""
+        compute_time = max(self.compute_time_s, 1e-9)
+        lines = [
+            f"Converted {len(self.converted)}/{self.num_images} images "
+            f"(init {self.init_time_s:.1f} s, compute {self.compute_time_s:.1f} s, "
+            f"finalize {self.finalize_time_s:.1f} s, {self.retried} retries).",
+            f"Throughput: {len(self.converted) / compute_time:.2f} images/s, "
+            f"{self.estimated_bytes / 1024**2 / compute_time:.1f} MB/s read.",
+        ]
+        for zarr_url, error in self.failed.items():
+            lines.append(f"Failed: {zarr_url}: {error}")
+        return "\n".join(lines)
+
+    def extend(self, other: "LocalRunSummary") -> None:
+        """Add the images of another run, e.g. a later poll of a live run."""
+        self.num_images += other.num_images
+        self.converted.extend(other.converted)
+        self.failed.update(other.failed)
+        self.retried += other.retried
+        self.init_time_s += other.init_time_s
+        self.compute_time_s += other.compute_time_s
+        self.finalize_time_s += other.finalize_time_s
+        self.estimated_bytes += other.estimated_bytes
+        self.image_list_updates.extend(other.image_list_updates)
+
+
+def available_memory() -> int | None:
+    """Available physical memory in bytes, or None if unknown."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _estimate_item_cost(item: dict, *, resolve: bool) -> int:
+    """Estimated bytes read by the compute task of an item.
+
+    The estimate is set by the init task. Otherwise, the tiled image of the item
+    is loaded to estimate it if `resolve` is set, and 0 is returned if not.
+    """
+    estimated_bytes = item["init_args"].get("estimated_bytes")
+    if estimated_bytes is not None:
+        return estimated_bytes
+    if not resolve:
+        return 0
+    init_args = ImageInPlateInitArgs.model_validate(item["init_args"])
+    _, tiled_image = resolve_init_args(init_args)
+    return estimate_cost(tiled_image)
+
+
+def _run_item(item: dict) -> dict:
+    """Run the compute task of an item, in a worker process."""
+    return image_in_plate_compute_task(**item)
+
+
+def clean_failed_attempt(zarr_url: str, *, existed: bool) -> bool:
+    """Remove the image written by a failed attempt, before retrying it.
+
+    Only an image created from scratch by the attempt is removed, and only if
+    the retry cannot resume it from its completion log. An image that existed
+    before the attempt (e.g. extended, or with appended timepoints) holds data
+    the attempt did not create, and is left to the overwrite mode of the retry.
+
+    Args:
+        zarr_url (str): URL of the image.
+        existed (bool): Whether the image existed before the first attempt.
+
+    Returns:
+        bool: Whether the image was removed.
+    """
+    if existed or not url_exists(zarr_url):
+        return False
+    if url_exists(join_url_paths(zarr_url, COMPLETION_LOG_NAME)):
+        return False
+    if is_remote_url(zarr_url):
+        fs, path = fsspec.core.url_to_fs(zarr_url)
+        fs.rm(path, recursive=True)
+    else:
+        shutil.rmtree(local_url_to_path(zarr_url))
+    logger.info(f"Removed {zarr_url}, written by the failed attempt.")
+    return True
+
+
+def run_parallelization_list(
+    parallelization_list: list[dict],
+    *,
+    workers: int | None = None,
+    memory_limit: int | None = None,
+    memory_factor: float = 1.0,
+    retries: int = 1,
+    progress: bool = True,
+) -> LocalRunSummary:
+    """Run the compute tasks of a parallelization list on a process pool.
+
+    The items are started in the order of the list; when the next item does not
+    fit in the memory limit, the following ones that fit start first.
+
+    Args:
+        parallelization_list (list[dict]): The output of the init task.
+        workers (int | None): Number of worker processes, defaults to the
+            number of allocated CPUs. The CPUs are shared evenly between them.
+        memory_limit (int | None): Memory in bytes shared by the running images,
+            or None for no limit.
+        memory_factor (float): Estimated peak memory of an image, as a multiple
+            of its estimated bytes read.
+        retries (int): Number of times a failed image is retried.
+        progress (bool): Show a progress bar.
+
+    Returns:
+        LocalRunSummary: The summary of the conversion.
+    """
+    cpus = allocated_cpus()
+    workers = workers or cpus
+    summary = LocalRunSummary(num_images=len(parallelization_list))
+    # Loading the tiled images is only worth it to respect the memory limit
+    costs = [
+        _estimate_item_cost(item, resolve=memory_limit is not None)
+        for item in parallelization_list
+    ]
+    pending = list(range(len(parallelization_list)))
+    attempts = [0] * len(parallelization_list)
+    existed = [False] * len(parallelization_list)
+    # Images running when a worker died, each run alone to find the culprit
+    suspect = [False] * len(parallelization_list)
+    running: dict[Future, int] = {}
+
+    def admit(index: int) -> bool:
+        if memory_limit is None or not running:
+            return True
+        used = sum(costs[i] for i in running.values()) * memory_factor
+        return used + costs[index] * memory_factor <= memory_limit
+
+    def on_failure(index: int, error: BaseException, bar: tqdm) -> None:
+        zarr_url = parallelization_list[index]["zarr_url"]
+        if attempts[index] <= retries:
+            logger.warning(f"Retrying {zarr_url} after error: {error}")
+            # The image created by the failed attempt would make the retry fail
+            clean_failed_attempt(zarr_url, existed=existed[index])
+            summary.retried += 1
+            pending.insert(0, index)
+        else:
+            logger.error(f"Conversion of {zarr_url} failed: {error}")
+            summary.failed[zarr_url] = f"{type(error).__name__}: {error}"
+            bar.update()
+
+    def collect(future: Future, bar: tqdm) -> BrokenProcessPool | None:
+        """Record the outcome of a completed future, or return the pool error."""
+        index = running.pop(future)
+        try:
+            summary.image_list_updates.append(future.result())
+        except BrokenProcessPool as e:
+            return e
+        except Exception as e:
+            suspect[index] = False
+            on_failure(index, e, bar)
+        else:
+            summary.converted.append(parallelization_list[index]["zarr_url"])
+            summary.estimated_bytes += costs[index]
+            bar.update()
+        return None
+
+    def on_broken_pool(broken: dict[int, BrokenProcessPool], bar: tqdm) -> None:
+        """Charge the image that killed its worker, re-queue the others."""
+        if len(broken) == 1:
+            ((index, error),) = broken.items()
+            suspect[index] = True
+            on_failure(index, error, bar)
+            return
+        # The pool does not tell which worker died, so the images are run again
+        # one at a time without being charged an attempt
+        for index in sorted(broken, reverse=True):
+            attempts[index] -= 1
+            suspect[index] = True
+            clean_failed_attempt(
+                parallelization_list[index]["zarr_url"], existed=existed[index]
+            )
+            pending.insert(0, index)
+
+    def new_pool() -> ProcessPoolExecutor:
+        # Each worker sizes the thread pools of its image from its share of
+        # the CPUs, instead of all the CPUs of the machine
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=share_cpus,
+            initargs=(max(1, cpus // workers),),
+        )
+
+    pool = new_pool()
+    start = time.perf_counter()
+    with tqdm(
+        total=len(parallelization_list), unit="image", disable=not progress
+    ) as bar:
+        try:
+            while pending or running:
+                for index in list(pending):
+                    if len(running) >= workers or any(
+                        suspect[i] for i in running.values()
+                    ):
+                        break
+                    if suspect[index] and running:
+                        continue
+                    if admit(index):
+                        pending.remove(index)
+                        if attempts[index] == 0:
+                            existed[index] = url_exists(
+                                parallelization_list[index]["zarr_url"]
+                            )
+                        attempts[index] += 1
+                        future = pool.submit(_run_item, parallelization_list[index])
+                        running[future] = index
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                # Every completed future is collected, even once the pool broke,
+                # so that the images converted in the meantime are kept
+                broken = {}
+                for future in done:
+                    index = running[future]
+                    error = collect(future, bar)
+                    if error is not None:
+                        broken[index] = error
+                if broken:
+                    # A worker died (e.g. killed when out of memory), so the
+                    # images that did not complete need a new pool
+                    pool.shutdown(cancel_futures=True)
+                    for future in list(running):
+                        index = running[future]
+                        error = collect(future, bar)
+                        if error is not None:
+                            broken[index] = error
+                    on_broken_pool(broken, bar)
+                    pool = new_pool()
+                bar.set_postfix(failed=len(summary.failed))
+        finally:
+            pool.shutdown(cancel_futures=True)
+    summary.compute_time_s = time.perf_counter() - start
+    return summary
+
+
+def run_conversion(
+    converter: str,
+    *,
+    zarr_dir: str,
+    acquisitions: list[dict[str, Any]],
+    converter_options: ConverterOptions | None = None,
+    overwrite: OverwriteMode = OverwriteMode.NO_OVERWRITE,
+    performance_options: PerformanceOptions | None = None,
+    workers: int | None = None,
+    memory_limit: int | None = None,
+    memory_factor: float = 1.0,
+    retries: int = 1,
+    progress: bool = True,
+    live_acquisition: LiveAcquisition | None = None,
+    poll_interval: float = 60.0,
+    consolidate_metadata: bool = False,
+) -> LocalRunSummary:
+    """Run the init task of a converter, all its compute tasks, then finalize.
+
+    Args:
+        converter (str): The converter, one of `cq3k`, `operetta` or `scanr`.
+        zarr_dir (str): Directory to store the Zarr files.
+        acquisitions (list[dict[str, Any]]): The acquisitions to convert, as
+            passed to the init task.
+        converter_options (ConverterOptions | None): Advanced converter options.
+        overwrite (OverwriteMode): Overwrite mode for existing data.
+        performance_options (PerformanceOptions | None): Performance options.
+        workers (int | None): Number of worker processes, defaults to the
+            number of allocated CPUs. The CPUs are shared evenly between them.
+        memory_limit (int | None): Memory in bytes shared by the running images,
+            or None for no limit.
+        memory_factor (float): Estimated peak memory of an image, as a multiple
+            of its estimated bytes read.
+        retries (int): Number of times a failed image is retried.
+        progress (bool): Show a progress bar.
+        live_acquisition (LiveAcquisition | None): If set, the acquisitions may
+            still be running, and the wells are converted as they complete until
+            the acquisitions are finished (CQ3K and Operetta only).
+        poll_interval (float): Seconds between two runs of the init task of a
+            live acquisition.
+        consolidate_metadata (bool): Consolidate the metadata of the plates
+            once they are finalized.
+
+    Returns:
+        LocalRunSummary: The summary of the conversion.
+    """
+    init_kwargs: dict[str, Any] = {
+        "zarr_dir": zarr_dir,
+        "acquisitions": acquisitions,
+        "converter_options": converter_options or ConverterOptions(),
+        "overwrite": overwrite,
+        "performance_options": performance_options or PerformanceOptions(),
+    }
+    if live_acquisition is not None:
+        if converter not in LIVE_ACQUISITION_MODELS:
+            raise ValueError(f"Live acquisitions are not supported for {converter}.")
+        init_kwargs["live_acquisition"] = live_acquisition
+
+    summary = LocalRunSummary()
+    while True:
+        start = time.perf_counter()
+        init_output = INIT_TASKS[converter](**init_kwargs)
+        init_time = time.perf_counter() - start
+        run_summary = run_parallelization_list(
+            init_output["parallelization_list"],
+            workers=workers,
+            memory_limit=memory_limit,
+            memory_factor=memory_factor,
+            retries=retries,
+            progress=progress,
+        )
+        run_summary.init_time_s = init_time
+        summary.extend(run_summary)
+        if live_acquisition is None or live_acquisitions_done(
+            [
+                LIVE_ACQUISITION_MODELS[converter].model_validate(acquisition)
+                for acquisition in acquisitions
+            ],
+            zarr_dir,
+        ):
+            break
+        time.sleep(poll_interval)
+
+    if summary.converted:
+        start = time.perf_counter()
+        finalize_plate_metadata_task(
+            zarr_urls=summary.converted,
+            zarr_dir=zarr_dir,
+            consolidate=consolidate_metadata,
+        )
+        summary.finalize_time_s = time.perf_counter() - start
+    return summary
+
+
+def _load_json_argument(value: str | None) -> dict[str, Any]:
+    """Parse a JSON string, or the content of a JSON file."""
+    if value is None:
+        return {}
+    path = Path(value)
+    return json.loads(path.read_text() if path.is_file() else value)
+
+
+def main() -> None:
+    """Command line interface of the local runner."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("converter", choices=list(INIT_TASKS))
+    parser.add_argument("paths", nargs="+", help="Paths of the acquisitions.")
+    parser.add_argument("--zarr-dir", required=True)
+    parser.add_argument(
+        "--acquisition-options",
+        help="JSON (string or file) of the acquisition fields other than the "
+        "path, e.g. the ScanR layout, applied to all the acquisitions.",
+    )
+    parser.add_argument("--converter-options", help="JSON string or file.")
+    parser.add_argument("--performance-options", help="JSON string or file.")
+    parser.add_argument(
+        "--overwrite",
+        choices=[mode.value for mode in OverwriteMode],
+        default=OverwriteMode.NO_OVERWRITE.value,
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--memory-limit-gb",
+        type=float,
+        default=None,
+        help="Memory shared by the running images (default: 80%% of the "
+        "available memory).",
+    )
+    parser.add_argument(
+        "--memory-factor",
+        type=float,
+        default=1.0,
+        help="Estimated peak memory of an image, as a multiple of its size.",
+    )
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument(
+        "--live",
+        action="store_true",
+        help="Convert the wells of running acquisitions as they complete.",
+    )
+    parser.add_argument(
+        "--timepoints",
+        type=int,
+        default=None,
+        help="Expected timepoints of a live acquisition (required to convert the "
+        "Operetta wells before the acquisition is finished).",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=60.0,
+        help="Seconds between two polls of a live acquisition.",
+    )
+    parser.add_argument(
+        "--consolidate-metadata",
+        action="store_true",
+        help="Consolidate the metadata of the plates, so that viewers open them "
+        "with a single read.",
+    )
+    parser.add_argument("--no-progress", action="store_true")
+    parser.add_argument(
+        "--output", type=Path, help="Optional JSON file for the summary."
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    acquisition_options = _load_json_argument(args.acquisition_options)
+    if args.memory_limit_gb is not None:
+        memory_limit = int(args.memory_limit_gb * 1024**3)
+    else:
+        available = available_memory()
+        memory_limit = int(available * 0.8) if available is not None else None
+
+    summary = run_conversion(
+        args.converter,
+        zarr_dir=args.zarr_dir,
+        acquisitions=[{"path": path, **acquisition_options} for path in args.paths],
+        converter_options=ConverterOptions.model_validate(
+            _load_json_argument(args.converter_options)
+        ),
+        overwrite=OverwriteMode(args.overwrite),
+        performance_options=PerformanceOptions.model_validate(
+            _load_json_argument(args.performance_options)
+        ),
+        workers=args.workers,
+        memory_limit=memory_limit,
+        memory_factor=args.memory_factor,
+        retries=args.retries,
+        progress=not args.no_progress,
+        live_acquisition=(
+            LiveAcquisition(timepoints=args.timepoints) if args.live else None
+        ),
+        poll_interval=args.poll_interval,
+        consolidate_metadata=args.consolidate_metadata,
+    )
+    print(summary.report())
+    if args.output is not None:
+        args.output.write_text(summary.model_dump_json(indent=2))
+    if summary.failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
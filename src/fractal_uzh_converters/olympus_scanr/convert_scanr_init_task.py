@@ -5,11 +5,14 @@ import logging
 from ome_zarr_converters_tools import (
     ConverterOptions,
     OverwriteMode,
-    setup_images_for_conversion,
 )
 from pydantic import validate_call
 
-from fractal_uzh_converters.common import parse_acquisitions
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    parse_acquisitions,
+    setup_plate_conversion,
+)
 from fractal_uzh_converters.olympus_scanr.utils import (
     ScanRAcquisitionModel,
     parse_scanr_metadata,
@@ -18,6 +21,7 @@ from fractal_uzh_converters.olympus_scanr.utils import (
 logger = logging.getLogger("convert_scanr_task")
 
 default_converter_options = ConverterOptions()
+default_performance_options = PerformanceOptions()
 
 
 @validate_call
@@ -29,6 +33,7 @@ def convert_scanr_init_task(
     acquisitions: list[ScanRAcquisitionModel],
     converter_options: ConverterOptions = default_converter_options,
     overwrite: OverwriteMode = OverwriteMode.NO_OVERWRITE,
+    performance_options: PerformanceOptions = default_performance_options,
 ):
     """Initialize the task to convert a ScanR dataset to OME-Zarr.
 
@@ -42,6 +47,8 @@ def convert_scanr_init_task(
             - "Overwrite": Remove and replace existing data.
             - "Extend": Extend existing data without removing it.
             Default is "No Overwrite".
+        performance_options (PerformanceOptions): Advanced options to tune the
+            performance of the conversion.
     """
     tiled_images = parse_acquisitions(
         parse_function=parse_scanr_metadata,
@@ -49,13 +56,12 @@ def convert_scanr_init_task(
         converter_options=converter_options,
     )
 
-    parallelization_list = setup_images_for_conversion(
+    parallelization_list = setup_plate_conversion(
         tiled_images=tiled_images,
         zarr_dir=zarr_dir,
         converter_options=converter_options,
-        collection_type="ImageInPlate",
         overwrite_mode=overwrite,
-        ngff_version=converter_options.omezarr_options.ngff_version,
+        performance_options=performance_options,
     )
     logger.info(
         f"Prepared parallelization list with {len(parallelization_list)} items."
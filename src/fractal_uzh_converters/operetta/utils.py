@@ -129,21 +129,22 @@ class OperettaImageMeta(BaseModel):
 ######################################################################
 
 
+def _parse_text(text: str) -> dict[str, Any]:
+    return xmltodict.parse(
+        text,
+        process_namespaces=True,
+        namespaces={"http://www.perkinelmer.com/PEHH/HarmonyV5": None},  # type: ignore
+        attr_prefix="",
+        cdata_key="Value",
+    )
+
+
 def _parse(path: str) -> dict[str, Any]:
     with open(path, encoding="utf-8") as f:
-        return xmltodict.parse(
-            f.read(),
-            process_namespaces=True,
-            namespaces={"http://www.perkinelmer.com/PEHH/HarmonyV5": None},  # type: ignore
-            attr_prefix="",
-            cdata_key="Value",
-        )
+        return _parse_text(f.read())
 
 
-def _load_models(path: str) -> list[OperettaImageMeta]:
-    """Load Operetta image metadata from XML file."""
-    metadata_path = join_url_paths(path, "Images", "Index.idx.xml")
-    xml_dict = _parse(metadata_path)
+def _images_meta(xml_dict: dict[str, Any]) -> list[OperettaImageMeta]:
     images_data = xml_dict["EvaluationInputData"]["Images"]["Image"]
     if isinstance(images_data, dict):
         images_data = [images_data]
@@ -153,6 +154,12 @@ def _load_models(path: str) -> list[OperettaImageMeta]:
     return images_meta
 
 
+def _load_models(path: str) -> list[OperettaImageMeta]:
+    """Load Operetta image metadata from XML file."""
+    metadata_path = join_url_paths(path, "Images", "Index.idx.xml")
+    return _images_meta(_parse(metadata_path))
+
+
 ######################################################################
 #
 # Helper functions for building tiles (following ScanR pattern)
@@ -309,14 +316,16 @@ def _build_tiles(
 ######################################################################
 
 
-def parse_operetta_metadata(
+def build_operetta_tiled_images(
+    images_meta: list[OperettaImageMeta],
     *,
     acquisition_model: OperettaAcquisitionModel,
     converter_options: ConverterOptions,
 ) -> list[TiledImage]:
-    """Parse Operetta metadata and return a list of TiledImages.
+    """Build the TiledImages of Operetta image records.
 
     Args:
+        images_meta: Image records of the acquisition.
         acquisition_model: Acquisition input model containing path and options.
         converter_options: Converter options for tile processing.
 
@@ -324,15 +333,12 @@ def parse_operetta_metadata(
         List of TiledImage objects ready for conversion.
     """
     acquisition_dir = acquisition_model.path
-    data = _load_models(acquisition_dir)
     condition_table = acquisition_model.get_condition_table()
 
-    if len(data) == 0:
-        raise ValueError(f"No measurement records found in {acquisition_dir}")
     # Group images by z_type, well (row, column), and field of view
     plates_groups: dict[tuple[str, int, int], list[OperettaImageMeta]] = {}
 
-    for image in data:
+    for image in images_meta:
         row = image.row
         column = image.column
         fov_idx = image.field_id
@@ -375,3 +381,81 @@ def parse_operetta_metadata(
     )
 
     return tiled_images
+
+
+def parse_operetta_metadata(
+    *,
+    acquisition_model: OperettaAcquisitionModel,
+    converter_options: ConverterOptions,
+) -> list[TiledImage]:
+    """Parse Operetta metadata and return a list of TiledImages.
+
+    Args:
+        acquisition_model: Acquisition input model containing path and options.
+        converter_options: Converter options for tile processing.
+
+    Returns:
+        List of TiledImage objects ready for conversion.
+    """
+    acquisition_dir = acquisition_model.path
+    data = _load_models(acquisition_dir)
+
+    if len(data) == 0:
+        raise ValueError(f"No measurement records found in {acquisition_dir}")
+
+    return build_operetta_tiled_images(
+        data,
+        acquisition_model=acquisition_model,
+        converter_options=converter_options,
+    )
+
+
+######################################################################
+#
+# Live acquisition parsing
+#
+######################################################################
+
+
+class OperettaLiveParser:
+    """Parse the image records appended to the `Index.idx.xml` of an Operetta."""
+
+    record_tag = "Image"
+    # The wells list references the images before the image records
+    container_tag = "Images"
+
+    def metadata_path(self, acquisition_model: OperettaAcquisitionModel) -> str:
+        """Path of the index file."""
+        return join_url_paths(acquisition_model.path, "Images", "Index.idx.xml")
+
+    def parse_records(self, document: str) -> list[OperettaImageMeta]:
+        """Parse the image records of a document."""
+        return _images_meta(_parse_text(document))
+
+    def image_key(self, record: OperettaImageMeta) -> str:
+        """Key of the image (well) of a record."""
+        return record.well_id
+
+    def timepoint(self, record: OperettaImageMeta) -> int:
+        """Timepoint of a record."""
+        return record.timepoint_id
+
+    def expected_timepoints(
+        self, acquisition_model: OperettaAcquisitionModel
+    ) -> int | None:
+        """Not known before the end of the acquisition."""
+        return None
+
+    def build_tiled_images(
+        self,
+        records: list[OperettaImageMeta],
+        *,
+        acquisition_model: OperettaAcquisitionModel,
+        converter_options: ConverterOptions,
+    ) -> list[TiledImage]:
+        """Build the TiledImages of complete records."""
+        return build_operetta_tiled_images(
+            records,
+            acquisition_model=acquisition_model,
+            converter_options=converter_options,
+        )
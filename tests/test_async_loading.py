@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from ome_zarr_converters_tools import DefaultImageLoader
+from pydantic import ValidationError
+
+from fractal_uzh_converters.common import (
+    AsyncLoading,
+    PerformanceOptions,
+    PipelinedWriting,
+)
+from fractal_uzh_converters.common.async_loading import tile_url
+from fractal_uzh_converters.dev.slow_filesystem import register_slow_async_filesystem
+
+from .utils import convert_synthetic_plate
+
+SYNTHETIC_KWARGS = {"fov_grid": (3, 2), "num_z": 2, "num_c": 2}
+
+
+@pytest.fixture
+def expected(tmp_path: Path) -> np.ndarray:
+    (container,) = convert_synthetic_plate(
+        tmp_path / "reference", PerformanceOptions(), **SYNTHETIC_KWARGS
+    )
+    return container.get_image().get_array()
+
+
+def test_async_loading_local_files(tmp_path: Path, expected: np.ndarray):
+    (result,) = convert_synthetic_plate(
+        tmp_path / "async",
+        PerformanceOptions(async_loading=AsyncLoading(max_in_flight=4)),
+        **SYNTHETIC_KWARGS,
+    )
+    np.testing.assert_array_equal(result.get_image().get_array(), expected)
+
+
+def test_async_loading_concurrent_reads(tmp_path: Path, expected: np.ndarray):
+    fs_class = register_slow_async_filesystem(latency=0.01)
+    (result,) = convert_synthetic_plate(
+        tmp_path / "async",
+        PerformanceOptions(
+            async_loading=AsyncLoading(max_in_flight=8, buffered_fovs=2)
+        ),
+        url_prefix="slowfile://",
+        **SYNTHETIC_KWARGS,
+    )
+    np.testing.assert_array_equal(result.get_image().get_array(), expected)
+    # 6 FOVs with 4 files each, 2 FOVs read at once
+    assert fs_class.num_reads == 24
+    assert 1 < fs_class.max_in_flight <= 8
+
+
+def test_async_loading_excludes_pipelined_writing():
+    with pytest.raises(ValidationError, match="cannot be combined"):
+        PerformanceOptions(
+            async_loading=AsyncLoading(), pipelined_writing=PipelinedWriting()
+        )
+
+
+class _CustomLoader(DefaultImageLoader):
+    pass
+
+
+def test_tile_url():
+    loader = DefaultImageLoader(file_path="tiles/A01.tif")
+    assert tile_url(loader, resource=None) == "tiles/A01.tif"
+    assert (
+        tile_url(loader, resource="s3://bucket/run") == "s3://bucket/run/tiles/A01.tif"
+    )
+    with pytest.raises(ValueError, match="only supports TIFF files"):
+        tile_url(DefaultImageLoader(file_path="tiles/A01.png"), resource=None)
+    # Subclasses may read the file differently, they are refused too
+    with pytest.raises(ValueError, match="default image loader, got _CustomLoader"):
+        tile_url(_CustomLoader(file_path="tiles/A01.tif"), resource=None)
+
+
+@pytest.mark.parametrize("max_in_flight", [1, 3])
+def test_async_loading_in_flight_bound(
+    tmp_path: Path, expected: np.ndarray, max_in_flight: int
+):
+    fs_class = register_slow_async_filesystem(latency=0.01)
+    (result,) = convert_synthetic_plate(
+        tmp_path / "async",
+        PerformanceOptions(
+            async_loading=AsyncLoading(max_in_flight=max_in_flight, buffered_fovs=3)
+        ),
+        url_prefix="slowfile://",
+        **SYNTHETIC_KWARGS,
+    )
+    np.testing.assert_array_equal(result.get_image().get_array(), expected)
+    assert fs_class.num_reads == 24
+    # 12 files are wanted at once, the reads in flight fill up to the bound
+    assert fs_class.max_in_flight == max_in_flight
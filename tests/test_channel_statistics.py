@@ -0,0 +1,85 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from ngio import open_ome_zarr_plate
+
+from fractal_uzh_converters.common import (
+    ChannelStatisticsOptions,
+    PerformanceOptions,
+    PipelinedWriting,
+    aggregate_channel_statistics_task,
+)
+from fractal_uzh_converters.common.channel_statistics import (
+    CHANNEL_STATISTICS_TABLE,
+    ChannelStatistics,
+)
+
+from .utils import convert_synthetic_plate
+
+
+@pytest.mark.parametrize("dtype", ["uint8", "uint16", "int16", "float32"])
+def test_channel_statistics_accumulation(dtype: str):
+    rng = np.random.default_rng(0)
+    # Signed data around 0, to check negative values
+    loc = 0 if dtype == "int16" else 100
+    data = rng.normal(loc, 20, size=(2, 3, 64, 64)).astype(dtype)
+    statistics = ChannelStatistics(
+        axes=("c", "z", "y", "x"), num_channels=2, dtype=dtype
+    )
+    # Four FOVs, updated in a different order than they appear in the image
+    for index, (y, x) in enumerate([(32, 32), (0, 0), (0, 32), (32, 0)]):
+        statistics.update(index, data[:, :, y : y + 32, x : x + 32])
+
+    options = ChannelStatisticsOptions(lower_percentile=1, upper_percentile=99)
+    table = statistics.to_dataframe(channel_labels=["a", "b"], options=options)
+    for label, channel in zip(["a", "b"], data, strict=True):
+        row = table.loc[label]
+        assert row["count"] == channel.size
+        assert row["min"] == channel.min()
+        assert row["max"] == channel.max()
+        assert row["mean"] == pytest.approx(channel.mean(dtype=np.float64))
+        assert row["std"] == pytest.approx(channel.std(dtype=np.float64))
+        for column, q in [("window_start", 1), ("window_end", 99), ("median", 50)]:
+            # Exact for integers up to 16 bits, between neighbouring values
+            low = np.percentile(channel, q, method="lower")
+            high = np.percentile(channel, q, method="higher")
+            assert low - 1e-3 <= row[column] <= high + 1e-3
+
+
+def test_channel_statistics_options_validation():
+    with pytest.raises(ValueError):
+        ChannelStatisticsOptions(lower_percentile=50, upper_percentile=10)
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_channel_statistics_conversion(tmp_path: Path, pipelined: bool):
+    performance_options = PerformanceOptions(
+        channel_statistics=ChannelStatisticsOptions(),
+        pipelined_writing=PipelinedWriting() if pipelined else None,
+        cpu_workers=None if pipelined else 1,
+    )
+    containers = convert_synthetic_plate(
+        tmp_path, performance_options, wells=(("A", 1), ("B", 2)), num_c=2
+    )
+    for ome_zarr in containers:
+        data = ome_zarr.get_image().get_array()
+        table = ome_zarr.get_table(CHANNEL_STATISTICS_TABLE).dataframe
+        assert list(table.index) == ome_zarr.channel_labels
+        for channel, (label, row) in zip(data, table.iterrows(), strict=True):
+            assert row["max"] == channel.max()
+            visualisation = next(
+                c.channel_visualisation
+                for c in ome_zarr.meta.channels_meta.channels
+                if c.label == label
+            )
+            assert visualisation.start == row["window_start"]
+            assert visualisation.end == row["window_end"]
+
+    zarr_dir = tmp_path / "zarr"
+    zarr_urls = [str(path) for path in sorted(zarr_dir.glob("*.zarr/*/*/*"))]
+    aggregate_channel_statistics_task(zarr_urls=zarr_urls, zarr_dir=str(zarr_dir))
+    plate = open_ome_zarr_plate(str(zarr_dir / "plate.zarr"))
+    plate_table = plate.get_table(CHANNEL_STATISTICS_TABLE).dataframe
+    assert len(plate_table) == 2 * 2
+    assert set(plate_table["row"]) == {"A", "B"}
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    AutoChunking,
+    PerformanceOptions,
+    ReadPattern,
+    compute_auto_chunking,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+# A single 64x64 uint16 plane is 8 KiB
+PLANE_MB = 64 * 64 * 2 / 1024**2
+
+
+@pytest.mark.parametrize(
+    "target_planes, expected_scaling",
+    [
+        (1 / 16, "0.25"),
+        (1 / 4, "0.5"),
+        (1, "1"),
+        (4, "2"),
+        # The image is only 2x2 FOVs, larger chunks would not add anything
+        (16, "2"),
+    ],
+)
+def test_per_plane_chunking(
+    tmp_path: Path, target_planes: float, expected_scaling: str
+):
+    (tiled_image,) = build_synthetic_tiled_images(tmp_path, num_z=4, num_c=2)
+    options = AutoChunking(target_chunk_size_mb=PLANE_MB * target_planes)
+    chunking = compute_auto_chunking(tiled_image, options)
+    assert chunking.xy_scaling == expected_scaling
+    assert (chunking.z_chunk, chunking.c_chunk, chunking.t_chunk) == (1, 1, 1)
+
+
+def test_volumetric_chunking(tmp_path: Path):
+    (tiled_image,) = build_synthetic_tiled_images(tmp_path, num_z=8, num_t=2)
+    # Whole Z stack of a single FOV
+    options = AutoChunking(
+        read_pattern=ReadPattern.VOLUMETRIC, target_chunk_size_mb=PLANE_MB * 8
+    )
+    chunking = compute_auto_chunking(tiled_image, options)
+    assert chunking.xy_scaling == "1"
+    assert (chunking.z_chunk, chunking.c_chunk, chunking.t_chunk) == (8, 1, 1)
+
+    # The Z chunk is reduced when the stack does not fit the target
+    options = AutoChunking(
+        read_pattern=ReadPattern.VOLUMETRIC, target_chunk_size_mb=PLANE_MB / 4
+    )
+    chunking = compute_auto_chunking(tiled_image, options)
+    assert chunking.xy_scaling == "0.25"
+    assert chunking.z_chunk == 4
+
+
+def test_setup_plate_conversion_auto_chunking(tmp_path: Path):
+    tiled_images = build_synthetic_tiled_images(
+        tmp_path, wells=(("A", 1), ("B", 2)), num_z=4
+    )
+    performance_options = PerformanceOptions(
+        auto_chunking=AutoChunking(target_chunk_size_mb=PLANE_MB / 4)
+    )
+    parallelization_list = setup_plate_conversion(
+        tiled_images=tiled_images,
+        zarr_dir=str(tmp_path / "zarr"),
+        converter_options=ConverterOptions(),
+        overwrite_mode=OverwriteMode.NO_OVERWRITE,
+        performance_options=performance_options,
+    )
+    assert len(parallelization_list) == 2
+    for item in parallelization_list:
+        chunks = item["init_args"]["converter_options"]["omezarr_options"]["chunks"]
+        assert chunks["xy_scaling"] == "0.5"
+        assert chunks["z_chunk"] == 1
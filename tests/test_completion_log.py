@@ -0,0 +1,158 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+from ngio import open_ome_zarr_container
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    ResumableWriting,
+    StageTimer,
+    compute_pipeline,
+    image_in_plate_compute_task,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.common.completion_log import (
+    COMPLETION_LOG_NAME,
+    CompletionLog,
+    fovs_to_rewrite,
+)
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+from .utils import convert_synthetic_plate
+
+
+def test_completion_log_drops_torn_records(tmp_path: Path):
+    path = tmp_path / COMPLETION_LOG_NAME
+    log = CompletionLog(path=path, fingerprint="abc", sync=False)
+    assert not log.resumed
+    log.start()
+    log.commit_fov(0)
+    log.commit_fov(2)
+    log.commit_stage("pyramid")
+    # A record torn by a crash, without its end of line
+    with open(path, "ab") as f:
+        f.write(b'1234abcd {"fov":')
+
+    log = CompletionLog(path=path, fingerprint="abc", sync=False)
+    assert log.resumed
+    assert log.fovs == {0, 2}
+    assert log.stages == {"pyramid"}
+    # The torn record is gone, so new records are appended after valid ones
+    log.commit_fov(1)
+    assert CompletionLog(path=path, fingerprint="abc", sync=False).fovs == {0, 1, 2}
+
+    other = CompletionLog(path=path, fingerprint="other", sync=False)
+    assert not other.resumed
+    assert other.fovs == set()
+
+
+def test_fovs_to_rewrite():
+    blocks = [(slice(0, 10), slice(x, x + 10)) for x in range(0, 40, 10)]
+    committed = {1, 2, 3}
+    # Chunks aligned with the FOVs
+    to_write = fovs_to_rewrite(committed=committed, blocks=blocks, chunks=(10, 10))
+    assert to_write == [0]
+    # Chunks spanning two FOVs: 0 shares a chunk with 1
+    to_write = fovs_to_rewrite(committed=committed, blocks=blocks, chunks=(10, 20))
+    assert to_write == [0, 1]
+    # Chunks not aligned with the FOVs: 0 shares a chunk with 1, 1 with 2
+    to_write = fovs_to_rewrite(committed=committed, blocks=blocks, chunks=(10, 15))
+    assert to_write == [0, 1, 2]
+
+
+@pytest.mark.parametrize("xy_scaling", ["1", "2"])
+def test_resume_interrupted_conversion(tmp_path: Path, xy_scaling: str):
+    chunks = {"mode": "Same as FOV", "xy_scaling": xy_scaling}
+    converter_options = ConverterOptions.model_validate(
+        {"omezarr_options": {"chunks": chunks}}
+    )
+    performance_options = PerformanceOptions(resumable=ResumableWriting(sync=False))
+    synthetic_kwargs = {"fov_grid": (2, 2), "num_c": 2}
+    (expected,) = convert_synthetic_plate(
+        tmp_path / "reference",
+        PerformanceOptions(),
+        converter_options,
+        **synthetic_kwargs,
+    )
+
+    tiled_images = build_synthetic_tiled_images(
+        tmp_path, converter_options=converter_options, **synthetic_kwargs
+    )
+    (item,) = setup_plate_conversion(
+        tiled_images=tiled_images,
+        zarr_dir=str(tmp_path / "zarr"),
+        converter_options=converter_options,
+        overwrite_mode=OverwriteMode.NO_OVERWRITE,
+        performance_options=performance_options,
+    )
+    # The job fails on the last FOV
+    missing = tmp_path / "tiffs" / "A01_F3_T0_C1_Z0.tif"
+    shutil.move(missing, tmp_path / "backup.tif")
+    with pytest.raises(FileNotFoundError):
+        image_in_plate_compute_task(**item)
+    log_path = Path(item["zarr_url"]) / COMPLETION_LOG_NAME
+    assert log_path.exists()
+
+    shutil.move(tmp_path / "backup.tif", missing)
+    image_in_plate_compute_task(**item)
+    assert not log_path.exists()
+    result = open_ome_zarr_container(item["zarr_url"])
+    for path in expected.level_paths:
+        np.testing.assert_array_equal(
+            result.get_image(path=path).zarr_array[...],
+            expected.get_image(path=path).zarr_array[...],
+        )
+    assert set(result.list_tables()) == set(expected.list_tables())
+
+
+def test_resume_interrupted_image_creation(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    performance_options = PerformanceOptions(resumable=ResumableWriting(sync=False))
+    (expected,) = convert_synthetic_plate(tmp_path / "reference", PerformanceOptions())
+
+    tiled_images = build_synthetic_tiled_images(tmp_path)
+    (item,) = setup_plate_conversion(
+        tiled_images=tiled_images,
+        zarr_dir=str(tmp_path / "zarr"),
+        converter_options=ConverterOptions(),
+        overwrite_mode=OverwriteMode.NO_OVERWRITE,
+        performance_options=performance_options,
+    )
+
+    def killed(**kwargs):
+        raise RuntimeError("Killed")
+
+    # The job is killed once the image group exists, before the empty image
+    # is complete
+    with monkeypatch.context() as m:
+        m.setattr(compute_pipeline, "create_empty_ome_zarr", killed)
+        with pytest.raises(RuntimeError, match="Killed"):
+            image_in_plate_compute_task(**item)
+    log_path = Path(item["zarr_url"]) / COMPLETION_LOG_NAME
+    assert log_path.exists()
+
+    image_in_plate_compute_task(**item)
+    assert not log_path.exists()
+    result = open_ome_zarr_container(item["zarr_url"])
+    np.testing.assert_array_equal(
+        result.get_image().zarr_array[...], expected.get_image().zarr_array[...]
+    )
+
+    # A complete image is still not overwritten, and no log is left behind
+    (tiled_image,) = build_synthetic_tiled_images(tmp_path / "rerun")
+    with pytest.raises(FileExistsError, match="already contains data"):
+        compute_pipeline.write_image_in_plate(
+            zarr_url=item["zarr_url"],
+            tiled_image=tiled_image,
+            converter_options=ConverterOptions(),
+            overwrite_mode=OverwriteMode.NO_OVERWRITE,
+            performance_options=performance_options,
+            timer=StageTimer(),
+        )
+    assert not log_path.exists()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from ome_zarr_converters_tools import ConverterOptions
+
+from fractal_uzh_converters.common import Compression, PerformanceOptions
+
+from .utils import convert_synthetic_plate
+
+
+@pytest.mark.parametrize("ngff_version", ["0.4", "0.5"])
+@pytest.mark.parametrize(
+    "compression, expected_cname",
+    [
+        (Compression.BLOSC_ZSTD, "zstd"),
+        (Compression.BLOSC_LZ4, "lz4"),
+        (Compression.UNCOMPRESSED, None),
+    ],
+)
+def test_compression(tmp_path, ngff_version, compression, expected_cname):
+    converter_options = ConverterOptions.model_validate(
+        {
+            "omezarr_options": {
+                "ngff_version": ngff_version,
+                "chunks": {"mode": "Same as FOV"},
+            }
+        }
+    )
+    (ome_zarr,) = convert_synthetic_plate(
+        tmp_path,
+        PerformanceOptions(compression=compression),
+        converter_options=converter_options,
+    )
+    (reference,) = convert_synthetic_plate(tmp_path / "reference", PerformanceOptions())
+    for path in ome_zarr.level_paths:
+        array = ome_zarr.get_image(path=path).zarr_array
+        if expected_cname is None:
+            assert array.compressors == ()
+        else:
+            (compressor,) = array.compressors
+            assert expected_cname in repr(compressor)
+        np.testing.assert_array_equal(
+            array[...], reference.get_image(path=path).zarr_array[...]
+        )
@@ -0,0 +1,132 @@
+from pathlib import Path
+
+import pytest
+from ome_zarr_converters_tools import OverwriteMode
+
+from fractal_uzh_converters.common import (
+    FastOverwrite,
+    PerformanceOptions,
+    StageTimer,
+    fast_overwrite,
+)
+from fractal_uzh_converters.common.fast_overwrite import (
+    TRASH_DIR,
+    delete_tree,
+    empty_trash,
+    move_to_trash,
+    start_background_cleanup,
+    trashed_image,
+)
+
+from .utils import convert_synthetic_plate
+
+
+def _write_tree(root: Path, num_dirs: int = 3, files_per_dir: int = 4) -> int:
+    for i in range(num_dirs):
+        directory = root / "c" / str(i) / "0"
+        directory.mkdir(parents=True)
+        for j in range(files_per_dir):
+            (directory / str(j)).write_bytes(b"chunk")
+    (root / "zarr.json").write_text("{}")
+    return num_dirs * files_per_dir + 1
+
+
+def _read_files(root: Path) -> dict[str, bytes]:
+    return {
+        str(path.relative_to(root)): path.read_bytes()
+        for path in root.rglob("*")
+        if path.is_file()
+    }
+
+
+def test_delete_tree(tmp_path: Path):
+    num_files = _write_tree(tmp_path / "image")
+    assert delete_tree(tmp_path / "image", workers=4) == num_files
+    assert not (tmp_path / "image").exists()
+    assert delete_tree(tmp_path / "missing", workers=4) == 0
+
+
+def test_fast_overwrite_plate(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    started = []
+    monkeypatch.setattr(
+        fast_overwrite, "start_background_cleanup", lambda *args: started.append(args)
+    )
+    zarr_dir = tmp_path / "zarr"
+    convert_synthetic_plate(
+        tmp_path / "first", PerformanceOptions(), zarr_dir=str(zarr_dir)
+    )
+    (plate,) = [path for path in zarr_dir.iterdir() if path.suffix == ".zarr"]
+    first_plate = _read_files(plate)
+    (result,) = convert_synthetic_plate(
+        tmp_path / "second",
+        PerformanceOptions(fast_overwrite=FastOverwrite(delete_workers=2)),
+        zarr_dir=str(zarr_dir),
+        overwrite_mode=OverwriteMode.OVERWRITE,
+        num_c=2,
+    )
+    assert len(result.channel_labels) == 2
+    (trashed,) = (zarr_dir / TRASH_DIR).iterdir()
+    assert trashed.name.startswith("plate.zarr-")
+    assert started == [(zarr_dir, 2)]
+    # The trash holds the whole previous plate, unchanged
+    assert _read_files(trashed) == first_plate
+    assert _read_files(plate) != first_plate
+
+    assert empty_trash(zarr_dir, workers=2) > 0
+    assert not (zarr_dir / TRASH_DIR).exists()
+
+
+def test_fast_overwrite_without_background(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    started = []
+    monkeypatch.setattr(
+        fast_overwrite, "start_background_cleanup", lambda *args: started.append(args)
+    )
+    zarr_dir = tmp_path / "zarr"
+    options = PerformanceOptions(fast_overwrite=FastOverwrite(background=False))
+    convert_synthetic_plate(tmp_path / "first", options, zarr_dir=str(zarr_dir))
+    assert not (zarr_dir / TRASH_DIR).exists()
+    convert_synthetic_plate(
+        tmp_path / "second",
+        options,
+        zarr_dir=str(zarr_dir),
+        overwrite_mode=OverwriteMode.OVERWRITE,
+    )
+    assert len(list((zarr_dir / TRASH_DIR).iterdir())) == 1
+    assert started == []
+
+
+def test_background_cleanup(tmp_path: Path):
+    zarr_dir = tmp_path / "zarr"
+    for name in ["plate_a.zarr", "plate_b.zarr"]:
+        _write_tree(zarr_dir / name)
+        move_to_trash(zarr_dir / name, zarr_dir)
+    process = start_background_cleanup(zarr_dir, workers=2)
+    assert process.wait(timeout=60) == 0
+    assert not (zarr_dir / TRASH_DIR).exists()
+    assert not any(zarr_dir.iterdir())
+
+
+def test_trashed_image(tmp_path: Path):
+    image_path = "plate.zarr/A/01/0"
+    image = tmp_path / image_path
+    _write_tree(image)
+    timer = StageTimer()
+    with trashed_image(
+        str(image), image_path=image_path, options=FastOverwrite(), timer=timer
+    ):
+        assert not image.exists()
+        image.mkdir()
+    assert image.exists()
+    assert not any((tmp_path / TRASH_DIR).iterdir())
+    assert {"trash", "trash wait"} <= timer.stages.keys()
+
+    # Nothing to move
+    with trashed_image(
+        str(tmp_path / "plate.zarr/A/02/0"),
+        image_path="plate.zarr/A/02/0",
+        options=FastOverwrite(),
+        timer=timer,
+    ):
+        pass
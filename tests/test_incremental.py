@@ -0,0 +1,87 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+import tifffile
+from ngio import open_ome_zarr_container
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    CompactPayload,
+    FingerprintMode,
+    IncrementalConversion,
+    PerformanceOptions,
+    PyramidMode,
+    PyramidOptions,
+    image_in_plate_compute_task,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.common.incremental import SOURCE_FINGERPRINT_NAME
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+
+@pytest.mark.parametrize(
+    "overwrite_mode", [OverwriteMode.EXTEND, OverwriteMode.OVERWRITE]
+)
+@pytest.mark.parametrize("fingerprint", list(FingerprintMode))
+@pytest.mark.parametrize("compact_payload", [None, CompactPayload()])
+def test_incremental_conversion(
+    tmp_path: Path,
+    overwrite_mode: OverwriteMode,
+    fingerprint: FingerprintMode,
+    compact_payload: CompactPayload | None,
+):
+    tiled_images = build_synthetic_tiled_images(tmp_path, wells=(("A", 1), ("A", 2)))
+    performance_options = PerformanceOptions(
+        incremental=IncrementalConversion(fingerprint=fingerprint),
+        compact_payload=compact_payload,
+    )
+
+    def convert(mode: OverwriteMode) -> list[str]:
+        parallelization_list = setup_plate_conversion(
+            tiled_images=tiled_images,
+            zarr_dir=str(tmp_path / "zarr"),
+            converter_options=ConverterOptions(),
+            overwrite_mode=mode,
+            performance_options=performance_options,
+        )
+        for item in parallelization_list:
+            image_in_plate_compute_task(**item)
+        return sorted(item["zarr_url"] for item in parallelization_list)
+
+    converted = convert(OverwriteMode.NO_OVERWRITE)
+    assert len(converted) == 2
+    for zarr_url in converted:
+        assert (Path(zarr_url) / SOURCE_FINGERPRINT_NAME).exists()
+    # Nothing changed
+    assert convert(overwrite_mode) == []
+
+    # Reacquire a tile of the second well
+    tile = tmp_path / "tiffs" / "A02_F0_T0_C0_Z0.tif"
+    tifffile.imwrite(tile, np.full_like(tifffile.imread(tile), 5000))
+    stat = tile.stat()
+    os.utime(tile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert convert(overwrite_mode) == [converted[1]]
+    image = open_ome_zarr_container(converted[1]).get_image()
+    assert np.count_nonzero(image.get_array() == 5000) == tifffile.imread(tile).size
+    # The first well is kept as it is
+    assert (Path(converted[0]) / SOURCE_FINGERPRINT_NAME).exists()
+    assert convert(overwrite_mode) == []
+
+
+def test_content_options_exclude_execution_settings():
+    def content(**pyramid) -> dict:
+        options = PerformanceOptions(pyramid=PyramidOptions(**pyramid))
+        return options.content_options()
+
+    assert content(workers=1) == content(workers=8)
+    assert content(mode=PyramidMode.DEFERRED) != content()
+    assert content() == {
+        "auto_chunking": None,
+        "compression": PerformanceOptions().compression.value,
+        "pyramid": {"mode": PyramidMode.AFTER_WRITING.value},
+        "channel_statistics": None,
+    }
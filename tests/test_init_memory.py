@@ -0,0 +1,91 @@
+"""Peak memory regression tests of the init tasks on large synthetic plates.
+
+Each init task runs in a fresh subprocess, which reports its peak resident set
+size: unlike tracing the Python allocations, this includes the native ones
+(e.g. the lxml trees of the metadata files). The task runs on two plates of a
+few thousand records, and the slope of the peak between them, in KB per
+record, is compared to a per-vendor budget. The fixed costs (interpreter,
+imports) cancel out in the slope, so only the memory growing with the
+acquisition is measured. The budgets have some headroom over the measured
+values, so only actual regressions make the tests fail. When an intended change
+moves the measured values, update the budgets.
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    VENDORS,
+    SyntheticPlate,
+    write_synthetic_acquisition,
+)
+
+INIT_TASKS = {
+    "cq3k": "fractal_uzh_converters.cq3k.convert_cq3k_init_task",
+    "operetta": "fractal_uzh_converters.operetta.convert_operetta_init_task",
+    "scanr": "fractal_uzh_converters.olympus_scanr.convert_scanr_init_task",
+}
+
+# Peak resident memory budget of the init tasks, in KB per additional record
+MEMORY_BUDGETS_KB_PER_RECORD = {
+    "cq3k": 12.0,
+    "operetta": 16.0,
+    "scanr": 16.0,
+}
+
+# Two plate sizes, far enough apart for the slope to dominate the noise
+NUM_RECORDS = (2_000, 8_000)
+
+# Runs an init task and prints the peak resident set size of the process, in KB
+_PEAK_RSS_SCRIPT = """
+import importlib, json, resource, sys
+
+module_name, kwargs = json.loads(sys.argv[1])
+module = importlib.import_module(module_name)
+getattr(module, module_name.rsplit(".", 1)[1])(**kwargs)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def _init_task_peak_rss_kb(tmp_path: Path, vendor: str, plate: SyntheticPlate) -> int:
+    acquisition = {
+        "path": write_synthetic_acquisition(vendor, tmp_path / "acquisition", plate)
+    }
+    if vendor == "scanr":
+        acquisition["layout"] = plate.scanr_layout
+    kwargs = {"zarr_dir": str(tmp_path / "zarr"), "acquisitions": [acquisition]}
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            _PEAK_RSS_SCRIPT,
+            json.dumps([INIT_TASKS[vendor], kwargs]),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return int(result.stdout.split()[-1])
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="ru_maxrss is in KB on Linux"
+)
+@pytest.mark.parametrize("vendor", VENDORS)
+def test_init_task_peak_memory(tmp_path: Path, vendor: str):
+    small, large = (SyntheticPlate.with_num_records(n) for n in NUM_RECORDS)
+    small_kb = _init_task_peak_rss_kb(tmp_path / "small", vendor, small)
+    large_kb = _init_task_peak_rss_kb(tmp_path / "large", vendor, large)
+
+    kb_per_record = (large_kb - small_kb) / (large.num_records - small.num_records)
+    budget = MEMORY_BUDGETS_KB_PER_RECORD[vendor]
+    assert kb_per_record <= budget, (
+        f"The {vendor} init task peak grew by {kb_per_record:.2f} KB per record "
+        f"({small_kb / 1024:.1f} MB for {small.num_records} records, "
+        f"{large_kb / 1024:.1f} MB for {large.num_records} records), "
+        f"above the budget of {budget:.2f} KB per record"
+    )
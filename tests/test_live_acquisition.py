@@ -0,0 +1,238 @@
+import json
+import re
+from pathlib import Path
+from types import SimpleNamespace
+
+from ome_zarr_converters_tools import ConverterOptions
+
+from fractal_uzh_converters.common import LiveAcquisition, image_in_plate_compute_task
+from fractal_uzh_converters.common.live_acquisition import (
+    LIVE_STATE_DIR,
+    LiveAcquisitionTracker,
+    PendingImage,
+    complete_images,
+    live_acquisitions_done,
+)
+from fractal_uzh_converters.cq3k.convert_cq3k_init_task import convert_cq3k_init_task
+from fractal_uzh_converters.cq3k.utils import CQ3KAcquisitionModel
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    SyntheticPlate,
+    write_synthetic_acquisition,
+    write_synthetic_images,
+)
+from fractal_uzh_converters.operetta.convert_operetta_init_task import (
+    convert_operetta_init_task,
+)
+
+
+def test_complete_images():
+    pending = {
+        "A01": PendingImage(timepoints=[1, 2]),
+        "A02": PendingImage(timepoints=[1, 2]),
+        "A03": PendingImage(timepoints=[1]),
+    }
+    assert complete_images(
+        pending, current="A03", expected_timepoints=2, finished=False
+    ) == {"A01", "A02"}
+    # Still acquiring the second timepoint of the wells
+    single = {key: PendingImage(timepoints=[1]) for key in pending}
+    assert (
+        complete_images(single, current="A03", expected_timepoints=2, finished=False)
+        == set()
+    )
+    # Unknown number of timepoints
+    assert (
+        complete_images(
+            pending, current="A03", expected_timepoints=None, finished=False
+        )
+        == set()
+    )
+    assert complete_images(
+        pending, current="A03", expected_timepoints=None, finished=True
+    ) == {"A01", "A02", "A03"}
+
+
+class _RecordParser:
+    """Minimal live parser of `<R w="well" t="timepoint"/>` records."""
+
+    record_tag = "R"
+    container_tag = "Rs"
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.parsed = 0
+
+    def metadata_path(self, acquisition_model) -> str:
+        return str(self.path)
+
+    def parse_records(self, document: str) -> list[tuple[str, int]]:
+        records = [
+            (well, int(t))
+            for well, t in re.findall(r'<R w="(\w+)" t="(\d+)"/>', document)
+        ]
+        self.parsed += len(records)
+        return records
+
+    def image_key(self, record: tuple[str, int]) -> str:
+        return record[0]
+
+    def timepoint(self, record: tuple[str, int]) -> int:
+        return record[1]
+
+    def expected_timepoints(self, acquisition_model) -> None:
+        return None
+
+    def build_tiled_images(self, records, *, acquisition_model, converter_options):
+        return records
+
+
+def test_tracker_parses_appended_records_once(tmp_path: Path):
+    path = tmp_path / "records.xml"
+    parser = _RecordParser(path)
+    acquisition = SimpleNamespace(normalized_plate_name="plate", acquisition_id=0)
+
+    def poll() -> list:
+        tracker = LiveAcquisitionTracker(
+            parser=parser,
+            acquisition_model=acquisition,
+            options=LiveAcquisition(timepoints=2),
+            zarr_dir=str(tmp_path / "zarr"),
+        )
+        images = tracker.poll(ConverterOptions())
+        tracker.save()
+        return images
+
+    path.write_text('<Rs>\n<R w="A" t="1"/>\n<R w="A" t="2"/>\n')
+    assert poll() == []
+    assert parser.parsed == 2
+    with open(path, "a") as f:
+        f.write('<R w="B" t="1"/>\n')
+    # Only the appended record is parsed, then the records of A are read back
+    assert poll() == [("A", 1), ("A", 2)]
+    assert parser.parsed == 2 + 1 + 2
+    state = json.loads(
+        (tmp_path / "zarr" / LIVE_STATE_DIR / "plate_0.json").read_text()
+    )
+    assert "<R" not in json.dumps(state["pending"])
+    assert state["pending"]["B"]["timepoints"] == [1]
+
+    with open(path, "a") as f:
+        f.write("</Rs>\n")
+    assert poll() == [("B", 1)]
+    assert parser.parsed == 2 + 1 + 2 + 1
+
+
+def test_tracker_emits_images_of_rewritten_file(tmp_path: Path):
+    path = tmp_path / "records.xml"
+    parser = _RecordParser(path)
+    acquisition = SimpleNamespace(normalized_plate_name="plate", acquisition_id=0)
+
+    def poll() -> list:
+        tracker = LiveAcquisitionTracker(
+            parser=parser,
+            acquisition_model=acquisition,
+            options=LiveAcquisition(timepoints=1),
+            zarr_dir=str(tmp_path / "zarr"),
+        )
+        images = tracker.poll(ConverterOptions())
+        tracker.save()
+        return images
+
+    path.write_text('<Rs>\n<R w="A" t="1"/>\n<R w="B" t="1"/>\n')
+    assert poll() == [("A", 1)]
+    # Records of an image already emitted are ignored
+    with open(path, "a") as f:
+        f.write('<R w="A" t="2"/>\n<R w="C" t="1"/>\n')
+    assert poll() == [("B", 1)]
+    # A new acquisition rewrites the file, its images are emitted again
+    path.write_text('<Rs run="2">\n<R w="A" t="1"/>\n<R w="B" t="1"/>\n</Rs>\n')
+    assert poll() == [("A", 1), ("B", 1)]
+
+
+def _split_metadata(
+    path: Path, *, record_start: str, record_end: str, footer_start: str
+) -> tuple[str, list[str], str]:
+    """Split a synthetic metadata file into its header, records and footer."""
+    text = path.read_text()
+    first = text.index(record_start)
+    last = text.index(footer_start)
+    records = [r + record_end for r in text[first:last].split(record_end)[:-1]]
+    return text[:first], records, text[last:]
+
+
+def test_live_cq3k_acquisition(tmp_path: Path):
+    plate = SyntheticPlate(rows=1, columns=3, timepoints=2)
+    acquisition_dir = Path(write_synthetic_acquisition("cq3k", tmp_path / "acq", plate))
+    write_synthetic_images("cq3k", acquisition_dir, plate)
+    mlf_path = acquisition_dir / "MeasurementData.mlf"
+    header, records, footer = _split_metadata(
+        mlf_path,
+        record_start="<bts:MeasurementRecord",
+        record_end="</bts:MeasurementRecord>\n",
+        footer_start="</bts:MeasurementData>",
+    )
+    assert len(records) == 6
+    zarr_dir = str(tmp_path / "zarr")
+    acquisitions = [{"path": str(acquisition_dir)}]
+
+    def poll() -> list[str]:
+        output = convert_cq3k_init_task(
+            zarr_dir=zarr_dir,
+            acquisitions=acquisitions,
+            live_acquisition=LiveAcquisition(),
+        )
+        for item in output["parallelization_list"]:
+            image_in_plate_compute_task(**item)
+        return [item["zarr_url"][-6:] for item in output["parallelization_list"]]
+
+    # The second well has started, the last record is still being written
+    mlf_path.write_text(header + "".join(records[:3]) + records[3][:40])
+    assert poll() == ["A/01/0"]
+    assert poll() == []
+    with open(mlf_path, "a") as f:
+        f.write(records[3][40:] + "".join(records[4:]))
+    assert poll() == ["A/02/0"]
+    assert not live_acquisitions_done(
+        [CQ3KAcquisitionModel.model_validate(a) for a in acquisitions], zarr_dir
+    )
+    with open(mlf_path, "a") as f:
+        f.write(footer)
+    assert poll() == ["A/03/0"]
+    assert live_acquisitions_done(
+        [CQ3KAcquisitionModel.model_validate(a) for a in acquisitions], zarr_dir
+    )
+    wells = {p.name for p in Path(zarr_dir).glob("*.zarr/A/*")}
+    assert wells == {"01", "02", "03"}
+
+
+def test_live_operetta_acquisition(tmp_path: Path):
+    plate = SyntheticPlate(rows=1, columns=2, timepoints=2)
+    acquisition_dir = Path(
+        write_synthetic_acquisition("operetta", tmp_path / "acq", plate)
+    )
+    write_synthetic_images("operetta", acquisition_dir, plate)
+    index_path = acquisition_dir / "Images" / "Index.idx.xml"
+    header, records, footer = _split_metadata(
+        index_path,
+        record_start='    <Image Version="1">',
+        record_end="</Image>\n",
+        footer_start="  </Images>",
+    )
+    assert len(records) == 4
+
+    def poll(live_acquisition: LiveAcquisition) -> int:
+        output = convert_operetta_init_task(
+            zarr_dir=str(tmp_path / "zarr"),
+            acquisitions=[{"path": str(acquisition_dir)}],
+            live_acquisition=live_acquisition,
+        )
+        return len(output["parallelization_list"])
+
+    index_path.write_text(header + "".join(records[:3]))
+    # The number of timepoints is unknown until the acquisition is finished
+    assert poll(LiveAcquisition()) == 0
+    assert poll(LiveAcquisition(timepoints=2)) == 1
+    with open(index_path, "a") as f:
+        f.write(records[3] + footer)
+    assert poll(LiveAcquisition(timepoints=2)) == 1
+    assert poll(LiveAcquisition(timepoints=2)) == 0
@@ -0,0 +1,97 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+import zarr
+
+from fractal_uzh_converters import local_runner
+from fractal_uzh_converters.common import PerformanceOptions
+from fractal_uzh_converters.common.completion_log import COMPLETION_LOG_NAME
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    SyntheticPlate,
+    iter_synthetic_images,
+    write_synthetic_acquisition,
+    write_synthetic_images,
+)
+from fractal_uzh_converters.local_runner import (
+    clean_failed_attempt,
+    run_conversion,
+    run_parallelization_list,
+)
+
+
+def test_local_runner(tmp_path: Path):
+    plate = SyntheticPlate(rows=1, columns=3, fields=2, channels=2)
+    acquisition_dir = write_synthetic_acquisition("cq3k", tmp_path / "acq", plate)
+    write_synthetic_images("cq3k", acquisition_dir, plate)
+    # The images of one well cannot be converted
+    for tiff_path, _ in iter_synthetic_images("cq3k", acquisition_dir, plate):
+        if "W0003" in tiff_path.name:
+            tiff_path.unlink()
+
+    summary = run_conversion(
+        "cq3k",
+        zarr_dir=str(tmp_path / "zarr"),
+        acquisitions=[{"path": acquisition_dir}],
+        # The missing files fail their image, not the whole conversion
+        performance_options=PerformanceOptions(preflight=None),
+        workers=2,
+        memory_limit=1,
+        retries=1,
+        progress=False,
+        consolidate_metadata=True,
+    )
+    assert summary.num_images == 3
+    assert len(summary.converted) == 2
+    assert len(summary.image_list_updates) == 2
+    (failed_url,) = summary.failed
+    assert failed_url.endswith("/A/03/0")
+    assert "FileNotFoundError" in summary.failed[failed_url]
+    assert summary.retried == 1
+    assert summary.estimated_bytes == 2 * 2 * 2 * plate.fov_size**2 * 2
+    assert "Converted 2/3 images" in summary.report()
+    assert summary.finalize_time_s > 0
+    (plate_dir,) = (tmp_path / "zarr").glob("*.zarr")
+    zarr.open_group(str(plate_dir), mode="r", use_consolidated=True)
+
+
+def test_clean_failed_attempt(tmp_path: Path):
+    created = tmp_path / "plate.zarr" / "A" / "01" / "0"
+    created.mkdir(parents=True)
+    assert clean_failed_attempt(str(created), existed=False)
+    assert not created.exists()
+
+    # Data the attempt did not create, or that the retry resumes, is kept
+    created.mkdir()
+    assert not clean_failed_attempt(str(created), existed=True)
+    (created / COMPLETION_LOG_NAME).write_text("")
+    assert not clean_failed_attempt(str(created), existed=False)
+    assert created.exists()
+    assert not clean_failed_attempt(str(tmp_path / "missing"), existed=False)
+
+
+def _exit_or_convert(item: dict) -> dict:
+    """Kill the worker of the crashing image, slowly convert the others."""
+    if item["zarr_url"].endswith("crash"):
+        os._exit(1)
+    time.sleep(1)
+    return {"image_list_updates": [{"zarr_url": item["zarr_url"]}]}
+
+
+def test_worker_death_only_charges_its_image(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(local_runner, "_run_item", _exit_or_convert)
+    parallelization_list = [
+        {"zarr_url": str(tmp_path / name), "init_args": {"estimated_bytes": 1}}
+        for name in ("crash", "image")
+    ]
+    summary = run_parallelization_list(
+        parallelization_list, workers=2, retries=0, progress=False
+    )
+    # The image running next to the crashing one is converted without a retry
+    assert summary.converted == [str(tmp_path / "image")]
+    assert list(summary.failed) == [str(tmp_path / "crash")]
+    assert "BrokenProcessPool" in summary.failed[str(tmp_path / "crash")]
+    assert summary.retried == 0
@@ -0,0 +1,93 @@
+import socket
+from collections.abc import Iterator
+from pathlib import Path
+
+import fsspec.config
+import numpy as np
+import pytest
+
+from fractal_uzh_converters.common import (
+    CompactPayload,
+    ObjectStore,
+    PerformanceOptions,
+    ResumableWriting,
+)
+from fractal_uzh_converters.common.object_store import (
+    configure_object_store,
+    read_bytes,
+    url_exists,
+    write_bytes,
+)
+
+from .utils import convert_synthetic_plate
+
+moto_server = pytest.importorskip("moto.server")
+s3fs = pytest.importorskip("s3fs")
+
+BUCKET = "plates"
+
+
+@pytest.fixture
+def endpoint_url(monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    """A local S3 stand-in server, with an empty bucket."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    # The connection settings are global to the process
+    monkeypatch.setattr(fsspec.config, "conf", {})
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    endpoint_url = f"http://127.0.0.1:{port}"
+    s3fs.S3FileSystem(endpoint_url=endpoint_url, skip_instance_cache=True).mkdir(BUCKET)
+    yield endpoint_url
+    server.stop()
+
+
+@pytest.mark.parametrize("compact_payload", [None, CompactPayload()])
+def test_object_store_conversion(
+    tmp_path: Path, endpoint_url: str, compact_payload: CompactPayload | None
+):
+    synthetic_kwargs = {"wells": (("A", 1), ("B", 2)), "num_z": 2, "num_c": 2}
+    expected = convert_synthetic_plate(
+        tmp_path / "reference", PerformanceOptions(), **synthetic_kwargs
+    )
+    result = convert_synthetic_plate(
+        tmp_path / "s3",
+        PerformanceOptions(
+            object_store=ObjectStore(endpoint_url=endpoint_url, max_connections=8),
+            compact_payload=compact_payload,
+        ),
+        zarr_dir=f"s3://{BUCKET}/run",
+        **synthetic_kwargs,
+    )
+    for result_image, expected_image in zip(result, expected, strict=True):
+        np.testing.assert_array_equal(
+            result_image.get_image().get_array(), expected_image.get_image().get_array()
+        )
+        assert result_image.list_tables() == expected_image.list_tables()
+
+
+def test_object_store_sidecar_files(endpoint_url: str):
+    configure_object_store(ObjectStore(endpoint_url=endpoint_url))
+    url = f"s3://{BUCKET}/run/.state.json"
+    assert not url_exists(url)
+    with pytest.raises(FileNotFoundError):
+        read_bytes(url)
+    write_bytes(url, b"first")
+    write_bytes(url, b"second")
+    assert read_bytes(url) == b"second"
+
+
+def test_object_store_resumable_writing(tmp_path: Path, endpoint_url: str):
+    with pytest.raises(ValueError, match="requires a local Zarr directory"):
+        convert_synthetic_plate(
+            tmp_path,
+            PerformanceOptions(
+                object_store=ObjectStore(endpoint_url=endpoint_url),
+                resumable=ResumableWriting(),
+            ),
+            zarr_dir=f"s3://{BUCKET}/run",
+        )
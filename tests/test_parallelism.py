@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    PipelinedWriting,
+    compute_pipeline,
+    parallelism,
+)
+from fractal_uzh_converters.common.parallelism import allocated_cpus, share_cpus
+
+from .utils import convert_synthetic_plate
+
+
+def test_allocated_cpus(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("SLURM_CPUS_PER_TASK", raising=False)
+    available = allocated_cpus()
+    assert 1 <= available <= (os.cpu_count() or 1)
+    monkeypatch.setenv("SLURM_CPUS_PER_TASK", "1")
+    assert allocated_cpus() == 1
+    monkeypatch.setenv("SLURM_CPUS_PER_TASK", str(available + 10))
+    assert allocated_cpus() == available
+
+
+def test_share_cpus(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("SLURM_CPUS_PER_TASK", raising=False)
+    monkeypatch.setattr(parallelism, "_cpu_share", None)
+    available = allocated_cpus()
+    share_cpus(available + 10)
+    assert allocated_cpus() == available
+    share_cpus(0)
+    assert allocated_cpus() == 1
+
+
+def test_intra_image_parallelism(tmp_path):
+    kwargs = {"fov_grid": (3, 3), "num_c": 2, "num_z": 2}
+    (parallel,) = convert_synthetic_plate(
+        tmp_path / "parallel", PerformanceOptions(cpu_workers=4), **kwargs
+    )
+    (sequential,) = convert_synthetic_plate(
+        tmp_path / "sequential", PerformanceOptions(cpu_workers=1), **kwargs
+    )
+    for path in sequential.level_paths:
+        np.testing.assert_array_equal(
+            parallel.get_image(path=path).zarr_array[...],
+            sequential.get_image(path=path).zarr_array[...],
+        )
+
+
+def test_pipelined_writing_sized_from_cpus(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    used: list[PipelinedWriting] = []
+    pipelined_fov_writing = compute_pipeline.pipelined_fov_writing
+
+    def record(**kwargs):
+        used.append(kwargs["options"])
+        pipelined_fov_writing(**kwargs)
+
+    monkeypatch.setattr(compute_pipeline, "pipelined_fov_writing", record)
+    convert_synthetic_plate(tmp_path / "one", PerformanceOptions(cpu_workers=1))
+    assert used == []
+    convert_synthetic_plate(tmp_path / "four", PerformanceOptions(cpu_workers=4))
+    assert used == [PipelinedWriting.for_cpus(4)]
+    # The worker counts set explicitly are kept
+    convert_synthetic_plate(
+        tmp_path / "set",
+        PerformanceOptions(
+            cpu_workers=4, pipelined_writing=PipelinedWriting(read_workers=1)
+        ),
+    )
+    assert used[-1] == PipelinedWriting(
+        read_workers=1, write_workers=4, buffered_fovs=5
+    )
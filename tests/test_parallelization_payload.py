@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    AutoChunking,
+    CompactPayload,
+    ImageInPlateInitArgs,
+    PerformanceOptions,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+from .utils import convert_synthetic_plate
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_compact_payload_conversion(tmp_path: Path, compress: bool):
+    wells = (("A", 1), ("B", 2))
+    compact = convert_synthetic_plate(
+        tmp_path / "compact",
+        PerformanceOptions(
+            auto_chunking=AutoChunking(target_chunk_size_mb=0.01),
+            compact_payload=CompactPayload(compress=compress),
+        ),
+        wells=wells,
+    )
+    inline = convert_synthetic_plate(
+        tmp_path / "inline",
+        PerformanceOptions(auto_chunking=AutoChunking(target_chunk_size_mb=0.01)),
+        wells=wells,
+    )
+    for compact_image, inline_image in zip(compact, inline, strict=True):
+        compact_array = compact_image.get_image().zarr_array
+        inline_array = inline_image.get_image().zarr_array
+        # The chunking picked per image is carried by the payload
+        assert compact_array.chunks == inline_array.chunks
+        np.testing.assert_array_equal(compact_array[...], inline_array[...])
+
+
+def test_compact_payload_items(tmp_path: Path):
+    converter_options = ConverterOptions()
+    tiled_images = build_synthetic_tiled_images(
+        tmp_path, wells=(("A", 1), ("A", 2), ("B", 1))
+    )
+    lists = {}
+    for name, compact_payload in [("inline", None), ("compact", CompactPayload())]:
+        lists[name] = setup_plate_conversion(
+            tiled_images=tiled_images,
+            zarr_dir=str(tmp_path / name),
+            converter_options=converter_options,
+            overwrite_mode=OverwriteMode.NO_OVERWRITE,
+            performance_options=PerformanceOptions(compact_payload=compact_payload),
+        )
+    for inline_item, compact_item in zip(*lists.values(), strict=True):
+        assert (
+            inline_item["zarr_url"].replace("inline", "compact")
+            == (compact_item["zarr_url"])
+        )
+        assert set(compact_item["init_args"]) == {"payload", "estimated_bytes"}
+        assert len(json.dumps(compact_item)) < len(json.dumps(inline_item)) / 2
+    # A single sidecar file, instead of one JSON file per image
+    assert len(list((tmp_path / "compact" / "_tmp_json").iterdir())) == 1
+    assert len(list((tmp_path / "inline" / "_tmp_json").iterdir())) == 3
+
+
+def test_init_args_validation():
+    with pytest.raises(ValueError):
+        ImageInPlateInitArgs.model_validate({"converter_options": {}})
@@ -0,0 +1,107 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    PipelinedWriting,
+    image_in_plate_compute_task,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.common.pipelined_writing import tile_loaders
+from fractal_uzh_converters.common.tiled_image_writing import to_pixel_coordinates
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+from .utils import convert_synthetic_plate
+
+
+def _convert(
+    tmp_path: Path,
+    performance_options: PerformanceOptions,
+    converter_options: ConverterOptions | None = None,
+) -> np.ndarray:
+    (ome_zarr,) = convert_synthetic_plate(
+        tmp_path,
+        performance_options,
+        converter_options,
+        fov_grid=(3, 2),
+        num_z=3,
+        num_c=2,
+    )
+    return ome_zarr.get_image().get_array()
+
+
+@pytest.mark.parametrize(
+    "pipelined_writing",
+    [
+        PipelinedWriting(),
+        PipelinedWriting(read_workers=1, write_workers=1, buffered_fovs=1),
+        PipelinedWriting(read_workers=3, write_workers=4, buffered_fovs=4),
+    ],
+)
+def test_pipelined_writing_matches_sequential(
+    tmp_path: Path, pipelined_writing: PipelinedWriting
+):
+    expected = _convert(tmp_path / "sequential", PerformanceOptions(cpu_workers=1))
+    result = _convert(
+        tmp_path / "pipelined",
+        PerformanceOptions(pipelined_writing=pipelined_writing),
+    )
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_pipelined_writing_shared_chunks(tmp_path: Path):
+    # Chunks spanning 2x2 FOVs are shared between FOVs
+    converter_options = ConverterOptions.model_validate(
+        {"omezarr_options": {"chunks": {"mode": "Same as FOV", "xy_scaling": "2"}}}
+    )
+    expected = _convert(
+        tmp_path / "sequential", PerformanceOptions(cpu_workers=1), converter_options
+    )
+    result = _convert(
+        tmp_path / "pipelined",
+        PerformanceOptions(pipelined_writing=PipelinedWriting(write_workers=4)),
+        converter_options,
+    )
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_pipelined_writing_read_error(tmp_path: Path):
+    tiled_images = build_synthetic_tiled_images(tmp_path, fov_grid=(2, 2))
+    parallelization_list = setup_plate_conversion(
+        tiled_images=tiled_images,
+        zarr_dir=str(tmp_path / "zarr"),
+        converter_options=ConverterOptions(),
+        overwrite_mode=OverwriteMode.NO_OVERWRITE,
+        performance_options=PerformanceOptions(pipelined_writing=PipelinedWriting()),
+    )
+    next((tmp_path / "tiffs").glob("*.tif")).unlink()
+    with pytest.raises(FileNotFoundError):
+        image_in_plate_compute_task(**parallelization_list[0])
+
+
+def test_tile_loaders_match_fov_loading(tmp_path: Path):
+    (tiled_image,) = build_synthetic_tiled_images(tmp_path, fov_grid=(2, 2), num_z=3)
+    to_pixel_coordinates(tiled_image.regions, tiled_image.pixel_size)
+    for group in tiled_image.group_by_fov():
+        loaders = tile_loaders(group, resource=None)
+        assert len(loaders) == len(group.regions)
+        patch = np.zeros(group.shape(), dtype=tiled_image.data_type)
+        for slicing, loader in loaders:
+            patch[slicing] = loader()
+        np.testing.assert_array_equal(patch, group.load_data())
+
+
+@pytest.mark.parametrize("dtype", ["uint8", "uint32"])
+def test_convert_keeps_data_type(tmp_path: Path, dtype: str):
+    (ome_zarr,) = convert_synthetic_plate(tmp_path, PerformanceOptions(), dtype=dtype)
+    image = ome_zarr.get_image()
+    assert image.dtype == dtype
+    (tiled_image,) = build_synthetic_tiled_images(tmp_path / "expected", dtype=dtype)
+    to_pixel_coordinates(tiled_image.regions, tiled_image.pixel_size)
+    for group in tiled_image.group_by_fov():
+        np.testing.assert_array_equal(image.get_roi(roi=group.roi()), group.load_data())
@@ -0,0 +1,90 @@
+import shutil
+from pathlib import Path
+
+import pytest
+import zarr
+from ngio import open_ome_zarr_plate
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    finalize_plate_metadata_task,
+)
+from fractal_uzh_converters.common.plate_metadata import (
+    images_by_plate,
+    remove_consolidated_metadata,
+)
+
+from .utils import convert_synthetic_plate
+
+WELLS = (("A", 1), ("B", 2))
+
+
+def _convert(tmp_path: Path, **kwargs) -> list[str]:
+    containers = convert_synthetic_plate(
+        tmp_path, PerformanceOptions(), wells=WELLS, **kwargs
+    )
+    assert len(containers) == len(WELLS)
+    plate_dir = tmp_path / "zarr" / "plate.zarr"
+    return [str(plate_dir / "A" / "01" / "0"), str(plate_dir / "B" / "02" / "0")]
+
+
+def test_images_by_plate():
+    assert images_by_plate(
+        ["/zarr/p1.zarr/A/01/0", "/zarr/p1.zarr/A/01/1", "/zarr/p2.zarr/B/02/0/"]
+    ) == {"/zarr/p1.zarr": {"A/01": ["0", "1"]}, "/zarr/p2.zarr": {"B/02": ["0"]}}
+
+
+@pytest.mark.parametrize("ngff_version", ["0.4", "0.5"])
+def test_finalize_plate_metadata(tmp_path: Path, ngff_version: str):
+    converter_options = ConverterOptions.model_validate(
+        {"omezarr_options": {"ngff_version": ngff_version}}
+    )
+    zarr_urls = _convert(tmp_path, converter_options=converter_options)
+    plate_url = str(tmp_path / "zarr" / "plate.zarr")
+    expected = open_ome_zarr_plate(plate_url).images_paths(max_workers="auto")
+
+    finalize_plate_metadata_task(
+        zarr_urls=zarr_urls, zarr_dir=str(tmp_path / "zarr"), consolidate=True
+    )
+    assert open_ome_zarr_plate(plate_url).images_paths(max_workers="auto") == expected
+    # Raises if the plate has no consolidated metadata
+    zarr.open_group(plate_url, mode="r", use_consolidated=True)
+
+    assert remove_consolidated_metadata(plate_url)
+    assert not remove_consolidated_metadata(plate_url)
+
+
+def test_finalize_reconciles_wells(tmp_path: Path):
+    zarr_urls = _convert(tmp_path)
+    plate_url = str(tmp_path / "zarr" / "plate.zarr")
+    plate = open_ome_zarr_plate(plate_url)
+    # The well B/02 is missing from the plate, and the image of A/01 failed
+    plate.meta_handler.update_meta(plate.meta.remove_well(row="B", column=2))
+    shutil.rmtree(zarr_urls[0])
+
+    finalize_plate_metadata_task(
+        zarr_urls=zarr_urls[1:], zarr_dir=str(tmp_path / "zarr"), consolidate=False
+    )
+    plate = open_ome_zarr_plate(plate_url)
+    assert plate.wells_paths() == ["B/02"]
+    assert plate.images_paths(max_workers="auto") == ["B/02/0"]
+    assert plate.get_image_acquisition_id(row="B", column=2, image_path="0") == 0
+
+
+def test_extend_removes_consolidated_metadata(tmp_path: Path):
+    _convert(tmp_path)
+    plate_url = str(tmp_path / "zarr" / "plate.zarr")
+    finalize_plate_metadata_task(
+        zarr_urls=[f"{plate_url}/A/01/0"], zarr_dir=str(tmp_path / "zarr")
+    )
+    zarr.open_group(plate_url, mode="r", use_consolidated=True)
+
+    # Nothing new to convert, but the plate is opened in "Extend" mode
+    convert_synthetic_plate(
+        tmp_path,
+        PerformanceOptions(),
+        wells=WELLS,
+        overwrite_mode=OverwriteMode.EXTEND,
+    )
+    assert not remove_consolidated_metadata(plate_url)
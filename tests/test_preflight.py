@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import pytest
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    PreflightCheck,
+    preflight,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.common.preflight import (
+    SourceFilesError,
+    find_source_file_problems,
+)
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+
+def test_find_source_file_problems(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    tiled_images = build_synthetic_tiled_images(tmp_path, wells=(("A", 1), ("A", 2)))
+    assert find_source_file_problems(tiled_images, PreflightCheck()) == []
+
+    tiff_dir = tmp_path / "tiffs"
+    (tiff_dir / "A01_F0_T0_C0_Z0.tif").unlink()
+    (tiff_dir / "A02_F1_T0_C0_Z0.tif").write_bytes(b"")
+    truncated = tiff_dir / "A02_F2_T0_C0_Z0.tif"
+    truncated.write_bytes(truncated.read_bytes()[:1000])
+    # Only the directory listing is used, without a stat per file
+    with monkeypatch.context() as patched:
+
+        def no_stat(path: str):
+            raise AssertionError(f"{path} was stat'ed")
+
+        patched.setattr(preflight, "_file_size", no_stat)
+        problems = find_source_file_problems(tiled_images, PreflightCheck())
+    assert len(problems) == 1
+    assert "A01_F0_T0_C0_Z0.tif: file not found" in problems[0]
+    problems = find_source_file_problems(
+        tiled_images, PreflightCheck(check_empty_files=True)
+    )
+    assert len(problems) == 2
+    assert "A02_F1_T0_C0_Z0.tif: empty file" in problems[1]
+    problems = find_source_file_problems(
+        tiled_images, PreflightCheck(check_pixel_size=True)
+    )
+    assert len(problems) == 3
+    assert "A02_F2_T0_C0_Z0.tif: truncated file (1000 bytes" in problems[2]
+
+
+def test_preflight_before_setup(tmp_path: Path):
+    tiled_images = build_synthetic_tiled_images(tmp_path)
+    for tiff_path in (tmp_path / "tiffs").glob("*_F3_*.tif"):
+        tiff_path.unlink()
+
+    def setup(performance_options: PerformanceOptions) -> list[dict]:
+        return setup_plate_conversion(
+            tiled_images=tiled_images,
+            zarr_dir=str(tmp_path / "zarr"),
+            converter_options=ConverterOptions(),
+            overwrite_mode=OverwriteMode.NO_OVERWRITE,
+            performance_options=performance_options,
+        )
+
+    with pytest.raises(SourceFilesError, match=r"A01_F3_T0_C0_Z0\.tif: file not found"):
+        setup(PerformanceOptions())
+    # Nothing is written before the check
+    assert not (tmp_path / "zarr").exists()
+    assert len(setup(PerformanceOptions(preflight=None))) == 1
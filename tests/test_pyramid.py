@@ -0,0 +1,114 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from ngio import open_ome_zarr_container
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    PipelinedWriting,
+    PyramidMode,
+    PyramidOptions,
+    build_pyramids_task,
+    image_in_plate_compute_task,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.common.pyramid import PYRAMID_PENDING_TYPE, downsample_block
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+from .utils import convert_synthetic_plate
+
+
+def _levels(tmp_path: Path, performance_options: PerformanceOptions, **kwargs):
+    (ome_zarr,) = convert_synthetic_plate(tmp_path, performance_options, **kwargs)
+    return [ome_zarr.get_image(path=path).get_array() for path in ome_zarr.level_paths]
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+@pytest.mark.parametrize(
+    "fov_yx",
+    [
+        (64, 64),
+        # Not aligned with the coarsest level, falls back to after writing
+        (60, 60),
+    ],
+)
+def test_pyramid_during_writing(
+    tmp_path: Path,
+    pipelined: bool,
+    fov_yx: tuple[int, int],
+    caplog: pytest.LogCaptureFixture,
+):
+    synthetic_kwargs = {"fov_grid": (3, 2), "fov_yx": fov_yx, "num_z": 2}
+    expected = _levels(tmp_path / "after", PerformanceOptions(), **synthetic_kwargs)
+    performance_options = PerformanceOptions(
+        pyramid=PyramidOptions(mode=PyramidMode.DURING_WRITING, workers=3),
+        pipelined_writing=PipelinedWriting() if pipelined else None,
+        cpu_workers=None if pipelined else 1,
+    )
+    with caplog.at_level("INFO"):
+        result = _levels(tmp_path / "during", performance_options, **synthetic_kwargs)
+    fallback = "Building the pyramid after writing instead." in caplog.text
+    assert fallback == (fov_yx != (64, 64))
+    assert len(result) == len(expected) == 5
+    for level_result, level_expected in zip(result, expected, strict=True):
+        np.testing.assert_array_equal(level_result, level_expected)
+
+
+def test_deferred_pyramid(tmp_path: Path):
+    synthetic_kwargs = {"wells": (("A", 1), ("A", 2)), "num_c": 2}
+    expected = convert_synthetic_plate(
+        tmp_path / "after", PerformanceOptions(), **synthetic_kwargs
+    )
+
+    performance_options = PerformanceOptions(
+        pyramid=PyramidOptions(mode=PyramidMode.DEFERRED)
+    )
+    tiled_images = build_synthetic_tiled_images(
+        tmp_path / "deferred", **synthetic_kwargs
+    )
+    parallelization_list = setup_plate_conversion(
+        tiled_images=tiled_images,
+        zarr_dir=str(tmp_path / "deferred" / "zarr"),
+        converter_options=ConverterOptions(),
+        overwrite_mode=OverwriteMode.NO_OVERWRITE,
+        performance_options=performance_options,
+    )
+    zarr_urls = []
+    for item in parallelization_list:
+        update = image_in_plate_compute_task(**item)["image_list_updates"][0]
+        assert update["types"][PYRAMID_PENDING_TYPE]
+        zarr_urls.append(update["zarr_url"])
+        # Only the full resolution level is written
+        ome_zarr = open_ome_zarr_container(update["zarr_url"])
+        lowest = ome_zarr.get_image(path=ome_zarr.level_paths[-1]).get_array()
+        assert not lowest.any()
+
+    updates = build_pyramids_task(
+        zarr_urls=zarr_urls, zarr_dir=str(tmp_path), max_workers=2
+    )["image_list_updates"]
+    assert [update["zarr_url"] for update in updates] == zarr_urls
+    assert all(not update["types"][PYRAMID_PENDING_TYPE] for update in updates)
+
+    for zarr_url, expected_zarr in zip(zarr_urls, expected, strict=True):
+        ome_zarr = open_ome_zarr_container(zarr_url)
+        for path in expected_zarr.level_paths:
+            np.testing.assert_array_equal(
+                ome_zarr.get_image(path=path).get_array(),
+                expected_zarr.get_image(path=path).get_array(),
+            )
+        assert (
+            ome_zarr.meta.channels_meta.model_dump()
+            == expected_zarr.meta.channels_meta.model_dump()
+        )
+
+
+def test_downsample_block_odd_shape():
+    block = np.arange(2 * 5 * 7, dtype="uint16").reshape(2, 5, 7)
+    result = downsample_block(block, (1, 2, 2))
+    assert result.shape == (2, 2, 3)
+    # Trailing pixels are dropped, each output pixel is a 2x2 mean
+    np.testing.assert_allclose(result[0, 0, 0], block[0, :2, :2].mean(), atol=1)
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    PipelinedWriting,
+    ReadAhead,
+    read_ahead,
+)
+from fractal_uzh_converters.common.read_ahead import TileReadAhead
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+from .utils import convert_synthetic_plate
+
+
+def _hinted(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, files_ahead: int, done: int
+) -> list[str]:
+    """Names of the files hinted with `done` FOVs written."""
+    (tiled_image,) = build_synthetic_tiled_images(tmp_path, fov_grid=(2, 2), num_c=2)
+    hinted = []
+    monkeypatch.setattr(read_ahead, "advise_will_need", hinted.append)
+    groups = tiled_image.group_by_fov()
+    order = [3, 2, 1, 0]
+    hints = TileReadAhead(groups, order, ReadAhead(files_ahead=files_ahead))
+    hints.start()
+    for index in order[:done]:
+        hints.fov_done(index)
+    hints.close()
+    return [Path(path).name for path in hinted]
+
+
+def test_read_ahead_window(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    # Two files per FOV, in the order the FOVs are written
+    assert _hinted(monkeypatch, tmp_path, files_ahead=4, done=0) == [
+        "A01_F3_T0_C0_Z0.tif",
+        "A01_F3_T0_C1_Z0.tif",
+        "A01_F2_T0_C0_Z0.tif",
+        "A01_F2_T0_C1_Z0.tif",
+    ]
+    assert len(_hinted(monkeypatch, tmp_path, files_ahead=4, done=1)) == 6
+    assert len(_hinted(monkeypatch, tmp_path, files_ahead=4, done=2)) == 8
+    # A whole FOV is hinted, even if it has more files than the window
+    assert len(_hinted(monkeypatch, tmp_path, files_ahead=1, done=0)) == 2
+
+
+@pytest.mark.parametrize("pipelined_writing", [None, PipelinedWriting()])
+def test_read_ahead_conversion(
+    tmp_path: Path, pipelined_writing: PipelinedWriting | None
+):
+    synthetic_kwargs = {"fov_grid": (3, 2), "num_z": 2, "num_c": 2}
+    (expected,) = convert_synthetic_plate(
+        tmp_path / "reference", PerformanceOptions(), **synthetic_kwargs
+    )
+    (result,) = convert_synthetic_plate(
+        tmp_path / "read_ahead",
+        PerformanceOptions(
+            read_ahead=ReadAhead(files_ahead=4),
+            pipelined_writing=pipelined_writing,
+            cpu_workers=None if pipelined_writing else 1,
+        ),
+        **synthetic_kwargs,
+    )
+    np.testing.assert_array_equal(
+        result.get_image().get_array(), expected.get_image().get_array()
+    )
+
+
+def test_read_ahead_window_advances(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    # Each written FOV frees its files in the window, for the next FOV in order
+    hinted = _hinted(monkeypatch, tmp_path, files_ahead=4, done=1)
+    assert hinted[4:] == ["A01_F1_T0_C0_Z0.tif", "A01_F1_T0_C1_Z0.tif"]
+    hinted = _hinted(monkeypatch, tmp_path, files_ahead=4, done=3)
+    assert hinted[6:] == ["A01_F0_T0_C0_Z0.tif", "A01_F0_T0_C1_Z0.tif"]
+    # Every file is hinted once
+    assert len(set(hinted)) == len(hinted) == 8
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import pytest
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    SchedulingPolicy,
+    estimate_cost,
+    schedule_order,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+
+def test_schedule_order():
+    costs = [1, 5, 3, 5]
+    assert schedule_order(costs, SchedulingPolicy.ACQUISITION_ORDER) == [0, 1, 2, 3]
+    # Stable for equal costs
+    assert schedule_order(costs, SchedulingPolicy.LARGEST_FIRST) == [1, 3, 2, 0]
+    assert schedule_order(costs, lambda costs: [3, 2, 1, 0]) == [3, 2, 1, 0]
+    with pytest.raises(ValueError):
+        schedule_order(costs, lambda costs: [0, 0, 1, 2])
+
+
+@pytest.mark.parametrize("policy", list(SchedulingPolicy))
+def test_largest_first_parallelization_list(tmp_path: Path, policy: SchedulingPolicy):
+    small = build_synthetic_tiled_images(
+        tmp_path / "small", wells=(("A", 1),), fov_grid=(1, 1), num_c=2
+    )
+    large = build_synthetic_tiled_images(
+        tmp_path / "large", wells=(("B", 2),), fov_grid=(2, 3), num_c=2
+    )
+    tiled_images = small + large
+    (small_cost, large_cost) = [estimate_cost(image) for image in tiled_images]
+    assert small_cost == 2 * 64 * 64 * 2
+    assert large_cost == 6 * small_cost
+
+    parallelization_list = setup_plate_conversion(
+        tiled_images=tiled_images,
+        zarr_dir=str(tmp_path / "zarr"),
+        converter_options=ConverterOptions(),
+        overwrite_mode=OverwriteMode.NO_OVERWRITE,
+        performance_options=PerformanceOptions(scheduling=policy),
+    )
+    wells = [item["zarr_url"].split("/")[-3] for item in parallelization_list]
+    if policy == SchedulingPolicy.LARGEST_FIRST:
+        assert wells == ["B", "A"]
+    else:
+        assert wells == ["A", "B"]
+
+
+def test_default_keeps_acquisition_order():
+    assert PerformanceOptions().scheduling == SchedulingPolicy.ACQUISITION_ORDER
@@ -0,0 +1,150 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from ome_zarr_converters_tools import OverwriteMode
+from pydantic import ValidationError
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    ResumableWriting,
+    ScratchStaging,
+    StageTimer,
+    scratch_staging,
+)
+from fractal_uzh_converters.common.scratch_staging import (
+    StagingError,
+    commit_image,
+    exchange_paths,
+    staged_image,
+    verify_copy,
+)
+
+from .utils import convert_synthetic_plate
+
+
+def _write_tree(root: Path, files: dict[str, bytes]) -> None:
+    for name, data in files.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_bytes(data)
+
+
+def _read_tree(root: Path) -> dict[str, bytes]:
+    return {
+        str(path.relative_to(root)): path.read_bytes()
+        for path in sorted(root.rglob("*"))
+        if path.is_file()
+    }
+
+
+@pytest.mark.parametrize("same_filesystem", [True, False])
+def test_staging_conversion(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, same_filesystem: bool
+):
+    monkeypatch.setattr(scratch_staging, "_same_filesystem", lambda *_: same_filesystem)
+    synthetic_kwargs = {"fov_grid": (2, 3), "num_z": 2, "num_c": 2}
+    (expected,) = convert_synthetic_plate(
+        tmp_path / "reference", PerformanceOptions(), **synthetic_kwargs
+    )
+    scratch_dir = tmp_path / "scratch"
+    scratch_dir.mkdir()
+    (result,) = convert_synthetic_plate(
+        tmp_path / "staged",
+        PerformanceOptions(staging=ScratchStaging(scratch_dir=str(scratch_dir))),
+        **synthetic_kwargs,
+    )
+    np.testing.assert_array_equal(
+        result.get_image().get_array(), expected.get_image().get_array()
+    )
+    assert result.list_tables() == expected.list_tables()
+    assert not any(scratch_dir.iterdir())
+    assert not list((tmp_path / "staged" / "zarr").rglob(".staging-*"))
+
+
+def test_commit_replaces_image(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(scratch_staging, "_same_filesystem", lambda *_: False)
+    staged, image_path = tmp_path / "scratch" / "0", tmp_path / "well" / "0"
+    new_files = {"zarr.json": b"{}", "0/c/0/0": b"new", "0/c/0/1": b"new data"}
+    _write_tree(staged, new_files)
+    _write_tree(image_path, {"zarr.json": b"{}", "0/c/1/0": b"old"})
+    commit_image(staged, image_path, ScratchStaging(), StageTimer())
+    assert _read_tree(image_path) == new_files
+    assert [path.name for path in image_path.parent.iterdir()] == ["0"]
+
+
+def test_verify_copy(tmp_path: Path):
+    files = {"zarr.json": b"{}", "0/c/0/0": b"data"}
+    _write_tree(tmp_path / "source", files)
+    _write_tree(tmp_path / "copy", {**files, "0/c/0/0": b"dat"})
+    with pytest.raises(StagingError, match="1 resized"):
+        verify_copy(tmp_path / "source", tmp_path / "copy")
+
+
+def test_failed_image_is_not_committed(tmp_path: Path):
+    image_path = tmp_path / "well" / "0"
+    _write_tree(image_path, {"zarr.json": b"old"})
+    options = ScratchStaging(scratch_dir=str(tmp_path))
+    with pytest.raises(RuntimeError, match="write failed"):
+        with staged_image(
+            str(image_path),
+            overwrite_mode=OverwriteMode.OVERWRITE,
+            options=options,
+            timer=StageTimer(),
+        ) as staged_url:
+            _write_tree(Path(staged_url), {"zarr.json": b"new"})
+            raise RuntimeError("write failed")
+    assert _read_tree(image_path) == {"zarr.json": b"old"}
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["well"]
+
+
+def test_staging_excludes_resumable_writing():
+    with pytest.raises(ValidationError, match="cannot be combined"):
+        PerformanceOptions(staging=ScratchStaging(), resumable=ResumableWriting())
+
+
+def test_failed_commit_keeps_image(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(scratch_staging, "_same_filesystem", lambda *_: False)
+
+    def failed_verify(source: Path, destination: Path) -> None:
+        raise StagingError("copy mismatch")
+
+    monkeypatch.setattr(scratch_staging, "verify_copy", failed_verify)
+    staged, image_path = tmp_path / "scratch" / "0", tmp_path / "well" / "0"
+    _write_tree(staged, {"zarr.json": b"{}", "0/c/0/0": b"new"})
+    _write_tree(image_path, {"zarr.json": b"{}", "0/c/1/0": b"old"})
+    with pytest.raises(StagingError, match="copy mismatch"):
+        commit_image(staged, image_path, ScratchStaging(), StageTimer())
+    # The previous image is untouched, and the partial copy is removed
+    assert _read_tree(image_path) == {"zarr.json": b"{}", "0/c/1/0": b"old"}
+    assert [path.name for path in image_path.parent.iterdir()] == ["0"]
+
+
+def test_commit_swaps_image_atomically(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    if not exchange_paths(tmp_path / "a", tmp_path / "b"):
+        pytest.skip("The filesystem does not support atomic exchanges.")
+
+    def rename(*args: object) -> None:
+        raise AssertionError("The image path must never be left empty.")
+
+    monkeypatch.setattr(scratch_staging.os, "rename", rename)
+    staged, image_path = tmp_path / "scratch" / "0", tmp_path / "well" / "0"
+    _write_tree(staged, {"zarr.json": b"{}", "0/c/0/0": b"new"})
+    _write_tree(image_path, {"zarr.json": b"{}", "0/c/1/0": b"old"})
+    commit_image(staged, image_path, ScratchStaging(), StageTimer())
+    assert _read_tree(image_path) == {"zarr.json": b"{}", "0/c/0/0": b"new"}
+    # The previous image was swapped into the staged path, then deleted
+    assert not staged.exists()
+    assert [path.name for path in image_path.parent.iterdir()] == ["0"]
+
+
+def test_commit_without_staged_image(tmp_path: Path):
+    with pytest.raises(StagingError, match="No image was staged"):
+        commit_image(
+            tmp_path / "scratch" / "0",
+            tmp_path / "well" / "0",
+            ScratchStaging(),
+            StageTimer(),
+        )
+    assert not (tmp_path / "well").exists()
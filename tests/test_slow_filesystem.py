@@ -0,0 +1,68 @@
+import builtins
+import io
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+import tifffile
+from ome_zarr_converters_tools import DefaultImageLoader
+
+from fractal_uzh_converters.dev.slow_filesystem import SlowFilesystem
+
+
+def test_slow_filesystem_latency_and_bandwidth(tmp_path: Path):
+    slow_dir = tmp_path / "slow"
+    slow_dir.mkdir()
+    data = np.arange(256 * 256, dtype="uint16").reshape(256, 256)
+    tifffile.imwrite(slow_dir / "image.tif", data)
+    (tmp_path / "fast.txt").write_text("fast")
+    original_open = builtins.open
+
+    with SlowFilesystem([slow_dir], latency=0.02, bandwidth=10) as fs:
+        image = DefaultImageLoader(file_path=str(slow_dir / "image.tif")).load_data()
+        assert (tmp_path / "fast.txt").read_text() == "fast"
+    np.testing.assert_array_equal(image, data)
+    # Only the file below the root is slowed down
+    assert fs.num_opens == 1
+    assert fs.max_concurrent_opens == 1
+    assert fs.bytes_read >= data.nbytes
+    # The link transfers every byte read at 10 MB/s
+    assert fs.transfer_time == pytest.approx(fs.bytes_read / (10 * 1024**2))
+    assert fs.delay >= 0.02
+    # The original functions are restored
+    assert builtins.open is io.open is original_open
+
+
+def test_slow_filesystem_latency_overlaps_in_threads(tmp_path: Path):
+    paths = [tmp_path / f"{i}.txt" for i in range(8)]
+    for path in paths:
+        path.write_text("data")
+    barrier = threading.Barrier(len(paths))
+
+    def read(path: Path) -> str:
+        barrier.wait()
+        return path.read_text()
+
+    with SlowFilesystem([tmp_path], latency=0.05, jitter=0.01, seed=0) as fs:
+        with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+            contents = list(pool.map(read, paths))
+    assert contents == ["data"] * 8
+    assert fs.num_opens == 8
+    assert fs.bytes_read == 8 * 4
+    assert fs.transfer_time == 0
+    # One jittered latency per open, whatever the order of the threads
+    rng = random.Random(0)
+    expected_delay = sum(0.05 + rng.uniform(-0.01, 0.01) for _ in paths)
+    assert fs.delay == pytest.approx(expected_delay)
+    # The waits release the GIL, so the opens wait at the same time
+    assert fs.max_concurrent_opens > 1
+
+
+def test_slow_filesystem_validation():
+    with pytest.raises(ValueError):
+        SlowFilesystem([], latency=-1)
+    with pytest.raises(ValueError):
+        SlowFilesystem([], bandwidth=0)
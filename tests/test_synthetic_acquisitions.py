@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import pytest
+from ome_zarr_converters_tools import ConverterOptions
+
+from fractal_uzh_converters.cq3k.utils import CQ3KAcquisitionModel, parse_cq3k_metadata
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    VENDORS,
+    SyntheticPlate,
+    iter_synthetic_images,
+    write_synthetic_acquisition,
+    write_synthetic_images,
+)
+from fractal_uzh_converters.olympus_scanr.utils import (
+    ScanRAcquisitionModel,
+    parse_scanr_metadata,
+)
+from fractal_uzh_converters.operetta.utils import (
+    OperettaAcquisitionModel,
+    parse_operetta_metadata,
+)
+
+PARSERS = {
+    "cq3k": (CQ3KAcquisitionModel, parse_cq3k_metadata),
+    "operetta": (OperettaAcquisitionModel, parse_operetta_metadata),
+    "scanr": (ScanRAcquisitionModel, parse_scanr_metadata),
+}
+
+
+@pytest.mark.parametrize("vendor", VENDORS)
+def test_synthetic_acquisition_is_parsed(tmp_path: Path, vendor: str):
+    plate = SyntheticPlate(
+        rows=2,
+        columns=13,
+        fields=3,
+        channels=2,
+        z_planes=3,
+        timepoints=2,
+        error_records=5,
+    )
+    path = write_synthetic_acquisition(vendor, tmp_path / "acq", plate)
+    model_cls, parse_function = PARSERS[vendor]
+    kwargs = {"layout": plate.scanr_layout} if vendor == "scanr" else {}
+    tiled_images = parse_function(
+        acquisition_model=model_cls(path=path, **kwargs),
+        converter_options=ConverterOptions(),
+    )
+    assert len(tiled_images) == plate.num_images
+    wells = {(image.collection.row, image.collection.column) for image in tiled_images}
+    assert ("B", 13) in wells
+    fov = plate.fov_size
+    for tiled_image in tiled_images:
+        # 3 fields on a 2x2 grid
+        assert tiled_image.shape() == (2, 2, 3, 2 * fov, 2 * fov)
+        assert len(tiled_image.group_by_fov()) == plate.fields
+
+    # Every tile refers to a file listed by the generator
+    files = {
+        str(tiff_path) for tiff_path, _ in iter_synthetic_images(vendor, path, plate)
+    }
+    assert len(files) == plate.num_records
+    for tiled_image in tiled_images:
+        for group in tiled_image.group_by_fov():
+            for region in group.regions:
+                assert region.image_loader.file_path in files
+
+
+def test_write_synthetic_images(tmp_path: Path):
+    plate = SyntheticPlate(fields=2, channels=2, dtype="uint8")
+    path = write_synthetic_acquisition("operetta", tmp_path / "acq", plate)
+    assert len(list((tmp_path / "acq" / "Images").glob("*.tiff"))) == 1
+    assert write_synthetic_images("operetta", path, plate) == plate.num_records
+    assert len(list((tmp_path / "acq" / "Images").glob("*.tiff"))) == 4
@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+import tifffile
+from ngio import open_ome_zarr_container
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
+
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    TiffProbe,
+    image_in_plate_compute_task,
+    setup_plate_conversion,
+    tiff_probe,
+)
+from fractal_uzh_converters.common.tiff_probe import (
+    TIFF_HEADERS_NAME,
+    probe_tiled_images,
+    read_tiff_header,
+)
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+
+def test_read_tiff_header(tmp_path: Path):
+    data = np.arange(64 * 32, dtype="uint16").reshape(64, 32)
+    tifffile.imwrite(tmp_path / "raw.tif", data)
+    tifffile.imwrite(tmp_path / "zlib.tif", data, compression="zlib")
+    header = read_tiff_header(str(tmp_path / "raw.tif"))
+    assert header.shape == (64, 32)
+    assert header.dtype == "uint16"
+    assert header.contiguous
+    header = read_tiff_header(str(tmp_path / "zlib.tif"))
+    assert header.compression != "NONE"
+    assert not header.contiguous
+
+
+def test_probe_data_type(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    (tiled_image,) = build_synthetic_tiled_images(tmp_path, dtype="uint16")
+    # Wrong data type in the metadata
+    tiled_image = tiled_image.model_copy(update={"data_type": "uint8"})
+    zarr_dir = str(tmp_path / "zarr")
+    (probed,) = probe_tiled_images(
+        [tiled_image], zarr_dir=zarr_dir, options=TiffProbe(files_per_image=None)
+    )
+    assert probed.data_type == "uint16"
+    assert (tmp_path / "zarr" / TIFF_HEADERS_NAME).exists()
+
+    # The headers of the unchanged files are cached
+    def fail(path: str):
+        raise AssertionError(f"{path} probed again")
+
+    monkeypatch.setattr(tiff_probe, "read_tiff_header", fail)
+    (probed,) = probe_tiled_images(
+        [tiled_image], zarr_dir=zarr_dir, options=TiffProbe(files_per_image=None)
+    )
+    assert probed.data_type == "uint16"
+
+
+def test_probe_shape_mismatch(tmp_path: Path):
+    tiled_images = build_synthetic_tiled_images(tmp_path)
+    tifffile.imwrite(
+        tmp_path / "tiffs" / "A01_F1_T0_C0_Z0.tif", np.zeros((32, 64), "uint16")
+    )
+    with pytest.raises(ValueError, match="do not match the metadata"):
+        probe_tiled_images(
+            tiled_images,
+            zarr_dir=str(tmp_path / "zarr"),
+            options=TiffProbe(files_per_image=None),
+        )
+    # Only the first and last files are probed
+    (probed,) = probe_tiled_images(
+        tiled_images,
+        zarr_dir=str(tmp_path / "zarr"),
+        options=TiffProbe(files_per_image=2),
+    )
+    assert probed.data_type == "uint16"
+
+
+def test_convert_with_probe(tmp_path: Path):
+    (tiled_image,) = build_synthetic_tiled_images(tmp_path, dtype="uint8")
+    # Wrong data type in the metadata, the default of the arrays
+    tiled_image = tiled_image.model_copy(update={"data_type": "uint16"})
+    (item,) = setup_plate_conversion(
+        tiled_images=[tiled_image],
+        zarr_dir=str(tmp_path / "zarr"),
+        converter_options=ConverterOptions(),
+        overwrite_mode=OverwriteMode.NO_OVERWRITE,
+        performance_options=PerformanceOptions(tiff_probe=TiffProbe()),
+    )
+    image_in_plate_compute_task(**item)
+    image = open_ome_zarr_container(item["zarr_url"]).get_image()
+    assert image.dtype == "uint8"
@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from ngio import open_ome_zarr_container
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode, TiledImage
+
+from fractal_uzh_converters.common import (
+    CompactPayload,
+    PerformanceOptions,
+    image_in_plate_compute_task,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
+
+
+def _first_timepoints(tiled_image: TiledImage) -> TiledImage:
+    regions = [
+        region
+        for region in tiled_image.regions
+        if "_T2_" not in region.image_loader.file_path
+    ]
+    return tiled_image.model_copy(update={"regions": regions})
+
+
+def _chunk_mtimes(zarr_url: str) -> dict[Path, int]:
+    return {
+        path: path.stat().st_mtime_ns
+        for path in Path(zarr_url).rglob("*")
+        if path.is_file() and path.parent.name.isdigit()
+    }
+
+
+@pytest.mark.parametrize("compact_payload", [None, CompactPayload()])
+def test_append_timepoints(tmp_path: Path, compact_payload: CompactPayload | None):
+    tiled_images = build_synthetic_tiled_images(tmp_path, num_t=3)
+    performance_options = PerformanceOptions(
+        append_timepoints=True, compact_payload=compact_payload
+    )
+
+    def convert(
+        images: list[TiledImage], zarr_dir: Path, mode: OverwriteMode
+    ) -> list[dict]:
+        parallelization_list = setup_plate_conversion(
+            tiled_images=images,
+            zarr_dir=str(zarr_dir),
+            converter_options=ConverterOptions(),
+            overwrite_mode=mode,
+            performance_options=performance_options,
+        )
+        for item in parallelization_list:
+            image_in_plate_compute_task(**item)
+        return parallelization_list
+
+    zarr_dir = tmp_path / "zarr"
+    (item,) = convert(
+        [_first_timepoints(image) for image in tiled_images],
+        zarr_dir,
+        OverwriteMode.NO_OVERWRITE,
+    )
+    zarr_url = item["zarr_url"]
+    image = open_ome_zarr_container(zarr_url).get_image()
+    assert image.shape[image.axes.index("t")] == 2
+    mtimes = _chunk_mtimes(zarr_url)
+
+    (item,) = convert(tiled_images, zarr_dir, OverwriteMode.EXTEND)
+    assert item["zarr_url"] == zarr_url
+    # The chunks of the first timepoints are not written again
+    after = _chunk_mtimes(zarr_url)
+    assert all(after[path] == mtime for path, mtime in mtimes.items())
+
+    (reference_item,) = convert(
+        tiled_images, tmp_path / "reference", OverwriteMode.NO_OVERWRITE
+    )
+    appended = open_ome_zarr_container(zarr_url)
+    reference = open_ome_zarr_container(reference_item["zarr_url"])
+    assert appended.level_paths == reference.level_paths
+    for path in reference.level_paths:
+        np.testing.assert_array_equal(
+            appended.get_image(path=path).get_array(),
+            reference.get_image(path=path).get_array(),
+        )
+    # No new timepoints
+    assert convert(tiled_images, zarr_dir, OverwriteMode.EXTEND) == []
+
+
+def test_append_timepoints_excludes_incremental():
+    with pytest.raises(ValueError, match="Incremental"):
+        PerformanceOptions.model_validate(
+            {"append_timepoints": True, "incremental": {}}
+        )
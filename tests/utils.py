@@ -4,10 +4,18 @@ from pathlib import Path
 
 import numpy as np
 import yaml
-from ngio import OmeZarrContainer, open_ome_zarr_plate
+from ngio import OmeZarrContainer, open_ome_zarr_container, open_ome_zarr_plate
+from ome_zarr_converters_tools import ConverterOptions, OverwriteMode
 from pydantic import BaseModel, Field, model_validator
 
-from fractal_uzh_converters.common import image_in_plate_compute_task
+from fractal_uzh_converters.common import (
+    PerformanceOptions,
+    image_in_plate_compute_task,
+    setup_plate_conversion,
+)
+from fractal_uzh_converters.dev.synthetic_acquisitions import (
+    build_synthetic_tiled_images,
+)
 
 
 class FingerprintModel(BaseModel):
@@ -341,3 +349,34 @@ def run_converter_test(
         multi_plate_assertions=assertions,
         zarr_dir=zarr_dir,
     )
+
+
+def convert_synthetic_plate(
+    tmp_path: Path,
+    performance_options: PerformanceOptions,
+    converter_options: ConverterOptions | None = None,
+    zarr_dir: str | None = None,
+    overwrite_mode: OverwriteMode = OverwriteMode.NO_OVERWRITE,
+    **synthetic_kwargs,
+) -> list[OmeZarrContainer]:
+    """Convert a synthetic plate with the init and compute functions.
+
+    The plate is written to `zarr_dir`, by default the `zarr` directory under
+    `tmp_path`.
+    """
+    converter_options = converter_options or ConverterOptions()
+    tiled_images = build_synthetic_tiled_images(
+        tmp_path, converter_options=converter_options, **synthetic_kwargs
+    )
+    parallelization_list = setup_plate_conversion(
+        tiled_images=tiled_images,
+        zarr_dir=zarr_dir or str(tmp_path / "zarr"),
+        converter_options=converter_options,
+        overwrite_mode=overwrite_mode,
+        performance_options=performance_options,
+    )
+    containers = []
+    for item in parallelization_list:
+        image_in_plate_compute_task(**item)
+        containers.append(open_ome_zarr_container(item["zarr_url"]))
+    return containers